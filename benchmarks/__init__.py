@@ -0,0 +1 @@
+"""Benchmarks for bsimport, see benchmarks/README.md."""
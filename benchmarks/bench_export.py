@@ -0,0 +1,181 @@
+"""This module benchmarks the export of a book against the fake server."""
+# benchmarks/bench_export.py
+
+import argparse
+import tempfile
+import time
+
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+from benchmarks.bench_import import start_server
+from benchmarks.report import (
+    compare_results, peak_rss, print_results, save_results
+)
+from benchmarks.vault import VaultSpec, generate_vault
+from bsimport import DEFAULT_PAGE_SIZE, engine, export, imp
+
+
+# The jobs the vault is imported with before the export is timed.
+IMPORT_JOBS = 16
+
+
+def import_vault(url: str, vault: Path) -> int:
+    """
+    Import the vault as the book to export.
+
+    :return:
+        The ID of the book.
+    :rtype: int
+    """
+
+    importer = imp.Importer("id", "secret", url, pool_size=IMPORT_JOBS)
+
+    try:
+        error, book_id = importer.import_book(vault)
+        if error:
+            raise SystemExit(f"Creating the book failed: {book_id}")
+        for result in engine.import_book_content(
+            importer, vault, book_id, IMPORT_JOBS
+        ):
+            if result.error:
+                raise SystemExit(f"Importing the vault failed: {result}")
+    finally:
+        importer.close()
+
+    return book_id
+
+
+def run_export(
+    url: str,
+    book_id: int,
+    path: Path,
+    jobs: int,
+    count: int
+) -> Tuple[List[engine.Result], int]:
+    """
+    Export the book with an Importer.
+
+    :return:
+        The result of every chapter and page, and the number of requests.
+    :rtype: Tuple[List[engine.Result], int]
+    """
+
+    importer = imp.Importer("id", "secret", url, pool_size=max(jobs + 1, 10))
+
+    try:
+        results = list(export.export_book(
+            importer, book_id, path, jobs, count
+        ))
+        requests = importer.connection_stats()['requests']
+    finally:
+        importer.close()
+
+    return results, requests
+
+
+def mismatches(vault: Path, exported: Path) -> int:
+    """
+    Count the pages whose name, text or tags differ once exported and
+    read back.
+    """
+
+    def pages(root: Path) -> Counter:
+        read = Counter()
+        for directory in [root] + engine.list_chapters(root):
+            for page in engine.list_pages(directory):
+                error, data = imp.read_page(page)
+                if not error:
+                    read[directory.name if directory != root else "",
+                         data.name, data.text, str(data.tags)] += 1
+        return read
+
+    return sum((pages(vault) - pages(exported)).values())
+
+
+def main() -> None:
+    default = VaultSpec()
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the export of a book."
+    )
+    parser.add_argument('--pages', type=int, default=default.pages)
+    parser.add_argument('--chapters', type=int, default=default.chapters)
+    parser.add_argument('--size', type=int, default=default.size)
+    parser.add_argument('--front-matter', type=float,
+                        default=default.front_matter)
+    parser.add_argument('--seed', type=int, default=default.seed)
+    parser.add_argument('--jobs', '-j', type=int, default=1)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE,
+                        help="the number of chapters or pages listed per "
+                        "request")
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help="mean time per request, in seconds")
+    parser.add_argument('--jitter', type=float, default=0.005,
+                        help="maximum deviation from the latency, in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="probability of answering with a 429 or a 503")
+    parser.add_argument('--json', type=Path,
+                        help="save the results to this file")
+    parser.add_argument('--compare', type=Path,
+                        help="compare the results with those of this file")
+    args = parser.parse_args()
+
+    spec = VaultSpec(
+        args.pages, args.chapters, args.size, args.front_matter,
+        seed=args.seed
+    )
+
+    process, url = start_server(
+        args.latency, args.jitter, args.error_rate, args.seed
+    )
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            vault = generate_vault(Path(tmp) / "vault", spec)
+            book_id = import_vault(url, vault)
+
+            exported = Path(tmp) / "export"
+            start = time.perf_counter()
+            results, requests = run_export(
+                url, book_id, exported, args.jobs, args.page_size
+            )
+            elapsed = time.perf_counter() - start
+
+            different = mismatches(vault, exported)
+
+        rss = peak_rss()
+    finally:
+        process.terminate()
+        process.wait()
+
+    pages = [result for result in results if result.kind == engine.PAGE]
+    errors = sum(1 for result in results if result.error)
+
+    summary = {
+        'pages': len(pages),
+        'errors': errors,
+        'mismatches': different,
+        'seconds': elapsed,
+        'pages_per_sec': len(pages) / elapsed,
+        'requests': requests
+    }
+
+    if rss is not None:
+        summary['peak_rss_mb'] = rss / (1 << 20)
+
+    print_results(
+        f"export: {spec.pages} pages of ~{spec.size} bytes, "
+        f"{args.jobs} jobs",
+        summary
+    )
+
+    if args.json is not None:
+        save_results(args.json, summary)
+    if args.compare is not None:
+        compare_results(args.compare, summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""This module benchmarks the import of a vault against the fake server."""
+# benchmarks/bench_import.py
+
+import argparse
+import asyncio
+import functools
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.report import (
+    compare_results, peak_rss, percentile, print_results, save_results
+)
+from benchmarks.vault import VaultSpec, generate_vault
+from bsimport import engine, imp
+from bsimport.limit import AdaptiveLimit
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def start_server(
+    latency: float,
+    jitter: float,
+    error_rate: float,
+    seed: int,
+    bandwidth: float = 0.0,
+    capacity: int = 0
+) -> Tuple[subprocess.Popen, str]:
+    """
+    Start the fake server in another process, so it doesn't compete with
+    the import for the GIL and isn't counted in its memory.
+
+    :return:
+        The process and the URL of the server.
+    :rtype: Tuple[subprocess.Popen, str]
+    """
+
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'benchmarks.fake_server',
+            '--latency', str(latency),
+            '--jitter', str(jitter),
+            '--error-rate', str(error_rate),
+            '--seed', str(seed),
+            '--bandwidth', str(bandwidth),
+            '--capacity', str(capacity)
+        ],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        text=True
+    )
+    url = process.stdout.readline().strip()
+    return process, url
+
+
+def timed(method: Callable, latencies: List[float]) -> Callable:
+    """
+    Wrap a method of an importer to record how long each call takes.
+    """
+
+    @functools.wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def timed_async(method: Callable, latencies: List[float]) -> Callable:
+    """
+    Wrap a coroutine method of an importer, see `timed`.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def merge_stats(total: Dict[str, float], stats: Dict[str, float]) -> None:
+    """
+    Add the statistics of an importer to those of the previous ones, the
+    state of the adaptive limit being that of the last one.
+    """
+
+    for key, value in stats.items():
+        if key in ('limit', 'peak', 'decreases', 'latency_ms'):
+            total[key] = value
+        elif value is not None:
+            total[key] = total.get(key, 0) + value
+
+
+def run_sync(
+    url: str,
+    vaults: List[Path],
+    jobs: int,
+    parse_workers: int,
+    latencies: List[float],
+    compress_threshold: Optional[int] = None,
+    adaptive: bool = False,
+    separate: bool = False
+) -> Tuple[List[engine.Result], Dict[str, float]]:
+    """
+    Import the vaults with an Importer, all at once or, with `separate`,
+    one after the other with a new Importer each, like separate runs.
+
+    :return:
+        The result of every book, chapter and page, and the connection,
+        retry and compression statistics.
+    :rtype: Tuple[List[engine.Result], Dict[str, float]]
+    """
+
+    results: List[engine.Result] = list()
+    stats: Dict[str, float] = dict()
+
+    for batch in ([[vault] for vault in vaults] if separate else [vaults]):
+
+        importer = imp.Importer(
+            "id", "secret", url, pool_size=max(jobs, 10),
+            compress_threshold=compress_threshold,
+            limit=AdaptiveLimit(jobs) if adaptive else None
+        )
+        # Pages are imported by import_page, or by upload_page when parsed
+        # by the workers, and neither calls the other.
+        importer.import_page = timed(importer.import_page, latencies)
+        importer.upload_page = timed(importer.upload_page, latencies)
+
+        try:
+            results.extend(engine.import_books_content(
+                importer, batch, jobs, parse_workers
+            ))
+            merge_stats(stats, {
+                **importer.connection_stats(), **importer.retry_stats(),
+                **importer.compression_stats(),
+                **(importer.limit_stats() or {})
+            })
+        finally:
+            importer.close()
+
+    return results, stats
+
+
+async def run_async(
+    url: str,
+    vaults: List[Path],
+    jobs: int,
+    parse_workers: int,
+    latencies: List[float],
+    compress_threshold: Optional[int] = None,
+    adaptive: bool = False,
+    separate: bool = False
+) -> Tuple[List[engine.Result], Dict[str, float]]:
+    """
+    Import the vaults with an AsyncImporter, see `run_sync`.
+    """
+
+    results: List[engine.Result] = list()
+    stats: Dict[str, float] = dict()
+
+    for batch in ([[vault] for vault in vaults] if separate else [vaults]):
+
+        importer = imp.AsyncImporter(
+            "id", "secret", url, pool_size=max(jobs, 10),
+            compress_threshold=compress_threshold,
+            limit=AdaptiveLimit(jobs) if adaptive else None
+        )
+        importer.import_page = timed_async(importer.import_page, latencies)
+        importer.upload_page = timed_async(importer.upload_page, latencies)
+
+        try:
+            results.extend([
+                result async for result in engine.import_books_content_async(
+                    importer, batch, jobs, parse_workers
+                )
+            ])
+            merge_stats(stats, {
+                **importer.connection_stats(), **importer.retry_stats(),
+                **importer.compression_stats(),
+                **(importer.limit_stats() or {})
+            })
+        finally:
+            await importer.close()
+
+    return results, stats
+
+
+def main() -> None:
+    default = VaultSpec()
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the import of a synthetic vault."
+    )
+    parser.add_argument('--pages', type=int, default=default.pages)
+    parser.add_argument('--chapters', type=int, default=default.chapters)
+    parser.add_argument('--size', type=int, default=default.size)
+    parser.add_argument('--front-matter', type=float,
+                        default=default.front_matter)
+    parser.add_argument('--depth', type=int, default=default.depth)
+    parser.add_argument('--seed', type=int, default=default.seed)
+    parser.add_argument('--jobs', '-j', type=int, default=1)
+    parser.add_argument('--parse-workers', '-p', type=int, default=0)
+    parser.add_argument('--async', dest='use_async', action='store_true')
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help="mean time per request, in seconds")
+    parser.add_argument('--jitter', type=float, default=0.005,
+                        help="maximum deviation from the latency, in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="probability of answering with a 429 or a 503")
+    parser.add_argument('--bandwidth', type=float, default=0.0,
+                        help="speed request bodies arrive at, in bytes per "
+                        "second, 0 for no limit")
+    parser.add_argument('--compress', type=int, metavar='THRESHOLD',
+                        help="gzip request bodies from this size, in bytes")
+    parser.add_argument('--capacity', type=int, default=0,
+                        help="number of requests the server answers at "
+                        "once, the others get a 429, 0 for no limit")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="adapt the number of pages sent at once, up to "
+                        "the number of jobs")
+    parser.add_argument('--roots', type=int, default=1,
+                        help="number of vaults imported, each of --pages "
+                        "pages")
+    parser.add_argument('--separate', action='store_true',
+                        help="import the vaults one after the other with a "
+                        "new importer each, like separate runs")
+    parser.add_argument('--json', type=Path,
+                        help="save the results to this file")
+    parser.add_argument('--compare', type=Path,
+                        help="compare the results with those of this file")
+    args = parser.parse_args()
+
+    spec = VaultSpec(
+        args.pages, args.chapters, args.size, args.front_matter,
+        args.depth, args.seed
+    )
+    latencies: List[float] = list()
+
+    process, url = start_server(
+        args.latency, args.jitter, args.error_rate, args.seed,
+        args.bandwidth, args.capacity
+    )
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            vaults = [
+                generate_vault(Path(tmp) / f"vault{i}", spec)
+                for i in range(args.roots)
+            ]
+
+            start = time.perf_counter()
+            if args.use_async:
+                results, stats = asyncio.run(run_async(
+                    url, vaults, args.jobs, args.parse_workers, latencies,
+                    args.compress, args.adaptive, args.separate
+                ))
+            else:
+                results, stats = run_sync(
+                    url, vaults, args.jobs, args.parse_workers, latencies,
+                    args.compress, args.adaptive, args.separate
+                )
+            elapsed = time.perf_counter() - start
+
+        # Before the server is stopped, so only the parse workers count.
+        rss = peak_rss()
+        children_rss = peak_rss(children=True)
+    finally:
+        process.terminate()
+        process.wait()
+
+    pages = [result for result in results if result.kind == engine.PAGE]
+    errors = sum(1 for result in results if result.error)
+
+    if pages and not latencies:
+        raise SystemExit(
+            "No page latency was recorded: the importer no longer imports "
+            "pages through import_page or upload_page."
+        )
+
+    summary = {
+        'pages': len(pages),
+        'errors': errors,
+        'seconds': elapsed,
+        'pages_per_sec': len(pages) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'requests': stats['requests'],
+        'connections': stats['connections'],
+        'retries': stats['retries']
+    }
+
+    if args.compress is not None:
+        summary['compressed'] = stats['compressed']
+        summary['kib_saved'] = stats['bytes_saved'] / 1024
+
+    if args.adaptive:
+        summary['limit'] = stats['limit']
+        summary['limit_peak'] = stats['peak']
+        summary['limit_decreases'] = stats['decreases']
+
+    if rss is not None:
+        summary['peak_rss_mb'] = rss / (1 << 20)
+    if args.parse_workers and children_rss is not None:
+        summary['parse_peak_rss_mb'] = children_rss / (1 << 20)
+
+    mode = 'async' if args.use_async else 'threads'
+    if args.adaptive:
+        mode += ', adaptive'
+    if args.roots > 1:
+        mode += f", {args.roots} {'separate ' if args.separate else ''}vaults"
+    print_results(
+        f"import: {spec.pages} pages of ~{spec.size} bytes, {mode}, "
+        f"{args.jobs} jobs, {args.parse_workers} parse workers",
+        summary
+    )
+
+    if args.json is not None:
+        save_results(args.json, summary)
+    if args.compare is not None:
+        compare_results(args.compare, summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""This module benchmarks the import of a very large Markdown file."""
+# benchmarks/bench_large.py
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from benchmarks.bench_import import start_server
+from benchmarks.report import (
+    compare_results, peak_rss, print_results, save_results
+)
+from benchmarks.vault import page_text
+from bsimport import DEFAULT_STREAM_THRESHOLD, imp
+
+
+# The size of the pieces the file is written by, so that generating it
+# doesn't count in the peak RSS of the import.
+PIECE_SIZE = 1 << 20
+
+
+def write_large_file(path: Path, size: int, seed: int) -> Path:
+    """
+    Write a Markdown file of about `size` bytes, with a heading every few
+    hundred bytes.
+    """
+
+    rng = random.Random(seed)
+
+    with path.open('w', encoding='utf-8') as file:
+        written = 0
+        while written < size:
+            text = page_text(rng, "Large note", PIECE_SIZE, written == 0)
+            if written:
+                # Only the first piece starts with the title.
+                text = text.split('\n', 1)[1]
+            file.write(text)
+            written += len(text)
+
+    return path
+
+
+def run_sync(
+    url: str,
+    path: Path,
+    stream_threshold: Optional[int],
+    split_size: Optional[int]
+) -> Tuple[imp.IResponse, Dict[str, int]]:
+    """
+    Import the file as a page of a new book with an Importer.
+    """
+
+    importer = imp.Importer(
+        "id", "secret", url,
+        stream_threshold=stream_threshold,
+        split_size=split_size
+    )
+
+    try:
+        error, book_id = importer.import_book(path.parent)
+        if error:
+            return imp.IResponse(error, book_id), {}
+        response = importer.import_page(path, book_id=book_id)
+        return response, importer.connection_stats()
+    finally:
+        importer.close()
+
+
+async def run_async(
+    url: str,
+    path: Path,
+    stream_threshold: Optional[int],
+    split_size: Optional[int]
+) -> Tuple[imp.IResponse, Dict[str, int]]:
+    """
+    Import the file as a page of a new book with an AsyncImporter.
+    """
+
+    importer = imp.AsyncImporter(
+        "id", "secret", url,
+        stream_threshold=stream_threshold,
+        split_size=split_size
+    )
+
+    try:
+        error, book_id = await importer.import_book(path.parent)
+        if error:
+            return imp.IResponse(error, book_id), {}
+        response = await importer.import_page(path, book_id=book_id)
+        return response, importer.connection_stats()
+    finally:
+        await importer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the import of a very large Markdown file."
+    )
+    parser.add_argument('--size', type=int, default=64,
+                        help="the size of the file, in MiB")
+    parser.add_argument('--stream-threshold', type=int,
+                        default=DEFAULT_STREAM_THRESHOLD,
+                        help="stream files from this size, in bytes, 0 to "
+                        "read them in memory")
+    parser.add_argument('--split-size', type=int, default=0,
+                        help="split pages larger than this, in characters, "
+                        "0 to never split them")
+    parser.add_argument('--async', dest='use_async', action='store_true')
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help="mean time per request, in seconds")
+    parser.add_argument('--bandwidth', type=float, default=0.0,
+                        help="speed request bodies arrive at, in bytes per "
+                        "second, 0 for no limit")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', type=Path,
+                        help="save the results to this file")
+    parser.add_argument('--compare', type=Path,
+                        help="compare the results with those of this file")
+    args = parser.parse_args()
+
+    stream_threshold = args.stream_threshold or None
+    split_size = args.split_size or None
+
+    process, url = start_server(
+        args.latency, 0.0, 0.0, args.seed, args.bandwidth
+    )
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = Path(tmp) / "vault"
+            folder.mkdir()
+            path = write_large_file(
+                folder / "large.md", args.size << 20, args.seed
+            )
+            size = path.stat().st_size
+
+            start = time.perf_counter()
+            if args.use_async:
+                (error, _), stats = asyncio.run(run_async(
+                    url, path, stream_threshold, split_size
+                ))
+            else:
+                (error, _), stats = run_sync(
+                    url, path, stream_threshold, split_size
+                )
+            elapsed = time.perf_counter() - start
+
+        rss = peak_rss()
+    finally:
+        process.terminate()
+        process.wait()
+
+    summary = {
+        'mib': size / (1 << 20),
+        'error': error,
+        'seconds': elapsed,
+        'mib_per_sec': size / (1 << 20) / elapsed,
+        'requests': stats.get('requests', 0)
+    }
+
+    if rss is not None:
+        summary['peak_rss_mb'] = rss / (1 << 20)
+
+    print_results("large file", summary)
+
+    if args.json is not None:
+        save_results(args.json, summary)
+    if args.compare is not None:
+        compare_results(args.compare, summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""This module benchmarks the resolution of wikilinks between pages."""
+# benchmarks/bench_links.py
+
+import argparse
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.report import compare_results, print_results, save_results
+from benchmarks.vault import VaultSpec, generate_vault
+from bsimport import imp
+from bsimport.links import LinkIndex, find_links
+from bsimport.manifest import PAGE, Manifest
+
+
+# The budget of both phases, in seconds, for the default vault: 10k pages
+# with about 50k links.
+DEFAULT_BUDGET = 5.0
+
+
+def url(page_id: int) -> str:
+    """
+    Get the URL of a page, like Bookstack.page_url.
+    """
+    return f"http://bookstack/link/{page_id}"
+
+
+def read_vault(vault: Path) -> List[Tuple[Path, imp.Page]]:
+    """
+    Read and parse every file of a vault, in import order.
+    """
+
+    pages = list()
+
+    for path in sorted(vault.rglob("*.md")):
+        error, page = imp.read_page(path)
+        if not error:
+            pages.append((path, page))
+
+    return pages
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(
+        description="Benchmark the resolution of wikilinks."
+    )
+    args_parser.add_argument('--pages', type=int, default=10000)
+    args_parser.add_argument('--links', type=int, default=5,
+                             help="the mean number of links of a page")
+    args_parser.add_argument('--size', type=int, default=1024)
+    args_parser.add_argument('--seed', type=int, default=0)
+    args_parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                             help="the budget of both phases, in seconds")
+    args_parser.add_argument('--json', type=Path,
+                             help="save the results to this file")
+    args_parser.add_argument(
+        '--compare', type=Path,
+        help="compare the results with those of this file"
+    )
+    args = args_parser.parse_args()
+
+    spec = VaultSpec(
+        pages=args.pages, chapters=10, size=args.size, seed=args.seed,
+        links=args.links
+    )
+    results: Dict[str, float] = dict()
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        vault = generate_vault(Path(tmp) / "vault", spec)
+        pages = read_vault(vault)
+        links = sum(len(find_links(page.text)) for _, page in pages)
+
+        # The first phase: pages are created in order, links to pages
+        # created later are deferred.
+        start = time.perf_counter()
+        index = LinkIndex(vault)
+        for page_id, (path, page) in enumerate(pages):
+            _, unresolved = index.rewrite(page.text, url)
+            index.add(path, page_id, page.aliases)
+            if unresolved:
+                index.defer(path, unresolved)
+        first = time.perf_counter() - start
+
+        # The second phase: the deferred pages are read again and resolved.
+        start = time.perf_counter()
+        deferred = index.pending()
+        for path, _, _ in deferred:
+            index.unresolved(path)
+            _, page = imp.read_page(path)
+            index.rewrite(page.text, url)
+        second = time.perf_counter() - start
+
+        manifest = Manifest(Path(tmp) / "manifest.json")
+        for page_id, (path, page) in enumerate(pages):
+            manifest.record(
+                path, PAGE, page_id, "book:1", page.name,
+                aliases=page.aliases
+            )
+
+        start = time.perf_counter()
+        LinkIndex.build(vault, manifest)
+        build = time.perf_counter() - start
+
+    results['pages'] = len(pages)
+    results['links'] = links
+    results['deferred_pages'] = len(deferred)
+    results['first_phase_s'] = first
+    results['second_phase_s'] = second
+    results['links_per_s'] = links / (first + second)
+    results['build_from_manifest_s'] = build
+
+    print_results("links", results)
+
+    if args.json is not None:
+        save_results(args.json, results)
+    if args.compare is not None:
+        compare_results(args.compare, results)
+
+    if first + second > args.budget:
+        print(
+            f"FAIL: resolving took {first + second:.2f}s, over the budget "
+            f"of {args.budget}s",
+            file=sys.stderr
+        )
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""This module benchmarks the parsing of Markdown files."""
+# benchmarks/bench_parser.py
+
+import argparse
+import random
+import tempfile
+import timeit
+import tracemalloc
+
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from benchmarks.report import compare_results, print_results, save_results
+from benchmarks.vault import page_text
+from bsimport import imp, parser
+
+
+# The sizes of the parsed files, in bytes.
+SIZES = (1 << 10, 1 << 16, 1 << 20, 1 << 24)
+
+
+def measure(function: Callable[[], object], repeat: int) -> Tuple[float, int]:
+    """
+    Time a function, and measure the memory it allocates.
+
+    :param function:
+        The function to call, without arguments.
+    :type function: Callable[[], object]
+    :param repeat:
+        The number of timing rounds, the best one is kept.
+    :type repeat: int
+
+    :return:
+        The best time of a call, in seconds.
+    :rtype: float
+    :return:
+        The peak memory allocated by a call, in bytes.
+    :rtype: int
+    """
+
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(
+        description="Benchmark the Markdown parser."
+    )
+    args_parser.add_argument('--repeat', type=int, default=5)
+    args_parser.add_argument('--seed', type=int, default=0)
+    args_parser.add_argument('--json', type=Path,
+                             help="save the results to this file")
+    args_parser.add_argument(
+        '--compare', type=Path,
+        help="compare the results with those of this file"
+    )
+    args = args_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results: Dict[str, float] = dict()
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        for size in SIZES:
+            for tags in (False, True):
+
+                text = page_text(rng, "Benchmark", size, tags)
+                data = text.encode()
+                path = Path(tmp) / f"{size}-{tags}.md"
+                path.write_bytes(data)
+
+                label = f"{size >> 10}KiB{'+fm' if tags else ''}"
+                megabytes = len(data) / (1 << 20)
+
+                best, peak = measure(lambda: parser.parse(data), args.repeat)
+                results[f"parse_{label}_us"] = best * 1e6
+                results[f"parse_{label}_mb_per_s"] = megabytes / best
+                results[f"parse_{label}_peak_kb"] = peak / 1024
+
+                best, peak = measure(
+                    lambda: imp.read_page(path), args.repeat
+                )
+                results[f"read_page_{label}_us"] = best * 1e6
+                results[f"read_page_{label}_mb_per_s"] = megabytes / best
+                results[f"read_page_{label}_peak_kb"] = peak / 1024
+
+    print_results("parser", results)
+
+    if args.json is not None:
+        save_results(args.json, results)
+    if args.compare is not None:
+        compare_results(args.compare, results)
+
+
+if __name__ == '__main__':
+    main()
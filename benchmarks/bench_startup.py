@@ -0,0 +1,130 @@
+"""This module checks that the CLI starts within a fixed budget."""
+# benchmarks/bench_startup.py
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.report import (
+    compare_results, percentile, print_results, save_results
+)
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The budget of a cold start, in milliseconds, from launching the
+# interpreter to the exit of 'bsimport --version'.
+DEFAULT_BUDGET_MS = 250
+
+# Modules only the commands sending requests may load.
+HEAVY_MODULES = ("requests", "aiohttp", "asyncio", "bsimport.imp")
+
+COMMANDS = {
+    'version': ["--version"],
+    'where': ["where"]
+}
+
+
+def run(args: List[str], home: str) -> float:
+    """
+    Run bsimport in a new interpreter.
+
+    :param args:
+        The arguments of bsimport.
+    :type args: List[str]
+    :param home:
+        The home directory, so the user's config isn't read.
+    :type home: str
+
+    :return:
+        The time until the interpreter exited, in seconds.
+    :rtype: float
+    """
+
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-m', 'bsimport', *args],
+        cwd=ROOT,
+        env={**os.environ, 'HOME': home, 'XDG_CONFIG_HOME': home},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    return time.perf_counter() - start
+
+
+def loaded_modules() -> List[str]:
+    """
+    List the heavy modules loaded by importing the CLI.
+    """
+
+    code = (
+        "import sys, bsimport.cli; "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return output.stdout.split()
+
+
+def main() -> None:
+    args_parser = argparse.ArgumentParser(
+        description="Check the cold start of the CLI against a budget."
+    )
+    args_parser.add_argument('--repeat', type=int, default=10)
+    args_parser.add_argument('--budget', type=float,
+                             default=DEFAULT_BUDGET_MS,
+                             help="the budget of the median, in milliseconds")
+    args_parser.add_argument('--json', type=Path,
+                             help="save the results to this file")
+    args_parser.add_argument(
+        '--compare', type=Path,
+        help="compare the results with those of this file"
+    )
+    args = args_parser.parse_args()
+
+    results: Dict[str, float] = dict()
+
+    with tempfile.TemporaryDirectory() as home:
+
+        for name, command in COMMANDS.items():
+            # The first run compiles the bytecode, it isn't counted.
+            run(command, home)
+            times = [run(command, home) for _ in range(args.repeat)]
+            results[f"{name}_p50_ms"] = percentile(times, 0.50) * 1000
+            results[f"{name}_min_ms"] = min(times) * 1000
+
+    print_results("startup", results)
+
+    if args.json is not None:
+        save_results(args.json, results)
+    if args.compare is not None:
+        compare_results(args.compare, results)
+
+    failures = [
+        f"{name} took {value:.1f}ms, over the budget of {args.budget}ms"
+        for name, value in results.items()
+        if name.endswith("_p50_ms") and value > args.budget
+    ]
+    failures.extend(
+        f"importing the CLI loads {module}" for module in loaded_modules()
+    )
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,454 @@
+"""This module provides a local stand-in for Bookstack's API."""
+# benchmarks/fake_server.py
+
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+# The endpoints of the API used by bsimport.
+KINDS = (
+    'shelves', 'books', 'chapters', 'pages', 'image-gallery', 'attachments'
+)
+
+# Statuses of the injected errors, 429 comes with a Retry-After header.
+ERROR_STATUSES = (429, 503)
+
+
+class FakeBookstack():
+    """
+    An in-memory Bookstack instance.
+
+    Items are kept as sent, with an ID, listings are paginated with `count`
+    and `offset` like the real API. Every request waits for `latency`
+    seconds, give or take `jitter`, and fails with a 429 or a 503 with
+    a probability of `error_rate`. Request bodies share a link of
+    `bandwidth` bytes per second, and gzipped ones are answered with a 415
+    unless `accept_gzip`. With a `capacity`, requests arriving while that
+    many are being answered are throttled with a 429.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        bandwidth: float = 0.0,
+        accept_gzip: bool = True,
+        capacity: int = 0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bandwidth = bandwidth
+        self.accept_gzip = accept_gzip
+        self.capacity = capacity
+        self._busy = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_id = 1
+        # When the bodies already arriving will have arrived.
+        self._link_free = 0.0
+        self._items: Dict[str, Dict[int, Dict[str, Any]]] = {
+            kind: dict() for kind in KINDS
+        }
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'throttled': 0,
+            'bytes_received': 0
+        }
+
+    def delay(self) -> float:
+        """
+        Draw the time to wait before answering a request.
+        """
+
+        with self._lock:
+            spread = self._random.uniform(-self.jitter, self.jitter)
+
+        return max(0.0, self.latency + spread)
+
+    def transfer_time(self, size: int) -> float:
+        """
+        Get the time a request body of `size` bytes takes to arrive: the
+        bodies share the bandwidth, each one waits for those before it.
+        """
+
+        now = time.monotonic()
+
+        with self._lock:
+            self.stats['bytes_received'] += size
+            if self.bandwidth <= 0:
+                return 0.0
+            self._link_free = max(self._link_free, now) + size / self.bandwidth
+            return self._link_free - now
+
+    def enter(self) -> bool:
+        """
+        Take a slot to answer a request, False if the server is at
+        capacity.
+        """
+
+        with self._lock:
+            if self.capacity and self._busy >= self.capacity:
+                self.stats['throttled'] += 1
+                return False
+            self._busy += 1
+            return True
+
+    def leave(self) -> None:
+        """
+        Free the slot of an answered request.
+        """
+
+        with self._lock:
+            self._busy -= 1
+
+    def should_fail(self) -> Optional[int]:
+        """
+        Draw whether a request fails, and with which status.
+        """
+
+        with self._lock:
+            self.stats['requests'] += 1
+            if self._random.random() >= self.error_rate:
+                return None
+            self.stats['errors'] += 1
+            return self._random.choice(ERROR_STATUSES)
+
+    def create(self, kind: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            # The ID first, as Bookstack sends it back.
+            item = {'id': self._next_id, **item}
+            self._next_id += 1
+            self._items[kind][item['id']] = item
+        return item
+
+    def read(self, kind: str, id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._items[kind].get(id)
+
+    def update(
+        self,
+        kind: str,
+        id: int,
+        fields: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items[kind].get(id)
+            if item is not None:
+                item.update(fields)
+            return item
+
+    def delete(self, kind: str, id: int) -> bool:
+        with self._lock:
+            return self._items[kind].pop(id, None) is not None
+
+    def list(
+        self,
+        kind: str,
+        offset: int,
+        count: int,
+        filters: Optional[Dict[str, str]] = None
+    ) -> Tuple[list, int]:
+        with self._lock:
+            items = list(self._items[kind].values())
+        if filters:
+            items = [
+                item for item in items
+                if all(str(item.get(field)) == value
+                       for field, value in filters.items())
+            ]
+        return items[offset:offset + count], len(items)
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serves the API of the FakeBookstack set on the server.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, don't let Nagle's algorithm
+    # delay the body until the client acknowledges the headers.
+    disable_nagle_algorithm = True
+    server: 'FakeServer'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: Any = None, **headers: str) -> None:
+        data = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name.replace('_', '-'), value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str, **headers: str) -> None:
+        self._send(status, {'error': {'message': message}}, **headers)
+
+    def _read_body(self) -> Optional[Dict[str, Any]]:
+        """
+        Read the body of the request, None if its encoding isn't accepted.
+        """
+
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length)
+        time.sleep(self.server.api.transfer_time(length))
+        # Uploads are only counted, their content is dropped.
+        if self.headers.get('Content-Type', '').startswith('multipart/'):
+            return {'size': length}
+        if self.headers.get('Content-Encoding', '') == 'gzip':
+            if not self.server.api.accept_gzip:
+                return None
+            try:
+                raw = gzip.decompress(raw)
+            except OSError:
+                return {}
+        try:
+            body = json.loads(raw or b'{}')
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
+
+    def _route(self) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Get the kind and, if any, the ID from the path of the request.
+        """
+
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if len(parts) < 2 or parts[0] != 'api' or parts[1] not in KINDS:
+            return None, None
+        if len(parts) == 2:
+            return parts[1], None
+        try:
+            return parts[1], int(parts[2])
+        except ValueError:
+            return None, None
+
+    def _handle(self, method: str) -> None:
+
+        api = self.server.api
+        body = self._read_body()
+
+        if not api.enter():
+            self._error(429, "Too Many Attempts.", Retry_After='1')
+            return
+        time.sleep(api.delay())
+        api.leave()
+
+        if not self.headers.get('Authorization', '').startswith('Token '):
+            self._error(401, "The request is not authenticated.")
+            return
+
+        if body is None:
+            self._error(415, "Unsupported Media Type.")
+            return
+
+        status = api.should_fail()
+        if status == 429:
+            self._error(429, "Too Many Attempts.", Retry_After='0')
+            return
+        if status is not None:
+            self._error(status, "Service Unavailable.")
+            return
+
+        kind, id = self._route()
+        if kind is None:
+            self._error(404, "Not found.")
+            return
+
+        if method == 'GET' and id is None:
+            query = parse_qs(urlparse(self.path).query)
+            offset = int(query.get('offset', ['0'])[0])
+            count = int(query.get('count', ['100'])[0])
+            filters = {
+                key[7:-1]: values[0] for key, values in query.items()
+                if key.startswith('filter[') and key.endswith(']')
+            }
+            data, total = api.list(kind, offset, count, filters)
+            self._send(200, {'data': data, 'total': total})
+
+        elif method == 'POST' and id is None:
+            if kind == 'pages' and not (
+                body.get('book_id') or body.get('chapter_id')
+            ):
+                self._error(422, "The book or chapter is required.")
+                return
+            if kind == 'pages' and body.get('chapter_id'):
+                # Pages of a chapter are listed with the book, too.
+                chapter = api.read('chapters', body['chapter_id']) or {}
+                body['book_id'] = chapter.get('book_id')
+            elif kind == 'pages':
+                # Like Bookstack, for the pages outside a chapter.
+                body['chapter_id'] = 0
+            item = api.create(kind, body)
+            if kind == 'image-gallery':
+                item['url'] = (
+                    f"{self.server.url}/uploads/images/gallery/{item['id']}"
+                )
+            self._send(200, item)
+
+        elif method == 'GET':
+            item = api.read(kind, id)
+            if item is None:
+                self._error(404, "Not found.")
+            else:
+                self._send(200, item)
+
+        elif method == 'PUT':
+            item = api.update(kind, id, body)
+            if item is None:
+                self._error(404, "Not found.")
+            else:
+                self._send(200, item)
+
+        elif method == 'DELETE':
+            if api.delete(kind, id):
+                self._send(204)
+            else:
+                self._error(404, "Not found.")
+
+        else:
+            self._error(405, "Method not allowed.")
+
+    def do_GET(self) -> None:
+        self._handle('GET')
+
+    def do_POST(self) -> None:
+        self._handle('POST')
+
+    def do_PUT(self) -> None:
+        self._handle('PUT')
+
+    def do_DELETE(self) -> None:
+        self._handle('DELETE')
+
+
+class FakeServer(ThreadingHTTPServer):
+    """
+    An HTTP server answering with a FakeBookstack.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], api: FakeBookstack):
+        super().__init__(address, Handler)
+        self.api = api
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def serve(
+    port: int = 0,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    seed: Optional[int] = None,
+    bandwidth: float = 0.0,
+    accept_gzip: bool = True,
+    capacity: int = 0
+) -> FakeServer:
+    """
+    Start a fake server in a background thread.
+
+    :param port:
+        The port to listen on, 0 for any free port.
+    :type port: int
+    :param latency:
+        The mean time taken by each request, in seconds.
+    :type latency: float
+    :param jitter:
+        The maximum deviation from `latency`, in seconds.
+    :type jitter: float
+    :param error_rate:
+        The probability of a request failing with a 429 or a 503.
+    :type error_rate: float
+    :param seed:
+        The seed of the latency and error draws.
+    :type seed: Optional[int]
+    :param bandwidth:
+        The speed request bodies arrive at, in bytes per second, 0 for no
+        limit.
+    :type bandwidth: float
+    :param accept_gzip:
+        Whether gzipped request bodies are read, rather than answered
+        with a 415.
+    :type accept_gzip: bool
+    :param capacity:
+        The number of requests answered at once, the others are throttled,
+        0 for no limit.
+    :type capacity: int
+
+    :return:
+        The running server, stop it with `shutdown`.
+    :rtype: FakeServer
+    """
+
+    server = FakeServer(
+        ('127.0.0.1', port),
+        FakeBookstack(
+            latency, jitter, error_rate, seed, bandwidth, accept_gzip,
+            capacity
+        )
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for Bookstack's API."
+    )
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="mean time per request, in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help="maximum deviation from the latency, in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="probability of answering with a 429 or a 503")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--bandwidth', type=float, default=0.0,
+                        help="speed request bodies arrive at, in bytes per "
+                        "second, 0 for no limit")
+    parser.add_argument('--reject-gzip', action='store_true',
+                        help="answer gzipped request bodies with a 415")
+    parser.add_argument('--capacity', type=int, default=0,
+                        help="number of requests answered at once, the "
+                        "others get a 429, 0 for no limit")
+    args = parser.parse_args()
+
+    server = FakeServer(
+        ('127.0.0.1', args.port),
+        FakeBookstack(
+            args.latency, args.jitter, args.error_rate, args.seed,
+            args.bandwidth, not args.reject_gzip, args.capacity
+        )
+    )
+    # The first line tells whoever started the server where it listens.
+    print(server.url, flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""This module provides the measurements and reports shared by benchmarks."""
+# benchmarks/report.py
+
+import json
+import sys
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Get a percentile of a list of values, by nearest rank.
+
+    :param values:
+        The values, in any order.
+    :type values: List[float]
+    :param fraction:
+        The percentile, between 0 and 1, e.g. 0.99 for p99.
+    :type fraction: float
+
+    :return:
+        The percentile, 0 if there are no values.
+    :rtype: float
+    """
+
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def peak_rss(children: bool = False) -> Optional[int]:
+    """
+    Get the peak resident set size of the process, or of its finished
+    children, in bytes.
+
+    :return:
+        The peak RSS, None where it can't be measured.
+    :rtype: Optional[int]
+    """
+
+    if resource is None:
+        return None
+
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def print_results(title: str, results: Dict[str, float]) -> None:
+    """
+    Print the results of a benchmark as an aligned list.
+    """
+
+    print(title)
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        print(f"  {name:<{width}}  {value:,.4g}")
+
+
+def save_results(path: Path, results: Dict[str, float]) -> None:
+    """
+    Save the results of a benchmark as JSON, to compare them later.
+    """
+
+    with path.open('w') as file:
+        json.dump(results, file, indent=2)
+
+
+def compare_results(path: Path, results: Dict[str, float]) -> None:
+    """
+    Print how the results changed since those saved in `path`.
+    """
+
+    with path.open('r') as file:
+        baseline = json.load(file)
+
+    print(f"Compared with {path}:")
+    for name, value in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        change = (value - before) / before * 100
+        print(f"  {name:<24}  {before:>12,.4g} -> {value:<12,.4g} "
+              f"({change:+.1f}%)")
@@ -0,0 +1,179 @@
+"""This module generates synthetic Obsidian vaults."""
+# benchmarks/vault.py
+
+import argparse
+import math
+import random
+
+from pathlib import Path
+from typing import NamedTuple, Sequence
+
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam "
+    "quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo"
+).split()
+
+
+class VaultSpec(NamedTuple):
+    """
+    Describes a synthetic vault.
+    Contains:
+    - The number of Markdown files.
+    - The number of subdirectories, imported as chapters. Files are spread
+      evenly between the root and the subdirectories.
+    - The mean size of a file, in bytes. Sizes follow a log-normal
+      distribution, so a few files are much larger than the others.
+    - The fraction of files starting with a front matter with tags.
+    - The depth of extra subdirectories inside each chapter, which
+      bsimport ignores, 0 for none.
+    - The seed of the generator, the same spec always gives the same vault.
+    - The mean number of wikilinks of a file, to random files of the
+      vault, 0 for none.
+    """
+    pages: int = 100
+    chapters: int = 5
+    size: int = 4096
+    front_matter: float = 0.5
+    depth: int = 0
+    seed: int = 0
+    links: int = 0
+
+
+def page_text(
+    rng: random.Random,
+    title: str,
+    size: int,
+    tags: bool,
+    links: Sequence[str] = ()
+) -> str:
+    """
+    Generate the content of a Markdown file of about `size` bytes.
+
+    :param rng:
+        The random generator.
+    :type rng: random.Random
+    :param title:
+        The title (H1 header) of the file.
+    :type title: str
+    :param size:
+        The approximate size, in bytes.
+    :type size: int
+    :param tags:
+        Whether to start with a front matter holding tags.
+    :type tags: bool
+    :param links:
+        The wikilinks to scatter in the text, e.g. '[[Page 3]]'.
+    :type links: Sequence[str]
+
+    :return:
+        The content.
+    :rtype: str
+    """
+
+    parts = list()
+
+    if tags:
+        names = ', '.join(rng.sample(WORDS, rng.randint(1, 4)))
+        parts.append(f"---\naliases: [{title}]\ntags: [{names}]\n---\n")
+
+    parts.append(f"# {title}\n")
+
+    length = sum(len(part) for part in parts)
+    section = 0
+
+    while length < size:
+        section += 1
+        paragraph = ' '.join(rng.choices(WORDS, k=rng.randint(20, 120)))
+        chunk = f"## Section {section}\n{paragraph}\n\n"
+        parts.append(chunk)
+        length += len(chunk)
+
+    first = len(parts) - section
+    for link in links:
+        if not section:
+            parts.append(f"See {link}.\n")
+            continue
+        index = rng.randrange(first, len(parts))
+        parts[index] = f"{parts[index].rstrip()} See {link}.\n\n"
+
+    return ''.join(parts)
+
+
+def generate_vault(root: Path, spec: VaultSpec = VaultSpec()) -> Path:
+    """
+    Write a synthetic vault.
+
+    :param root:
+        The directory to create, imported as the book.
+    :type root: Path
+    :param spec:
+        What the vault looks like.
+    :type spec: VaultSpec
+
+    :return:
+        The path to the vault.
+    :rtype: Path
+    """
+
+    rng = random.Random(spec.seed)
+
+    root.mkdir(parents=True, exist_ok=True)
+    directories = [root]
+
+    for chapter in range(spec.chapters):
+        path = root / f"Chapter {chapter}"
+        path.mkdir(exist_ok=True)
+        directories.append(path)
+
+        ignored = path
+        for level in range(spec.depth):
+            ignored = ignored / f"Level {level}"
+            ignored.mkdir(exist_ok=True)
+            (ignored / "ignored.md").write_text("# Ignored\n## Nothing\n")
+
+    # A log-normal distribution whose mean is `spec.size`.
+    sigma = 1.0
+    mu = max(0.0, math.log(spec.size) - sigma ** 2 / 2)
+
+    for page in range(spec.pages):
+        directory = directories[page % len(directories)]
+        title = f"Page {page}"
+        size = int(rng.lognormvariate(mu, sigma))
+        tags = rng.random() < spec.front_matter
+        links = [
+            f"[[Page {rng.randrange(spec.pages)}]]" if rng.random() < 0.8
+            else f"[[Page {rng.randrange(spec.pages)}|this page]]"
+            for _ in range(rng.randint(0, 2 * spec.links) if spec.links else 0)
+        ]
+        text = page_text(rng, title, size, tags, links)
+        (directory / f"{title}.md").write_text(text)
+
+    return root
+
+
+def main() -> None:
+    default = VaultSpec()
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic vault.")
+    parser.add_argument('root', type=Path)
+    parser.add_argument('--pages', type=int, default=default.pages)
+    parser.add_argument('--chapters', type=int, default=default.chapters)
+    parser.add_argument('--size', type=int, default=default.size)
+    parser.add_argument('--front-matter', type=float,
+                        default=default.front_matter)
+    parser.add_argument('--depth', type=int, default=default.depth)
+    parser.add_argument('--seed', type=int, default=default.seed)
+    parser.add_argument('--links', type=int, default=default.links)
+    args = parser.parse_args()
+
+    spec = VaultSpec(
+        args.pages, args.chapters, args.size, args.front_matter,
+        args.depth, args.seed, args.links
+    )
+    generate_vault(args.root, spec)
+
+
+if __name__ == '__main__':
+    main()
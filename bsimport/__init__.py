@@ -16,8 +16,9 @@ __version__ = "0.1.0"
     NAME_TOO_LONG_ERROR,
     DESC_TOO_LONG_ERROR,
     REQUEST_ERROR,
-    NO_ID_ERROR
-) = range(12)
+    NO_ID_ERROR,
+    FILE_WRITE_ERROR
+) = range(13)
 
 ERRORS = {
     CONF_DIR_ERROR: "config directory error",
@@ -30,5 +31,38 @@ ERRORS = {
     NAME_TOO_LONG_ERROR: "the name is too long (max 255 characters)",
     DESC_TOO_LONG_ERROR: "the description is too long (max 1000 characters)",
     REQUEST_ERROR: "API request error",
-    NO_ID_ERROR: "no book or chapter ID provided"
+    NO_ID_ERROR: "no book or chapter ID provided",
+    FILE_WRITE_ERROR: "error writing file"
 }
+
+# The defaults of the CLI options are kept here, so the CLI can declare
+# its options without importing the modules that use them.
+
+# Maximum number of connections kept alive to the Bookstack instance.
+DEFAULT_POOL_SIZE = 10
+
+# Maximum number of times a failed request is sent again.
+DEFAULT_MAX_RETRIES = 5
+
+# Number of items per request when listing, Bookstack allows up to 500.
+DEFAULT_PAGE_SIZE = 100
+
+# The size from which request bodies are gzipped with '--compress', in
+# bytes: below it, the saving isn't worth the headers.
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+# The size from which a file is streamed from disk as its page is sent,
+# rather than read in memory, in bytes.
+DEFAULT_STREAM_THRESHOLD = 8 << 20
+
+# How long `watch` waits for changes to settle before sending them, and
+# how often it looks for changes without watchdog, in seconds.
+DEFAULT_DEBOUNCE = 1.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+# How long a listing fetched from the instance is trusted, in seconds.
+DEFAULT_CACHE_TTL = 3600
+
+# Environment variables enabling the profiler without the CLI options.
+PROFILE_ENV = "BSIMPORT_PROFILE"
+PROFILE_MEMORY_ENV = "BSIMPORT_PROFILE_MEMORY"
@@ -0,0 +1,685 @@
+"""This module provides an asyncio counterpart of the API wrapper."""
+# bsimport/aiowrapper.py
+
+import asyncio
+import io
+import json
+import time
+
+from pathlib import Path
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple,
+    Union
+)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from bsimport import FILE_READ_ERROR, REQUEST_ERROR, SUCCESS
+from bsimport.limit import AdaptiveLimit
+from bsimport.parser import TextRange
+from bsimport.stats import Stats
+from bsimport.wrapper import (
+    DEFAULT_PAGE_SIZE, DEFAULT_POOL_SIZE, GZIP_HEADERS, JSON_HEADERS,
+    RETRY_STATUSES, STREAM_CHUNK_SIZE, BResponse, JsonTextBody,
+    MultipartFile, RequestError, RetryPolicy, _book_payload,
+    _chapter_payload, _encode_json, _encoding_rejected, _page_id,
+    _page_payload, _parse_retry_after, _shelf_payload, _to_response
+)
+
+
+# Enough of the response to a page to find its ID, see wrapper._page_id.
+PAGE_ID_HEAD = 64
+
+
+async def _read_page(resp: 'aiohttp.ClientResponse') -> Any:
+    """
+    Decode the body of the response to a streamed page, holding at most a
+    chunk of it in memory.
+
+    See wrapper._read_page.
+    """
+
+    if not 200 <= resp.status < 300:
+        raw = await resp.read()
+    else:
+        head = b""
+        while len(head) < PAGE_ID_HEAD and not resp.content.at_eof():
+            head += await resp.content.read(PAGE_ID_HEAD - len(head))
+        body = _page_id(head)
+        if body is not None:
+            # Read to the end, so the connection is reused.
+            async for _ in resp.content.iter_chunked(STREAM_CHUNK_SIZE):
+                pass
+            return body
+        raw = head + await resp.content.read()
+
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+class AsyncBookstack():
+    """
+    An asyncio client for Bookstack's API.
+
+    Mirrors Bookstack: the methods take the same arguments and return the
+    same BResponse, but are coroutines sharing a single aiohttp session.
+    Requires the 'async' extra (aiohttp).
+    """
+
+    def __init__(
+        self,
+        id: str,
+        secret: str,
+        url: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        retry: Optional[RetryPolicy] = None,
+        stats: Optional[Stats] = None,
+        compress_threshold: Optional[int] = None,
+        limit: Optional[AdaptiveLimit] = None
+    ):
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncBookstack requires aiohttp, install it with "
+                "'python -m pip install bsimport[async]'."
+            )
+
+        self._header = {
+            'Authorization': f"Token {id}:{secret}"
+        }
+        self._instance_url = url
+        self._url = f"{url}/api"
+        self._pool_size = pool_size
+        self._session = None
+        self._stats = stats
+        self._retry = retry if retry is not None else RetryPolicy()
+        self._retries = 0
+        self._backoff = 0.0
+        self._limit = limit
+        self._compress_threshold = compress_threshold
+        self._compression = {
+            'compressed': 0,
+            'raw_bytes': 0,
+            'bytes_saved': 0,
+            'rejected': False
+        }
+        self._pool_stats = {
+            'requests': 0,
+            'connections': 0,
+            'reused': 0
+        }
+
+    async def __aenter__(self) -> 'AsyncBookstack':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        """
+        Get the session, creating it on first use since it must be
+        created from within the running event loop.
+        """
+
+        if self._session is None:
+
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_end.append(self._on_connection_create)
+            trace.on_connection_reuseconn.append(self._on_connection_reuse)
+            trace.on_request_chunk_sent.append(self._on_request_chunk_sent)
+
+            self._session = aiohttp.ClientSession(
+                headers=self._header,
+                connector=aiohttp.TCPConnector(limit=self._pool_size),
+                trace_configs=[trace]
+            )
+
+        return self._session
+
+    async def _on_request_start(self, session, context, params) -> None:
+        self._pool_stats['requests'] += 1
+
+    async def _on_connection_create(self, session, context, params) -> None:
+        self._pool_stats['connections'] += 1
+
+    async def _on_connection_reuse(self, session, context, params) -> None:
+        self._pool_stats['reused'] += 1
+
+    async def _on_request_chunk_sent(self, session, context, params) -> None:
+        # Counts the bytes of the body of the attempt, see `_request`.
+        if context.trace_request_ctx is not None:
+            context.trace_request_ctx['sent'] += len(params.chunk)
+
+    async def close(self) -> None:
+        """
+        Close the session and every pooled connection.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        Get the connection reuse statistics of the pool.
+
+        :return:
+            The number of requests sent, connections opened and requests
+            that reused an already open connection.
+        :rtype: Dict[str, int]
+        """
+        return dict(self._pool_stats)
+
+    def retry_stats(self) -> Dict[str, float]:
+        """
+        Get the retry statistics of the client.
+
+        See Bookstack.retry_stats.
+        """
+        return {
+            'retries': self._retries,
+            'backoff': self._backoff
+        }
+
+    def compression_stats(self) -> Dict[str, int]:
+        """
+        Get the compression statistics of the client.
+
+        See Bookstack.compression_stats.
+        """
+        return dict(self._compression)
+
+    def _record_request(
+        self,
+        method: str,
+        path: str,
+        status: Optional[int],
+        start: float,
+        attempt_ctx: Dict[str, int]
+    ) -> None:
+        """
+        Record the timing of a request attempt, if stats are collected.
+        """
+
+        if self._stats is None:
+            return
+
+        self._stats.record_request(
+            method, path, status, time.perf_counter() - start,
+            attempt_ctx['sent']
+        )
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        read: Optional[Callable[[Any], Awaitable[Any]]] = None,
+        limited: bool = False,
+        **kwargs: Any
+    ) -> Tuple[Optional[int], Any]:
+        """
+        Send a request, retrying it according to the retry policy.
+
+        See Bookstack._request.
+
+        :param read:
+            Decodes the body of the response instead of reading it as
+            JSON, see `_read_page`.
+        :type read: Optional[Callable[[aiohttp.ClientResponse], Awaitable]]
+        :param limited:
+            Whether each attempt waits for the concurrency limit, if any.
+        :type limited: bool
+
+        :return:
+            The status of the last response, None if the request couldn't
+            be sent.
+        :rtype: Optional[int]
+        :return:
+            The decoded JSON body of the last response, or the error that
+            kept the request from being sent.
+        :rtype: Any
+        """
+
+        session = self._get_session()
+        url = f"{self._url}/{path}"
+        attempt = 0
+        data = kwargs.get('data')
+        limit = self._limit if limited else None
+
+        while True:
+            # A streamed body is sent again from its start.
+            if isinstance(data, io.IOBase):
+                data.seek(0)
+            attempt_ctx = {'sent': 0}
+            if limit is not None:
+                await limit.acquire_async()
+            start = time.perf_counter()
+            try:
+                async with session.request(
+                    method, url, trace_request_ctx=attempt_ctx, **kwargs
+                ) as resp:
+                    status = resp.status
+                    retry_after = _parse_retry_after(resp.headers)
+                    if read is not None:
+                        body = await read(resp)
+                    else:
+                        try:
+                            body = await resp.json(content_type=None)
+                        except ValueError:
+                            body = None
+
+            except asyncio.CancelledError:
+                if limit is not None:
+                    limit.release(None, False)
+                raise
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._record_request(method, path, None, start, attempt_ctx)
+                if limit is not None:
+                    limit.release(None, True)
+                connected = not isinstance(e, aiohttp.ClientConnectorError)
+                retry = self._retry.retry_error(method, connected)
+                if attempt >= self._retry.max_retries or not retry:
+                    return None, str(e)
+                delay = self._retry.delay(attempt)
+
+            else:
+                self._record_request(method, path, status, start, attempt_ctx)
+                if limit is not None:
+                    limit.release(
+                        time.perf_counter() - start, status in RETRY_STATUSES
+                    )
+                retry = self._retry.retry_status(method, status)
+                if attempt >= self._retry.max_retries or not retry:
+                    return status, body
+                delay = self._retry.delay(attempt, retry_after)
+
+            self._retries += 1
+            self._backoff += delay
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send_json(
+        self,
+        method: str,
+        path: str,
+        payload: Any,
+        **kwargs: Any
+    ) -> Tuple[Optional[int], Any]:
+        """
+        Send a JSON body, gzipped if it's large enough.
+
+        See Bookstack._send_json and `_request`.
+        """
+
+        threshold = None if self._compression['rejected'] \
+            else self._compress_threshold
+        data, compressed = _encode_json(payload, threshold)
+
+        if compressed is not None:
+            status, body = await self._request(
+                method, path, data=compressed, headers=GZIP_HEADERS, **kwargs
+            )
+            if status is None:
+                return status, body
+            if not _encoding_rejected(status, body):
+                self._compression['compressed'] += 1
+                self._compression['raw_bytes'] += len(data)
+                self._compression['bytes_saved'] += len(data) - len(compressed)
+                return status, body
+
+        status, body = await self._request(
+            method, path, data=data, headers=JSON_HEADERS, **kwargs
+        )
+        if compressed is not None and status is not None \
+                and not _encoding_rejected(status, body):
+            self._compression['rejected'] = True
+
+        return status, body
+
+    async def _call(
+        self,
+        method: str,
+        path: str,
+        key: Optional[str] = None,
+        default: Any = None,
+        **kwargs: Any
+    ) -> BResponse:
+        """
+        Send a request and turn its response into a BResponse.
+
+        See Bookstack._call.
+        """
+
+        if 'json' in kwargs and self._compress_threshold is not None:
+            status, body = await self._send_json(
+                method, path, kwargs.pop('json'), **kwargs
+            )
+        else:
+            status, body = await self._request(method, path, **kwargs)
+
+        if status is None:
+            return BResponse(REQUEST_ERROR, body)
+
+        return _to_response(status, body, key, default)
+
+    async def create_shelf(
+        self,
+        name: str,
+        description: Optional[str] = None,
+        books: Optional[List[int]] = None
+    ) -> BResponse:
+        """
+        Create a new shelf.
+
+        See Bookstack.create_shelf.
+        """
+
+        error, shelf = _shelf_payload(name, description, books)
+        if error:
+            return BResponse(error, "")
+
+        return await self._call('POST', 'shelves', 'id', -1, json=shelf)
+
+    async def update_shelf(
+        self,
+        shelf_id: int,
+        books: List[int]
+    ) -> BResponse:
+        """
+        Set the books of a shelf, replacing the current ones.
+
+        See Bookstack.update_shelf.
+        """
+        return await self._call(
+            'PUT', f"shelves/{shelf_id}", 'id', -1, json={'books': books}
+        )
+
+    async def create_book(
+        self,
+        name: str,
+        description: Optional[str] = None,
+        tags: Optional[List[Dict[str, str]]] = None
+    ) -> BResponse:
+        """
+        Create a book.
+
+        See Bookstack.create_book.
+        """
+
+        error, book = _book_payload(name, description, tags)
+        if error:
+            return BResponse(error, "")
+
+        return await self._call('POST', 'books', 'id', -1, json=book)
+
+    async def create_chapter(
+        self,
+        book_id: int,
+        name: str,
+        description: Optional[str] = None,
+        tags: Optional[List[Dict[str, str]]] = None
+    ) -> BResponse:
+        """
+        Create a chapter.
+
+        See Bookstack.create_chapter.
+        """
+
+        error, chapter = _chapter_payload(book_id, name, description, tags)
+        if error:
+            return BResponse(error, "")
+
+        return await self._call('POST', 'chapters', 'id', -1, json=chapter)
+
+    async def _send_page(
+        self,
+        method: str,
+        path: str,
+        page: Dict[str, Any]
+    ) -> BResponse:
+        """
+        Send the body of a page, streaming its text if it's a TextRange.
+
+        See Bookstack._send_page.
+        """
+
+        fields = dict(page)
+        text = fields.pop('markdown')
+        if not isinstance(text, TextRange):
+            return await self._call(
+                method, path, 'id', -1, limited=True, json=page
+            )
+
+        try:
+            with JsonTextBody(fields, 'markdown', text) as body:
+                status, data = await self._request(
+                    method, path, _read_page, limited=True,
+                    data=body, headers={**JSON_HEADERS,
+                                        'Content-Length': str(len(body))}
+                )
+        except (OSError, UnicodeDecodeError) as e:
+            return BResponse(FILE_READ_ERROR, str(e))
+
+        if status is None:
+            return BResponse(REQUEST_ERROR, data)
+
+        return _to_response(status, data, 'id', -1)
+
+    async def create_page(
+        self,
+        name: str,
+        text: Union[str, TextRange],
+        tags: Optional[List[Dict[str, str]]] = None,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> BResponse:
+        """
+        Create a page.
+
+        See Bookstack.create_page.
+        """
+
+        error, page = _page_payload(name, text, tags, book_id, chapter_id)
+        if error:
+            return BResponse(error, "")
+
+        return await self._send_page('POST', 'pages', page)
+
+    async def update_page(
+        self,
+        page_id: int,
+        name: str,
+        text: Union[str, TextRange],
+        tags: Optional[List[Dict[str, str]]] = None,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> BResponse:
+        """
+        Update the name, content and tags of a page, and move it if
+        a book or chapter is provided.
+
+        See Bookstack.update_page.
+        """
+
+        error, page = _page_payload(name, text, tags, book_id, chapter_id)
+        if error:
+            return BResponse(error, "")
+
+        if page.get('chapter_id') == -1:
+            del page['chapter_id']
+
+        return await self._send_page('PUT', f"pages/{page_id}", page)
+
+    async def delete_page(self, page_id: int) -> BResponse:
+        """
+        Delete a page, sending it to the recycle bin.
+
+        See Bookstack.delete_page.
+        """
+        return await self._call('DELETE', f"pages/{page_id}")
+
+    async def delete_chapter(self, chapter_id: int) -> BResponse:
+        """
+        Delete a chapter and its pages, sending them to the recycle bin.
+
+        See Bookstack.delete_chapter.
+        """
+        return await self._call('DELETE', f"chapters/{chapter_id}")
+
+    async def upload_image(self, path: Path, page_id: int) -> BResponse:
+        """
+        Upload an image to the gallery, streaming it from disk.
+
+        See Bookstack.upload_image.
+        """
+
+        fields = {
+            'type': 'gallery',
+            'uploaded_to': str(page_id),
+            'name': path.name
+        }
+
+        try:
+            with MultipartFile(fields, 'image', path) as body:
+                return await self._call(
+                    'POST', 'image-gallery', 'url', "",
+                    data=body, headers={'Content-Type': body.content_type,
+                                        'Content-Length': str(len(body))}
+                )
+        except OSError as e:
+            return BResponse(FILE_READ_ERROR, str(e))
+
+    async def upload_attachment(self, path: Path, page_id: int) -> BResponse:
+        """
+        Upload a file as an attachment of a page, streaming it from disk.
+
+        See Bookstack.upload_attachment.
+        """
+
+        fields = {
+            'name': path.name,
+            'uploaded_to': str(page_id)
+        }
+
+        try:
+            with MultipartFile(fields, 'file', path) as body:
+                error, data = await self._call(
+                    'POST', 'attachments', 'id', -1,
+                    data=body, headers={'Content-Type': body.content_type,
+                                        'Content-Length': str(len(body))}
+                )
+        except OSError as e:
+            return BResponse(FILE_READ_ERROR, str(e))
+
+        if error:
+            return BResponse(error, data)
+
+        return BResponse(SUCCESS, f"{self._instance_url}/attachments/{data}")
+
+    def page_url(self, page_id: int) -> str:
+        """
+        Get the permanent URL of a page.
+
+        See Bookstack.page_url.
+        """
+        return f"{self._instance_url}/link/{page_id}"
+
+    async def _list_page(
+        self,
+        path: str,
+        offset: int,
+        count: int,
+        params: Optional[Dict[str, Any]] = None
+    ) -> BResponse:
+        """
+        Get one page of a listing endpoint.
+
+        See Bookstack._list_page.
+        """
+
+        query: Dict[str, Any] = {'count': count, 'offset': offset}
+        if params is not None:
+            query.update(params)
+
+        return await self._call('GET', path, 'data', [], params=query)
+
+    async def _iter_list(
+        self,
+        path: str,
+        first: List[Dict[str, Any]],
+        count: int,
+        prefetch: bool,
+        params: Optional[Dict[str, Any]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the items of a listing endpoint page by page.
+
+        See Bookstack._iter_list.
+        """
+
+        data = first
+        offset = 0
+
+        while True:
+
+            last = len(data) < count
+            offset += count
+
+            if prefetch and not last:
+                future = asyncio.ensure_future(
+                    self._list_page(path, offset, count, params)
+                )
+
+            for item in data:
+                yield item
+
+            if last:
+                return
+
+            if prefetch:
+                error, data = await future
+            else:
+                error, data = await self._list_page(
+                    path, offset, count, params
+                )
+
+            if error:
+                raise RequestError(error, data)
+
+    async def list_all(
+        self,
+        path: str,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = False,
+        params: Optional[Dict[str, Any]] = None
+    ) -> BResponse:
+        """
+        List every item of a listing endpoint, page by page.
+
+        See Bookstack.list_all, the iterator is asynchronous.
+        """
+
+        error, first = await self._list_page(path, 0, count, params)
+        if error:
+            return BResponse(error, first)
+
+        return BResponse(
+            SUCCESS, self._iter_list(path, first, count, prefetch, params)
+        )
+
+    async def list_books(
+        self,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = False
+    ) -> BResponse:
+        """
+        List every accessible book.
+
+        See Bookstack.list_books.
+        """
+        return await self.list_all('books', count, prefetch)
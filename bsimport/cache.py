@@ -0,0 +1,252 @@
+"""This module caches the books, chapters and pages of the instance."""
+# bsimport/cache.py
+
+import json
+import os
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from bsimport import DEFAULT_CACHE_TTL, config
+
+
+INDEX_FILE_PATH = config.CONFIG_DIR_PATH / "index.json"
+
+BOOKS = "books"
+CHAPTERS = "chapters"
+PAGES = "pages"
+
+KINDS = (BOOKS, CHAPTERS, PAGES)
+
+# The fields kept for each kind of item, besides its ID and name.
+FIELDS = {
+    BOOKS: (),
+    CHAPTERS: ('book_id',),
+    PAGES: ('book_id', 'chapter_id')
+}
+
+
+class RemoteIndex():
+    """
+    An on-disk index of the books, chapters and pages of the instance,
+    used to resolve names to IDs without a request.
+
+    Each kind of item is refreshed as a whole from the API and trusted for
+    `ttl` seconds. Everything bsimport creates, updates or deletes is
+    written through, so the index stays accurate in between.
+    """
+
+    def __init__(
+        self,
+        path: Path = INDEX_FILE_PATH,
+        ttl: float = DEFAULT_CACHE_TTL
+    ):
+        self._path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: Dict[str, Dict[int, Dict[str, Any]]] = {
+            kind: dict() for kind in KINDS
+        }
+        self._fetched: Dict[str, float] = dict()
+        # (kind, name) -> IDs, rebuilt on load.
+        self._names: Dict[Tuple[str, str], Dict[int, None]] = dict()
+        self._dirty = False
+
+    @classmethod
+    def load(
+        cls,
+        path: Path = INDEX_FILE_PATH,
+        ttl: float = DEFAULT_CACHE_TTL
+    ) -> 'RemoteIndex':
+        """
+        Read the index from disk.
+
+        :param path:
+            The path to the index file.
+        :type path: Path
+        :param ttl:
+            How long a listing is trusted, in seconds.
+        :type ttl: float
+
+        :return:
+            The index, empty if the file doesn't exist or is invalid.
+        :rtype: RemoteIndex
+        """
+
+        index = cls(path, ttl)
+
+        try:
+            with path.open('r') as file:
+                data = json.load(file)
+            fetched = dict(data['fetched'])
+            items = {
+                kind: {int(id): item for id, item in data[kind].items()}
+                for kind in KINDS
+            }
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return index
+
+        index._fetched = fetched
+        index._items = items
+        for kind in KINDS:
+            for id, item in items[kind].items():
+                index._names.setdefault((kind, item['name']), {})[id] = None
+
+        return index
+
+    def save(self) -> bool:
+        """
+        Write the index to disk if it changed, replacing the previous one
+        atomically.
+
+        :return:
+            Whether the index is saved.
+        :rtype: bool
+        """
+
+        tmp_path = self._path.with_suffix('.tmp')
+
+        with self._lock:
+            if not self._dirty:
+                return True
+
+            data: Dict[str, Any] = {'fetched': self._fetched}
+            data.update(self._items)
+
+            try:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                with tmp_path.open('w') as file:
+                    json.dump(data, file)
+                os.replace(tmp_path, self._path)
+            except OSError:
+                return False
+
+            self._dirty = False
+
+        return True
+
+    def fresh(self, kind: str) -> bool:
+        """
+        Whether the listing of `kind` was fetched less than `ttl` ago.
+        """
+
+        with self._lock:
+            fetched = self._fetched.get(kind)
+
+        return fetched is not None and time.time() - fetched < self.ttl
+
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        """
+        Forget a kind of item, or everything, so it is fetched again.
+
+        :param kind:
+            BOOKS, CHAPTERS or PAGES, None for all of them.
+        :type kind: Optional[str]
+        """
+
+        kinds = KINDS if kind is None else (kind,)
+
+        with self._lock:
+            for kind in kinds:
+                self._fetched.pop(kind, None)
+                for id, item in self._items[kind].items():
+                    self._names.pop((kind, item['name']), None)
+                self._items[kind] = dict()
+            self._dirty = True
+
+    def refresh(self, kind: str, items: Iterable[Dict[str, Any]]) -> None:
+        """
+        Replace every item of a kind with a complete listing from the API.
+
+        :param kind:
+            BOOKS, CHAPTERS or PAGES.
+        :type kind: str
+        :param items:
+            The items as returned by the API.
+        :type items: Iterable[Dict[str, Any]]
+        """
+
+        self.invalidate(kind)
+
+        for item in items:
+            self.add(kind, item)
+
+        with self._lock:
+            self._fetched[kind] = time.time()
+
+    def add(self, kind: str, item: Dict[str, Any]) -> None:
+        """
+        Add or update an item.
+
+        :param kind:
+            BOOKS, CHAPTERS or PAGES.
+        :type kind: str
+        :param item:
+            The item, with at least its 'id' and 'name'.
+        :type item: Dict[str, Any]
+        """
+
+        id = item['id']
+        entry = {'name': item['name']}
+        for field in FIELDS[kind]:
+            entry[field] = item.get(field, -1)
+
+        with self._lock:
+            old = self._items[kind].get(id)
+            if old is not None:
+                self._names.get((kind, old['name']), {}).pop(id, None)
+
+            self._items[kind][id] = entry
+            self._names.setdefault((kind, entry['name']), {})[id] = None
+            self._dirty = True
+
+    def remove(self, kind: str, id: int) -> None:
+        """
+        Remove an item, e.g. after deleting it.
+        """
+
+        with self._lock:
+            old = self._items[kind].pop(id, None)
+            if old is not None:
+                self._names.get((kind, old['name']), {}).pop(id, None)
+                self._dirty = True
+
+    def find(self, kind: str, name: str, **fields: Any) -> int:
+        """
+        Resolve the name of an item to its ID.
+
+        :param kind:
+            BOOKS, CHAPTERS or PAGES.
+        :type kind: str
+        :param name:
+            The name of the item.
+        :type name: str
+        :param fields:
+            The other fields to match, e.g. `book_id` for a chapter.
+
+        :return:
+            The ID of the first matching item, -1 if there is none.
+        :rtype: int
+        """
+
+        with self._lock:
+            for id in self._names.get((kind, name), ()):
+                item = self._items[kind][id]
+                if all(item.get(k) == v for k, v in fields.items()):
+                    return id
+
+        return -1
+
+    def items(self, kind: str) -> Iterator[Tuple[int, str]]:
+        """
+        Iterate over the ID and name of every item of a kind.
+        """
+
+        with self._lock:
+            items = [
+                (id, item['name']) for id, item in self._items[kind].items()
+            ]
+
+        return iter(items)
@@ -1,16 +1,38 @@
 """This module provides the bsimport's CLI."""
 # bsimport/cli.py
 
+import json
+import sys
 import typer
 
+from collections import Counter
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Optional, Tuple
+from typing import (
+    TYPE_CHECKING, Any, Dict, Iterator, List, Optional, TextIO, Union
+)
 
 from bsimport import (
-    ERRORS, EXT_ERROR, NO_FILE_ERROR, NO_ID_ERROR, SUCCESS,
-    __app_name__, __version__, config, imp
+    DEFAULT_CACHE_TTL, DEFAULT_COMPRESS_THRESHOLD, DEFAULT_DEBOUNCE,
+    DEFAULT_MAX_RETRIES, DEFAULT_PAGE_SIZE, DEFAULT_POLL_INTERVAL,
+    DEFAULT_POOL_SIZE, DEFAULT_STREAM_THRESHOLD, ERRORS, EXT_ERROR,
+    NO_FILE_ERROR, PROFILE_ENV, PROFILE_MEMORY_ENV, SUCCESS, __app_name__,
+    __version__, config
 )
 
+# The other modules pull in requests, aiohttp and the profilers: they are
+# imported by the commands using them, so that e.g. '--version' and
+# 'where' start fast.
+if TYPE_CHECKING:
+    from bsimport import engine, imp, profiling
+    from bsimport.cache import RemoteIndex
+    from bsimport.journal import Journal
+    from bsimport.limit import AdaptiveLimit
+    from bsimport.links import LinkIndex
+    from bsimport.manifest import Manifest
+    from bsimport.media import MediaCache
+    from bsimport.stats import Stats
+
 app = typer.Typer()
 
 
@@ -52,15 +74,79 @@ def init(
     )
 
 
-def get_importer() -> imp.Importer:
+def get_importer(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    use_async: bool = False,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    manifest: Optional['Manifest'] = None,
+    index: Optional['RemoteIndex'] = None,
+    stats: Optional['Stats'] = None,
+    media: Optional['MediaCache'] = None,
+    links: Optional['LinkIndex'] = None,
+    compress_threshold: Optional[int] = None,
+    stream_threshold: Optional[int] = None,
+    split_size: Optional[int] = None,
+    ensure: bool = False,
+    limit: Optional['AdaptiveLimit'] = None
+) -> Union['imp.Importer', 'imp.AsyncImporter']:
     """
     Read the config file and get an Importer instance.
 
+    :param pool_size:
+        The maximum number of connections kept alive to the instance.
+    :type pool_size: int
+    :param use_async:
+        Whether to get an AsyncImporter instead.
+    :type use_async: bool
+    :param max_retries:
+        The maximum number of times a failed request is sent again.
+    :type max_retries: int
+    :param manifest:
+        The manifest of previous imports, None to import everything.
+    :type manifest: Optional[Manifest]
+    :param index:
+        The local index of the instance's content, None to always ask
+        the instance.
+    :type index: Optional[RemoteIndex]
+    :param stats:
+        Where to record the timings of the run, None to not record them.
+    :type stats: Optional[Stats]
+    :param media:
+        The cache of the uploaded files embedded in pages, None to not
+        upload them.
+    :type media: Optional[MediaCache]
+    :param links:
+        The index of the pages wikilinks point to, None to leave them
+        as they are.
+    :type links: Optional[LinkIndex]
+    :param compress_threshold:
+        The size from which request bodies are gzipped, in bytes, None to
+        never compress them.
+    :type compress_threshold: Optional[int]
+    :param stream_threshold:
+        The size from which files are streamed from disk, in bytes, None
+        to read them all in memory.
+    :type stream_threshold: Optional[int]
+    :param split_size:
+        The size above which pages are split at their headings, in
+        characters, None to never split them.
+    :type split_size: Optional[int]
+    :param ensure:
+        Whether to reuse the books and chapters of the same name instead
+        of creating new ones.
+    :type ensure: bool
+    :param limit:
+        Adapts the number of pages sent at once, None to send as many as
+        there are workers.
+    :type limit: Optional[AdaptiveLimit]
+
     :return:
         An Importer created with the config information.
-    :rtype: imp.Importer
+    :rtype: Union[imp.Importer, imp.AsyncImporter]
     """
 
+    from bsimport import imp
+
     error, info = config.read_config()
 
     if error == NO_FILE_ERROR:
@@ -76,7 +162,43 @@ def get_importer() -> imp.Importer:
         raise typer.Exit(error)
 
     id, secret, url = info
-    return imp.Importer(id, secret, url)
+
+    if use_async:
+        try:
+            return imp.AsyncImporter(
+                id, secret, url,
+                pool_size=pool_size,
+                max_retries=max_retries,
+                manifest=manifest,
+                index=index,
+                stats=stats,
+                media=media,
+                links=links,
+                compress_threshold=compress_threshold,
+                stream_threshold=stream_threshold,
+                split_size=split_size,
+                ensure=ensure,
+                limit=limit
+            )
+        except ImportError as e:
+            typer.secho(str(e), fg=typer.colors.RED)
+            raise typer.Exit(1)
+
+    return imp.Importer(
+        id, secret, url,
+        pool_size=pool_size,
+        max_retries=max_retries,
+        manifest=manifest,
+        index=index,
+        stats=stats,
+        media=media,
+        links=links,
+        compress_threshold=compress_threshold,
+        stream_threshold=stream_threshold,
+        split_size=split_size,
+        ensure=ensure,
+        limit=limit
+    )
 
 
 @app.command()
@@ -84,14 +206,16 @@ def where() -> None:
     """
     Show where the config file is.
     """
-    if not config.CONFIG_FILE_PATH.exists():
+    config_file = config.get_config_file()
+
+    if not config_file.exists():
         typer.secho(
             "Config file not found, please run \"bsimport init\".",
             fg=typer.colors.RED
         )
         raise typer.Exit(1)
 
-    typer.secho(f"Config file: {config.CONFIG_FILE_PATH}")
+    typer.secho(f"Config file: {config_file}")
 
 
 @app.command()
@@ -138,10 +262,10 @@ def modify(
     )
 
 
-def import_single_file(importer: imp.Importer, path: Path):
+def import_single_file(importer: 'imp.Importer', path: Path):
     """
     Import a file in single-file mode, i.e. asking the user
-    for a book ID.
+    for a book ID or name.
 
     :param importer:
         The Importer to use.
@@ -151,12 +275,31 @@ def import_single_file(importer: imp.Importer, path: Path):
     :type path: Path
     """
 
-    book_id = typer.prompt(
-        "What's the book ID? [leave empty if you don't know]",
-        default=-1,
-        type=int
+    book = typer.prompt(
+        "What's the book ID or name? [leave empty if you don't know]",
+        default="",
+        show_default=False
     )
 
+    if book.isdigit():
+        book_id = int(book)
+    elif book:
+        error, book_id = importer.find_book(book)
+        if error:
+            typer.secho(
+                f"Read list of books failed with: {ERRORS[error]}",
+                fg=typer.colors.RED
+            )
+            typer.secho(f"Debug: {book_id}")
+            raise typer.Exit(error)
+        if book_id == -1:
+            typer.secho(
+                f"No book named '{book}' found.",
+                fg=typer.colors.YELLOW
+            )
+    else:
+        book_id = -1
+
     if book_id == -1:
         typer.secho(
             "Use 'bsimport list_books' to get a list of all "
@@ -180,145 +323,189 @@ def import_single_file(importer: imp.Importer, path: Path):
             f"Imported page {msg}",
             fg=typer.colors.GREEN
         )
-        raise typer.Exit()
 
 
-def import_file(
-    importer: imp.Importer,
-    path: Path,
-    book_id: Optional[int] = -1,
-    chapter_id: Optional[int] = -1
-) -> Tuple[int, Any]:
+def report_result(result: 'engine.Result') -> str:
     """
-    Import a file in batch mode.
+    Show the outcome of a book, chapter or page import.
 
-    :param importer:
-        The importer to use.
-    :type importer: imp.Importer
-    :param path:
-        The path to the file.
-    :type path: Path
+    Pages unchanged since the last import are only counted.
 
-    :param book_id:
-        The ID of the book that will hold this page.
-        Required without `chapter_id`.
-    :type book_id: Optional[int]
-    :param chapter_id:
-        The ID of the chapter that will hold this page.
-        Required without `book_id`.
-    :type chapter_id: Optional[int]
+    :param result:
+        The result to show.
+    :type result: engine.Result
 
     :return:
-        The error code.
-    :rtype: int
-    :return:
-        The name of the page if successful, the error message otherwise.
+        The outcome: 'skipped', 'unchanged', 'imported', 'chapter',
+        'book', 'linked' or 'unlinked'.
     :rtype: str
-
-    .. note::
-        If both `book_id` and `chapter_id` are provided, `book_id`
-        takes precedence.
     """
 
-    if book_id == -1 and chapter_id == -1:
-        return (NO_ID_ERROR, "")
-
-    if book_id != -1:
-        error, data = importer.import_page(path, book_id=book_id)
-    else:
-        error, data = importer.import_page(path, chapter_id=chapter_id)
+    from bsimport import engine
 
-    if error:
-        return (error, data)
+    if result.kind == engine.BOOK:
 
-    name = data
+        if result.error:
+            typer.secho(
+                f"Create book failed with: {ERRORS[result.error]}",
+                fg=typer.colors.RED
+            )
+            typer.secho(f"Debug: {result.data}")
+            typer.secho(
+                f"Skipping book '{str(result.path)}'",
+                fg=typer.colors.YELLOW
+            )
+            return 'skipped'
 
-    return (error, name)
+        typer.secho(f"Created the book '{result.path.stem}'")
+        return 'book'
 
+    if result.kind == engine.CHAPTER:
 
-def import_subdir(
-    importer: imp.Importer,
-    path: Path,
-    book_id: int
-) -> Tuple[int, Any]:
-    """
-    Import a directory as a chapter.
+        if result.error:
+            typer.secho(
+                f"Create chapter failed with: {ERRORS[result.error]}",
+                fg=typer.colors.RED
+            )
+            typer.secho(f"Debug: {result.data}")
+            typer.secho(
+                f"Skipping chapter '{str(result.path)}'",
+                fg=typer.colors.YELLOW
+            )
+            return 'skipped'
 
-    :param importer:
-        The Importer to use.
-    :type importer: imp.Importer
-    :param path:
-        The path to the directory.
-    :type path: Path
-    :param book_id:
-        The ID of the book the chapter will be attached to.
-    :type book_id: int
+        typer.secho(f"Created the chapter '{result.path.stem}'")
+        return 'chapter'
 
-    :return:
-        An error code.
-    :rtype: int
-    :return:
-        The name of the page if successful, the error message otherwise.
-    :rtype: str
-    """
+    if result.kind == engine.LINK:
 
-    name = path.stem
+        if result.error:
+            typer.secho(
+                f"Update links failed with: {ERRORS[result.error]}",
+                fg=typer.colors.RED
+            )
+            typer.secho(f"Debug: {result.data}")
+            typer.secho(
+                f"Skipping the links of '{str(result.path)}'",
+                fg=typer.colors.YELLOW
+            )
+            return 'skipped'
 
-    typer.secho(f"Creating the chapter '{name}'")
+        if not result.changed:
+            return 'unlinked'
 
-    error, data = importer.import_chapter(path, book_id)
+        typer.secho(f"Linked page '{result.data}'")
+        return 'linked'
 
-    if error:
+    if result.error:
         typer.secho(
-            f"Create chapter failed with: {ERRORS[error]}",
+            f"Import page failed with: {ERRORS[result.error]}",
             fg=typer.colors.RED
         )
-        return (error, data)
+        typer.secho(f"Debug: {result.data}")
+        typer.secho(
+            f"Skipping page '{str(result.path)}'",
+            fg=typer.colors.YELLOW
+        )
+        return 'skipped'
 
-    chapter_id = data
+    if not result.changed:
+        return 'unchanged'
 
-    for child in path.iterdir():
+    typer.secho(f"Imported page '{result.data}'")
+    return 'imported'
 
-        if child.is_file() and child.suffix == '.md':
 
-            page_error, page_name = import_file(
-                importer, child, chapter_id=chapter_id
-            )
+def print_book_summary(name: str, outcomes: Counter):
+    """
+    Show how many pages of a book were imported, unchanged or skipped.
+
+    :param name:
+        The name of the book.
+    :type name: str
+    :param outcomes:
+        The number of items per outcome, see `report_result`.
+    :type outcomes: Counter
+    """
 
-            if page_error:
-                typer.secho(
-                    f"Import page failed with: {ERRORS[page_error]}",
-                    fg=typer.colors.RED
-                )
-                typer.secho(f"Debug: {page_name}")
-                typer.secho(
-                    f"Skipping page '{str(child)}'",
-                    fg=typer.colors.YELLOW
-                )
+    typer.secho(
+        f"Imported book {name} ({outcomes['imported']} pages imported, "
+        f"{outcomes['unchanged']} unchanged, "
+        f"{outcomes['linked']} linked, "
+        f"{outcomes['skipped']} items skipped)",
+        fg=typer.colors.GREEN
+    )
 
-            else:
-                typer.secho(
-                    f"Imported page '{page_name}'"
-                )
 
-        else:
-            continue
+def link_pages(importer: 'imp.Importer', jobs: int, outcomes: Counter):
+    """
+    Send again the pages whose wikilinks point to pages created after them.
+
+    :param importer:
+        The Importer used for the import.
+    :type importer: imp.Importer
+    :param jobs:
+        The number of pages sent concurrently.
+    :type jobs: int
+    :param outcomes:
+        The number of items per outcome, see `report_result`, updated.
+    :type outcomes: Counter
+    """
+
+    from bsimport import engine
+
+    for result in engine.link_pages(importer, jobs):
+        outcomes[report_result(result)] += 1
+
+
+async def link_pages_async(
+    importer: 'imp.AsyncImporter',
+    jobs: int,
+    outcomes: Counter
+):
+    """
+    Send again the pages whose wikilinks point to pages created after them,
+    with an AsyncImporter.
 
-    return (SUCCESS, name)
+    See `link_pages`.
+    """
+
+    from bsimport import engine
 
+    async for result in engine.link_pages_async(importer, jobs):
+        outcomes[report_result(result)] += 1
 
-def import_dir(importer: imp.Importer, path: Path):
+
+def import_dir(
+    importer: 'imp.Importer',
+    path: Path,
+    jobs: int = 1,
+    parse_workers: int = 0
+):
     """
     Import a directory as a book.
 
+    The book is created first, then its chapters, then the pages are
+    imported by up to `jobs` concurrent workers. The pages linking to
+    pages created after them are sent again at the end.
+
     :param importer:
         The Importer to use.
     :type importer: imp.Importer
     :param path:
         The path to the directory.
     :type path: Path
+    :param jobs:
+        The number of pages imported concurrently.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        importing workers.
+    :type parse_workers: int
     """
 
+    from bsimport import engine
+
     name = path.stem
 
     typer.secho(f"Creating the book '{name}'")
@@ -333,136 +520,1986 @@ def import_dir(importer: imp.Importer, path: Path):
 
     book_id = data
 
-    for child in path.iterdir():
-
-        if child.is_dir():
-            subdir_error, subdir_data = import_subdir(importer, child, book_id)
-            if subdir_error:
-                typer.secho(
-                    f"Import chapter failed with: {ERRORS[subdir_error]}",
-                    fg=typer.colors.RED
-                )
-                typer.secho(
-                    f"Skipping chapter '{str(child)}'",
-                    fg=typer.colors.YELLOW
-                )
-            else:
-                typer.secho(
-                    f"Imported chapter '{subdir_data}'"
-                )
+    outcomes: Counter = Counter()
 
-        elif child.is_file() and child.suffix == '.md':
-            page_error, page_data = import_file(
-                importer, child, book_id=book_id
-            )
-            if page_error:
-                typer.secho(
-                    f"Import page failed with: {ERRORS[page_error]}",
-                    fg=typer.colors.RED
-                )
-                typer.secho(
-                    f"Skipping page '{str(child)}'",
-                    fg=typer.colors.YELLOW
-                )
-            else:
-                typer.secho(
-                    f"Imported page '{page_data}'"
-                )
+    for result in engine.import_book_content(
+        importer, path, book_id, jobs, parse_workers
+    ):
+        outcomes[report_result(result)] += 1
 
-        else:
-            continue
+    link_pages(importer, jobs, outcomes)
 
-    typer.secho(
-        f"Imported book {name}",
-        fg=typer.colors.GREEN
-    )
-    raise typer.Exit()
+    print_book_summary(name, outcomes)
 
 
-@app.command(name="import")
-def import_from(
-    path: Path = typer.Argument(
-        ...,
-        help="The directory or file to import.",
-        exists=True,
-        readable=True,
-        resolve_path=True
-    )
-) -> None:
+async def import_dir_async(
+    importer: 'imp.AsyncImporter',
+    path: Path,
+    jobs: int = 1,
+    parse_workers: int = 0
+):
     """
-    Import a directory or a file.
+    Import a directory as a book with an AsyncImporter.
 
-    You can import a single file or an entire directory, just pass the path
-    and it will detect the type:
-
-    - If a file is detected, it will be imported as a page and
-    it will ask for the book ID (you can use 'bsimport list_books'
-    to display the books you can access).
+    Same as `import_dir`, except that up to `jobs` requests share a single
+    event loop. The importer is closed before returning.
 
-    - If a directory is detected, it will be imported as a book.
+    :param importer:
+        The AsyncImporter to use.
+    :type importer: imp.AsyncImporter
+    :param path:
+        The path to the directory.
+    :type path: Path
+    :param jobs:
+        The number of pages imported concurrently.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        event loop.
+    :type parse_workers: int
+    """
 
-        - If subdirectories are detected, they will be imported as chapters.
+    from bsimport import engine
 
-        - If sub-subdirectories are detected, they will be ignored.
-    """
+    name = path.stem
 
-    importer = get_importer()
+    typer.secho(f"Creating the book '{name}'")
 
-    if path.is_dir():
-        typer.secho("Directory detected, importing as book.")
-        import_dir(importer, path)
+    try:
+        error, data = await importer.import_book(path)
 
-    elif path.is_file():
-        typer.secho("File detected, importing as page.")
-        if path.suffix != '.md':
+        if error:
             typer.secho(
-                "This doesn't seem to be a Markdown file,"
-                "check the extension.",
-                fg=typer.colors.YELLOW
+                f"Create book failed with: {ERRORS[error]}"
             )
-            raise typer.Exit(EXT_ERROR)
-        import_single_file(importer, path)
+            raise typer.Exit(error)
 
+        book_id = data
 
-@app.command()
-def list_books() -> None:
+        outcomes: Counter = Counter()
+
+        async for result in engine.import_book_content_async(
+            importer, path, book_id, jobs, parse_workers
+        ):
+            outcomes[report_result(result)] += 1
+
+        await link_pages_async(importer, jobs, outcomes)
+
+    finally:
+        await importer.close()
+
+    print_book_summary(name, outcomes)
+
+
+def shelf_books(books: Dict[Path, int]) -> List[int]:
     """
-    List all the accessible books and their ID.
+    Order the books of a shelf like their directories.
+
+    :param books:
+        The ID of each book, by directory.
+    :type books: Dict[Path, int]
+
+    :return:
+        The IDs.
+    :rtype: List[int]
+    """
+    return [books[path] for path in sorted(books)]
+
+
+def warn_shelf_pages(path: Path):
+    """
+    Warn the user about the Markdown files at the top of a shelf, which
+    can't be imported since shelves only hold books.
+
+    :param path:
+        The path to the directory imported as the shelf.
+    :type path: Path
     """
 
-    importer = get_importer()
+    from bsimport import engine
+
+    pages = engine.list_pages(path)
+
+    if pages:
+        typer.secho(
+            f"Ignoring {len(pages)} files at the top of the shelf, "
+            "shelves can only hold books.",
+            fg=typer.colors.YELLOW
+        )
+
 
-    error, books = importer.list_books()
+def print_shelf_summary(
+    name: str,
+    error: int,
+    data: Any,
+    outcomes: Counter
+):
+    """
+    Show the outcome of the shelf request, and how many books and pages
+    were imported, unchanged or skipped.
+
+    :param name:
+        The name of the shelf.
+    :type name: str
+    :param error:
+        The error code of the shelf request.
+    :type error: int
+    :param data:
+        The shelf ID, or the error message.
+    :type data: Any
+    :param outcomes:
+        The number of items per outcome, see `report_result`.
+    :type outcomes: Counter
+    """
 
     if error:
         typer.secho(
-            f"Read list of books failed with: {ERRORS[error]}",
+            f"Create shelf failed with: {ERRORS[error]}",
             fg=typer.colors.RED
         )
-        typer.secho(f"Debug: {books}")
+        typer.secho(f"Debug: {data}")
         raise typer.Exit(error)
 
     typer.secho(
-        "\nBook list:\n"
-    )
-    columns = (
-        "ID.  ",
-        "| Title  "
+        f"Imported shelf {name} ({outcomes['book']} books, "
+        f"{outcomes['imported']} pages imported, "
+        f"{outcomes['unchanged']} unchanged, "
+        f"{outcomes['linked']} linked, "
+        f"{outcomes['skipped']} items skipped)",
+        fg=typer.colors.GREEN
     )
-    headers = "".join(columns)
-    typer.secho(headers)
 
-    max_length = len(max(books.values(), key=len))
-    total_length = len(headers) - len(" Title  ") + max_length + 1
-    typer.secho("-" * total_length)
 
-    for k, v in books.items():
+def import_shelf(
+    importer: 'imp.Importer',
+    path: Path,
+    jobs: int = 1,
+    parse_workers: int = 0
+):
+    """
+    Import a directory as a shelf, and its subdirectories as books.
+
+    The books are created concurrently, along with their chapters and
+    pages, then the shelf is created, or updated, with every book in a
+    single request.
+
+    :param importer:
+        The Importer to use.
+    :type importer: imp.Importer
+    :param path:
+        The path to the directory.
+    :type path: Path
+    :param jobs:
+        The number of books and pages imported concurrently.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        importing workers.
+    :type parse_workers: int
+    """
+
+    from bsimport import engine
+
+    name = path.stem
+
+    typer.secho(f"Creating the books of the shelf '{name}'")
+    warn_shelf_pages(path)
+
+    books: Dict[Path, int] = dict()
+    outcomes: Counter = Counter()
+
+    for result in engine.import_shelf_content(
+        importer, path, jobs, parse_workers
+    ):
+        if result.kind == engine.BOOK and not result.error:
+            books[result.path] = result.data
+        outcomes[report_result(result)] += 1
+
+    link_pages(importer, jobs, outcomes)
+
+    error, data = importer.import_shelf(path, shelf_books(books))
+
+    print_shelf_summary(name, error, data, outcomes)
+
+
+async def import_shelf_async(
+    importer: 'imp.AsyncImporter',
+    path: Path,
+    jobs: int = 1,
+    parse_workers: int = 0
+):
+    """
+    Import a directory as a shelf with an AsyncImporter.
+
+    Same as `import_shelf`, except that up to `jobs` requests share a
+    single event loop. The importer is closed before returning.
+
+    :param importer:
+        The AsyncImporter to use.
+    :type importer: imp.AsyncImporter
+    :param path:
+        The path to the directory.
+    :type path: Path
+    :param jobs:
+        The number of books and pages imported concurrently.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        event loop.
+    :type parse_workers: int
+    """
+
+    from bsimport import engine
+
+    name = path.stem
+
+    typer.secho(f"Creating the books of the shelf '{name}'")
+    warn_shelf_pages(path)
+
+    books: Dict[Path, int] = dict()
+    outcomes: Counter = Counter()
+
+    try:
+        async for result in engine.import_shelf_content_async(
+            importer, path, jobs, parse_workers
+        ):
+            if result.kind == engine.BOOK and not result.error:
+                books[result.path] = result.data
+            outcomes[report_result(result)] += 1
+
+        await link_pages_async(importer, jobs, outcomes)
+
+        error, data = await importer.import_shelf(path, shelf_books(books))
+
+    finally:
+        await importer.close()
+
+    print_shelf_summary(name, error, data, outcomes)
+
+
+def list_roots(
+    paths: Optional[List[Path]],
+    from_file: Optional[Path]
+) -> List[Path]:
+    """
+    Gather the paths to import, from the command line and from a file
+    listing them one per line. Blank lines and lines starting with '#'
+    are ignored, relative paths are relative to the file.
+
+    :param paths:
+        The paths given on the command line, resolved.
+    :type paths: Optional[List[Path]]
+    :param from_file:
+        The file listing more paths, if any.
+    :type from_file: Optional[Path]
+
+    :return:
+        The paths, resolved, each one once, in order.
+    :rtype: List[Path]
+    """
+
+    roots = list(paths or ())
+
+    if from_file is not None:
+        try:
+            lines = from_file.read_text(encoding='utf-8').splitlines()
+        except (OSError, UnicodeDecodeError) as e:
+            typer.secho(
+                f"Reading '{from_file}' failed with: {e}",
+                fg=typer.colors.RED
+            )
+            raise typer.Exit(1)
+
+        for line in map(str.strip, lines):
+            if not line or line.startswith('#'):
+                continue
+            root = (from_file.parent / Path(line).expanduser()).resolve()
+            if not root.exists():
+                typer.secho(
+                    f"'{root}', listed in '{from_file}', doesn't exist.",
+                    fg=typer.colors.RED
+                )
+                raise typer.Exit(1)
+            roots.append(root)
+
+    if not roots:
         typer.secho(
-            f"{k}{(len(columns[0]) - len(str(k))) * ' '}"
-            f"| {v}"
+            "Nothing to import, pass a path or '--from-file'.",
+            fg=typer.colors.RED
         )
+        raise typer.Exit(1)
 
-    typer.secho("-" * total_length + "\n")
+    return list(dict.fromkeys(roots))
+
+
+def check_batch(roots: List[Path]):
+    """
+    Check that several paths can be imported in a single run: they must
+    be directories, none inside another, or its files would be imported
+    twice.
+
+    :param roots:
+        The paths, resolved.
+    :type roots: List[Path]
+    """
+
+    for root in roots:
+
+        if not root.is_dir():
+            typer.secho(
+                f"'{root}' isn't a directory, only directories can be "
+                "imported together.",
+                fg=typer.colors.RED
+            )
+            raise typer.Exit(1)
+
+        for other in roots:
+            if other != root and other in root.parents:
+                typer.secho(
+                    f"'{root}' is inside '{other}', import one or the "
+                    "other.",
+                    fg=typer.colors.RED
+                )
+                raise typer.Exit(1)
+
+
+def root_of(path: Path, roots: List[Path]) -> Path:
+    """
+    Get the directory of a batch a file or directory was imported from.
+
+    :param path:
+        The path to the file or directory.
+    :type path: Path
+    :param roots:
+        The directories of the batch, none inside another.
+    :type roots: List[Path]
+
+    :return:
+        The directory.
+    :rtype: Path
+    """
+
+    for root in roots:
+        if path == root or root in path.parents:
+            return root
+
+    return roots[0]
+
+
+def batch_books(roots: List[Path], shelf: bool) -> List[Path]:
+    """
+    List the directories imported as books by a batch: the directories
+    themselves, or the subdirectories of each one with '--shelf'.
+
+    :param roots:
+        The directories of the batch.
+    :type roots: List[Path]
+    :param shelf:
+        Whether they are imported as shelves.
+    :type shelf: bool
+
+    :return:
+        The paths to the books.
+    :rtype: List[Path]
+    """
+
+    from bsimport import engine
+
+    if not shelf:
+        return list(roots)
+
+    books: List[Path] = list()
+
+    for root in roots:
+        warn_shelf_pages(root)
+        books.extend(engine.list_chapters(root))
+
+    return books
+
+
+def count_batch_result(
+    result: 'engine.Result',
+    roots: List[Path],
+    outcomes: Dict[Path, Counter],
+    books: Dict[Path, Dict[Path, int]],
+    failed: Dict[Path, int]
+):
+    """
+    Show the outcome of an item of a batch, and count it for its
+    directory.
+
+    :param result:
+        The result of the item.
+    :type result: engine.Result
+    :param roots:
+        The directories of the batch.
+    :type roots: List[Path]
+    :param outcomes:
+        The number of items per outcome, see `report_result`, by
+        directory, updated.
+    :type outcomes: Dict[Path, Counter]
+    :param books:
+        The ID of each book created, by directory, updated.
+    :type books: Dict[Path, Dict[Path, int]]
+    :param failed:
+        The error code of the directories whose book couldn't be
+        created, updated.
+    :type failed: Dict[Path, int]
+    """
+
+    from bsimport import engine
+
+    root = root_of(result.path, roots)
+    outcomes[root][report_result(result)] += 1
+
+    if result.kind != engine.BOOK:
+        return
+
+    if not result.error:
+        books[root][result.path] = result.data
+    elif result.path == root:
+        failed[root] = result.error
+
+
+def print_batch_summary(
+    roots: List[Path],
+    outcomes: Dict[Path, Counter],
+    failed: Dict[Path, int],
+    shelves: Optional[Dict[Path, Any]] = None
+):
+    """
+    Show how many pages of each directory of a batch were imported,
+    unchanged or skipped, then the totals.
+
+    :param roots:
+        The directories of the batch.
+    :type roots: List[Path]
+    :param outcomes:
+        The number of items per outcome, see `report_result`, by
+        directory.
+    :type outcomes: Dict[Path, Counter]
+    :param failed:
+        The error code of the directories whose book couldn't be
+        created.
+    :type failed: Dict[Path, int]
+    :param shelves:
+        The error code and the shelf ID, or the error message, of each
+        shelf request, None if the directories were imported as books.
+    :type shelves: Optional[Dict[Path, Any]]
+
+    :raises typer.Exit:
+        With the error code of the first directory that failed, if any.
+    """
+
+    errors: List[int] = list()
+
+    for root in roots:
+
+        if shelves is not None:
+            error, data = shelves[root]
+            try:
+                print_shelf_summary(root.stem, error, data, outcomes[root])
+            except typer.Exit:
+                errors.append(error)
+            continue
+
+        if root in failed:
+            typer.secho(
+                f"Skipped book {root.stem}, it couldn't be created.",
+                fg=typer.colors.RED
+            )
+            errors.append(failed[root])
+            continue
+
+        print_book_summary(root.stem, outcomes[root])
+
+    total = sum(outcomes.values(), Counter())
+
+    typer.secho(
+        f"Imported {len(roots) - len(errors)} of {len(roots)} directories "
+        f"({total['book']} books, {total['imported']} pages imported, "
+        f"{total['unchanged']} unchanged, "
+        f"{total['linked']} linked, "
+        f"{total['skipped']} items skipped)",
+        fg=typer.colors.GREEN if not errors else typer.colors.YELLOW
+    )
+
+    if errors:
+        raise typer.Exit(errors[0])
+
+
+def import_batch(
+    importer: 'imp.Importer',
+    roots: List[Path],
+    shelf: bool = False,
+    jobs: int = 1,
+    parse_workers: int = 0
+):
+    """
+    Import several directories as books, or as shelves, in a single run.
+
+    The books of every directory are imported by the same `jobs`
+    workers, over the same connections, see `import_shelf`. The pages
+    linking to pages created after them are sent again once every
+    directory is imported, then the shelves are created, and the outcome
+    of each directory is shown.
+
+    :param importer:
+        The Importer to use.
+    :type importer: imp.Importer
+    :param roots:
+        The paths to the directories, none inside another.
+    :type roots: List[Path]
+    :param shelf:
+        Whether to import them as shelves.
+    :type shelf: bool
+    :param jobs:
+        The number of books and pages imported concurrently.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        importing workers.
+    :type parse_workers: int
+    """
+
+    from bsimport import engine
+
+    outcomes: Dict[Path, Counter] = {root: Counter() for root in roots}
+    books: Dict[Path, Dict[Path, int]] = {root: dict() for root in roots}
+    failed: Dict[Path, int] = dict()
+
+    for result in engine.import_books_content(
+        importer, batch_books(roots, shelf), jobs, parse_workers
+    ):
+        count_batch_result(result, roots, outcomes, books, failed)
+
+    for result in engine.link_pages(importer, jobs):
+        count_batch_result(result, roots, outcomes, books, failed)
+
+    shelves = None
+    if shelf:
+        shelves = {
+            root: importer.import_shelf(root, shelf_books(books[root]))
+            for root in roots
+        }
+
+    print_batch_summary(roots, outcomes, failed, shelves)
+
+
+async def import_batch_async(
+    importer: 'imp.AsyncImporter',
+    roots: List[Path],
+    shelf: bool = False,
+    jobs: int = 1,
+    parse_workers: int = 0
+):
+    """
+    Import several directories as books, or as shelves, in a single run
+    with an AsyncImporter.
+
+    Same as `import_batch`, except that up to `jobs` requests share a
+    single event loop. The importer is closed before returning.
+
+    :param importer:
+        The AsyncImporter to use.
+    :type importer: imp.AsyncImporter
+    :param roots:
+        The paths to the directories, none inside another.
+    :type roots: List[Path]
+    :param shelf:
+        Whether to import them as shelves.
+    :type shelf: bool
+    :param jobs:
+        The number of books and pages imported concurrently.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        event loop.
+    :type parse_workers: int
+    """
+
+    from bsimport import engine
+
+    outcomes: Dict[Path, Counter] = {root: Counter() for root in roots}
+    books: Dict[Path, Dict[Path, int]] = {root: dict() for root in roots}
+    failed: Dict[Path, int] = dict()
+    shelves = None
+
+    try:
+        async for result in engine.import_books_content_async(
+            importer, batch_books(roots, shelf), jobs, parse_workers
+        ):
+            count_batch_result(result, roots, outcomes, books, failed)
+
+        async for result in engine.link_pages_async(importer, jobs):
+            count_batch_result(result, roots, outcomes, books, failed)
+
+        if shelf:
+            shelves = {
+                root: await importer.import_shelf(
+                    root, shelf_books(books[root])
+                )
+                for root in roots
+            }
+
+    finally:
+        await importer.close()
+
+    print_batch_summary(roots, outcomes, failed, shelves)
+
+
+def print_run_report(
+    importer: Union['imp.Importer', 'imp.AsyncImporter']
+):
+    """
+    Show how many connections were opened and reused during the run,
+    how many requests had to be retried and how many bytes compressing
+    them saved.
+
+    :param importer:
+        The Importer used for the run.
+    :type importer: Union[imp.Importer, imp.AsyncImporter]
+    """
+
+    stats = importer.connection_stats()
+
+    typer.secho(
+        f"Sent {stats['requests']} requests over {stats['connections']} "
+        f"connections ({stats['reused']} reused)."
+    )
+
+    retries = importer.retry_stats()
+
+    if retries['retries']:
+        typer.secho(
+            f"Retried {retries['retries']} requests, waited "
+            f"{retries['backoff']:.1f}s before retrying.",
+            fg=typer.colors.YELLOW
+        )
+
+    compression = importer.compression_stats()
+
+    if compression['compressed']:
+        saved = compression['bytes_saved']
+        typer.secho(
+            f"Compressed {compression['compressed']} request bodies, saving "
+            f"{saved / 1024:.1f} KiB "
+            f"({saved / compression['raw_bytes']:.0%})."
+        )
+    if compression['rejected']:
+        typer.secho(
+            "Bookstack rejected compressed request bodies, they were sent "
+            "as is.",
+            fg=typer.colors.YELLOW
+        )
+
+    media = importer.media_stats()
+
+    if media and any(media.values()):
+        typer.secho(
+            f"Uploaded {media['uploaded']} embedded files, reused "
+            f"{media['reused']} uploaded before."
+        )
+    if media and media['failed']:
+        typer.secho(
+            f"{media['failed']} embedded files couldn't be uploaded, their "
+            "pages will be sent again by the next import.",
+            fg=typer.colors.YELLOW
+        )
+
+    limit = importer.limit_stats()
+
+    if limit is not None:
+        typer.secho(
+            f"Ended sending up to {limit['limit']} pages at once (at most "
+            f"{limit['peak']}, lowered {limit['decreases']} times)."
+        )
+
+
+def report_limit(previous: int, current: int):
+    """
+    Show that the number of pages sent at once changed, see
+    limit.AdaptiveLimit.
+
+    :param previous:
+        The previous limit.
+    :type previous: int
+    :param current:
+        The new limit.
+    :type current: int
+    """
+
+    if current < previous:
+        typer.secho(
+            f"Bookstack is throttling or slowing down, sending up to "
+            f"{current} pages at once.",
+            fg=typer.colors.YELLOW
+        )
+    else:
+        typer.secho(f"Sending up to {current} pages at once.")
+
+
+def print_stats(summary: Dict[str, Any]):
+    """
+    Show where the time of the run went: the requests by endpoint, with
+    their status codes and latency histogram, the stages of the page
+    imports and the slowest files.
+
+    :param summary:
+        The summary of the run, see Stats.summary.
+    :type summary: Dict[str, Any]
+    """
+
+    typer.secho(
+        f"\nRun statistics ({summary['elapsed']:.2f}s, "
+        f"{summary['requests']} requests, "
+        f"{summary['bytes_sent'] / 1024:.1f} KiB sent):",
+        bold=True
+    )
+
+    for name, entry in summary['endpoints'].items():
+        statuses = ", ".join(
+            f"{status}: {count}"
+            for status, count in sorted(entry['statuses'].items())
+        )
+        typer.secho(
+            f"  {name:<24} {entry['count']:>6} requests, "
+            f"mean {entry['mean_ms']:.1f}ms, max {entry['max_ms']:.1f}ms, "
+            f"{entry['bytes_sent'] / 1024:.1f} KiB sent ({statuses})"
+        )
+        typer.secho("      " + "  ".join(
+            f"{label} {count}" for label, count in entry['histogram'].items()
+        ))
+
+    if summary['stages']:
+        typer.secho("  Stages:")
+        for stage, entry in summary['stages'].items():
+            typer.secho(
+                f"  {stage:<24} {entry['count']:>6} files, "
+                f"{entry['seconds']:.3f}s"
+            )
+
+    if summary['slowest_files']:
+        typer.secho("  Slowest files:")
+        for entry in summary['slowest_files']:
+            typer.secho(f"  {entry['seconds']:>10.3f}s  {entry['path']}")
+
+    concurrency = summary['concurrency']
+    if concurrency is not None:
+        typer.secho(
+            f"  Concurrency limit: {concurrency['limit']} at the end, "
+            f"{concurrency['mean']:.1f} on average, between "
+            f"{concurrency['min']} and {concurrency['max']} "
+            f"({concurrency['changes']} changes)"
+        )
+
+
+@contextmanager
+def divert_output(json_path: Optional[Path]) -> Iterator[Optional[TextIO]]:
+    """
+    Show the output of the command on the standard error when the
+    statistics are written as JSON to the standard output, so that it
+    holds the JSON alone, e.g. for 'jq'. The standard output is restored
+    on leaving the context.
+
+    :param json_path:
+        Where the statistics are written as JSON, see `report_stats`.
+    :type json_path: Optional[Path]
+
+    :yield:
+        The standard output, to write the JSON to, None if it isn't
+        diverted.
+    :rtype: Iterator[Optional[TextIO]]
+    """
+
+    if json_path is None or str(json_path) != '-':
+        yield None
+        return
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        yield stdout
+    finally:
+        sys.stdout = stdout
+
+
+def report_stats(
+    stats: Optional['Stats'],
+    show: bool,
+    json_path: Optional[Path],
+    stdout: Optional[TextIO] = None
+):
+    """
+    Show the statistics of the run and/or write them as JSON.
+
+    :param stats:
+        The statistics, None if they weren't collected.
+    :type stats: Optional[Stats]
+    :param show:
+        Whether to show them.
+    :type show: bool
+    :param json_path:
+        Where to write them as JSON, '-' for the standard output.
+    :type json_path: Optional[Path]
+    :param stdout:
+        The standard output, if diverted, see `divert_output`.
+    :type stdout: Optional[TextIO]
+    """
+
+    if stats is None:
+        return
+
+    summary = stats.summary()
+
+    if show:
+        print_stats(summary)
+
+    if json_path is None:
+        return
+
+    if str(json_path) == '-':
+        typer.echo(json.dumps(summary, indent=2), file=stdout)
+        return
+
+    try:
+        with json_path.open('w') as file:
+            json.dump(summary, file, indent=2)
+    except OSError as e:
+        typer.secho(
+            f"Writing the statistics failed with: {e}",
+            fg=typer.colors.YELLOW
+        )
+
+
+def report_profile(profiler: 'profiling.Profiler'):
+    """
+    Stop profiling the run and show where the reports are.
+
+    :param profiler:
+        The profiler of the run.
+    :type profiler: profiling.Profiler
+    """
+
+    try:
+        cpu_path, memory_path = profiler.stop()
+    except OSError as e:
+        typer.secho(
+            f"Writing the profile failed with: {e}",
+            fg=typer.colors.YELLOW
+        )
+        return
+
+    typer.secho(
+        f"CPU profile written to {cpu_path}, "
+        f"read it with 'python -m pstats {cpu_path}'."
+    )
+    if memory_path is not None:
+        typer.secho(f"Allocation report written to {memory_path}.")
+
+
+def save_state(
+    manifest: Optional['Manifest'],
+    index: Optional['RemoteIndex'],
+    media: Optional['MediaCache'] = None
+):
+    """
+    Save the import manifest, the index of the instance's content and the
+    cache of uploaded files, warning the user if that fails.
+
+    :param manifest:
+        The manifest to save, if any.
+    :type manifest: Optional[Manifest]
+    :param index:
+        The index to save, if any.
+    :type index: Optional[RemoteIndex]
+    :param media:
+        The cache of uploaded files to save, if any.
+    :type media: Optional[MediaCache]
+
+    :return:
+        Whether the manifest, if any, was saved.
+    :rtype: bool
+    """
+
+    saved = manifest is None or manifest.save()
+
+    if not saved:
+        typer.secho(
+            "Saving the import manifest failed, the next import "
+            "won't be incremental.",
+            fg=typer.colors.YELLOW
+        )
+
+    if index is not None and not index.save():
+        typer.secho(
+            "Saving the index of books failed.",
+            fg=typer.colors.YELLOW
+        )
+
+    if media is not None and not media.save():
+        typer.secho(
+            "Saving the cache of uploaded files failed, they will be "
+            "uploaded again.",
+            fg=typer.colors.YELLOW
+        )
+
+    return saved
+
+
+def start_journal(
+    manifest: 'Manifest',
+    roots: List[Path],
+    resume: bool
+) -> Optional['Journal']:
+    """
+    Start the journal of an import, replaying the one left by an
+    interrupted import into the manifest first when resuming it.
+
+    :param manifest:
+        The manifest the journal logs the changes of.
+    :type manifest: Manifest
+    :param roots:
+        The directories or file imported.
+    :type roots: List[Path]
+    :param resume:
+        Whether to resume the interrupted import.
+    :type resume: bool
+
+    :return:
+        The journal, None if it can't be written.
+    :rtype: Optional[Journal]
+    """
+
+    from bsimport import journal
+
+    left = journal.replay()
+
+    if resume and left is None:
+        typer.secho("Nothing to resume, importing as usual.")
+
+    elif resume:
+        if set(left.roots) != {str(root.resolve()) for root in roots}:
+            typer.secho(
+                "The interrupted import was of "
+                f"{', '.join(repr(root) for root in left.roots)}.",
+                fg=typer.colors.RED
+            )
+            raise typer.Exit(1)
+        manifest.replay(left.operations, left.in_flight)
+        typer.secho(
+            f"Resuming the interrupted import ({len(left.operations)} "
+            "changes recovered)."
+        )
+        for in_flight, kind in left.in_flight.items():
+            typer.secho(
+                f"The {kind} '{in_flight}' was being created when the "
+                "import stopped, it is looked up before being created again."
+            )
+
+    elif left is not None:
+        typer.secho(
+            "Discarding the journal of an interrupted import, use "
+            "'--resume' to resume it.",
+            fg=typer.colors.YELLOW
+        )
+
+    try:
+        return journal.Journal().start(roots, append=resume and bool(left))
+    except OSError as e:
+        typer.secho(
+            f"Writing the journal failed, the import can't be resumed "
+            f"if interrupted: {e}",
+            fg=typer.colors.YELLOW
+        )
+        return None
+
+
+def close_journal(
+    manifest: 'Manifest',
+    journal: Optional['Journal'],
+    saved: bool
+):
+    """
+    Stop logging the changes to the manifest, deleting the journal if
+    the manifest was saved.
+
+    :param manifest:
+        The manifest.
+    :type manifest: Manifest
+    :param journal:
+        The journal, if any.
+    :type journal: Optional[Journal]
+    :param saved:
+        Whether the manifest was saved.
+    :type saved: bool
+    """
+
+    if journal is None:
+        return
+
+    manifest.attach(None)
+    error = journal.close(complete=saved)
+
+    if error is not None:
+        typer.secho(
+            f"Writing the journal failed, the import can't be resumed "
+            f"if interrupted: {error}",
+            fg=typer.colors.YELLOW
+        )
+
+
+@app.command(name="import")
+def import_from(
+    paths: Optional[List[Path]] = typer.Argument(
+        None,
+        help="The directories or file to import.",
+        exists=True,
+        readable=True,
+        resolve_path=True,
+        show_default=False
+    ),
+    from_file: Optional[Path] = typer.Option(
+        None,
+        "--from-file",
+        help="Also import the directories listed in this file, one per "
+        "line.",
+        exists=True,
+        dir_okay=False,
+        readable=True,
+        resolve_path=True
+    ),
+    pool_size: int = typer.Option(
+        DEFAULT_POOL_SIZE,
+        "--pool-size",
+        min=1,
+        help="The maximum number of connections kept alive to Bookstack, "
+        "raised to '--jobs' if lower."
+    ),
+    jobs: int = typer.Option(
+        1,
+        "--jobs",
+        "-j",
+        min=1,
+        help="The number of pages imported concurrently."
+    ),
+    parse_workers: int = typer.Option(
+        0,
+        "--parse-workers",
+        "-p",
+        min=0,
+        help="The number of processes parsing files while others are sent, "
+        "0 to parse them in the same workers."
+    ),
+    use_async: bool = typer.Option(
+        False,
+        "--async",
+        help="Import directories with asyncio instead of threads "
+        "(requires aiohttp)."
+    ),
+    max_retries: int = typer.Option(
+        DEFAULT_MAX_RETRIES,
+        "--retries",
+        min=0,
+        help="The maximum number of times a throttled or failed request "
+        "is sent again."
+    ),
+    media: bool = typer.Option(
+        True,
+        "--media/--no-media",
+        help="Upload the images and files embedded in pages, each one once, "
+        "and point the embeds to them."
+    ),
+    links: bool = typer.Option(
+        True,
+        "--links/--no-links",
+        help="Point the wikilinks between pages to the pages they name."
+    ),
+    compress: bool = typer.Option(
+        False,
+        "--compress",
+        help="Send large request bodies gzipped, as is if Bookstack "
+        "rejects them."
+    ),
+    compress_threshold: int = typer.Option(
+        DEFAULT_COMPRESS_THRESHOLD,
+        "--compress-threshold",
+        min=0,
+        help="With '--compress', the size from which request bodies are "
+        "gzipped, in bytes."
+    ),
+    stream_threshold: int = typer.Option(
+        DEFAULT_STREAM_THRESHOLD,
+        "--stream-threshold",
+        min=0,
+        help="The size from which files are streamed from disk rather than "
+        "read in memory, in bytes, 0 to read them all."
+    ),
+    split_size: int = typer.Option(
+        0,
+        "--split-size",
+        min=0,
+        help="Split the pages larger than this, in characters, at their "
+        "headings into numbered pages of a chapter, 0 to never split them."
+    ),
+    shelf: bool = typer.Option(
+        False,
+        "--shelf",
+        help="Import a directory as a shelf, its subdirectories as books "
+        "and their subdirectories as chapters."
+    ),
+    full: bool = typer.Option(
+        False,
+        "--full",
+        help="Send every page again, even unchanged ones, into the pages, "
+        "chapters and books already imported rather than new ones."
+    ),
+    ensure: bool = typer.Option(
+        False,
+        "--ensure",
+        help="Reuse the books and chapters that already exist with the same "
+        "name, e.g. from an interrupted import, instead of creating new ones."
+    ),
+    adaptive: bool = typer.Option(
+        False,
+        "--adaptive",
+        help="Adapt the number of pages sent at once to how Bookstack keeps "
+        "up, up to '--jobs': raise it while it answers as fast, lower it "
+        "when it throttles, fails or slows down."
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Resume an import that was killed before the end, without "
+        "sending again what it imported."
+    ),
+    show_stats: bool = typer.Option(
+        False,
+        "--stats",
+        help="Show where the time went at the end of the run."
+    ),
+    stats_json: Optional[Path] = typer.Option(
+        None,
+        "--stats-json",
+        help="Write the statistics of the run as JSON to this file, "
+        "'-' for the standard output, the rest going to the standard error.",
+        dir_okay=False
+    ),
+    profile: Optional[Path] = typer.Option(
+        None,
+        "--profile",
+        envvar=PROFILE_ENV,
+        help="Profile the run, worker threads and processes included, and "
+        "write the CPU profile (pstats format) to this file.",
+        dir_okay=False
+    ),
+    profile_memory: int = typer.Option(
+        0,
+        "--profile-memory",
+        envvar=PROFILE_MEMORY_ENV,
+        min=0,
+        help="With '--profile', also trace allocations and report the top "
+        "N allocation sites."
+    )
+) -> None:
+    """
+    Import a directory or a file, or several directories.
+
+    You can import a single file or an entire directory, just pass the path
+    and it will detect the type:
+
+    - If a file is detected, it will be imported as a page and
+    it will ask for the book ID (you can use 'bsimport list_books'
+    to display the books you can access).
+
+    - If a directory is detected, it will be imported as a book.
+
+        - If subdirectories are detected, they will be imported as chapters.
+
+        - If sub-subdirectories are detected, they will be ignored.
+
+    Several directories, passed as arguments or listed in a file with
+    '--from-file', are imported in a single run: they share the
+    connections, the caches and the '--jobs' workers, and the outcome of
+    each one is shown at the end.
+
+    Images and files embedded in pages (![[diagram.png]] or
+    ![](img/x.png)) are uploaded to Bookstack, each one once however many
+    pages embed it. Use '--no-media' to send the pages as they are.
+
+    Wikilinks ([[Other note]]) are pointed to the pages they name, by file
+    name, path or alias. Pages linking to pages created after them are
+    sent again once every page exists. Use '--no-links' to leave them.
+
+    Use '--shelf' to import a directory as a shelf instead: each
+    subdirectory is imported as a book, the books are added to the shelf
+    once they all exist.
+
+    Use '--jobs' to import the pages of a directory concurrently, and
+    '--parse-workers' to parse large vaults in separate processes. With
+    '--adaptive', the number of pages sent at once follows how Bookstack
+    keeps up, up to '--jobs'.
+
+    Directories imported before are imported incrementally: only new or
+    modified files are sent, the others are skipped without any request.
+    Use '--full' to send every page again, updating the pages already
+    imported in place.
+
+    An import killed before the end, e.g. by a crash or Ctrl-C, can be
+    resumed with '--resume': what it imported is recovered from its
+    journal and not sent again, and its books, chapters and pages are
+    reused.
+
+    Use '--compress' to send large pages gzipped, over slow connections.
+
+    Files larger than '--stream-threshold' are streamed from disk as they
+    are sent. Use '--split-size' to split very large pages at their
+    headings into numbered pages of a chapter.
+
+    Use '--stats' or '--stats-json' to see where the time of the import
+    went, and '--profile' to profile it.
+    """
+
+    with divert_output(stats_json) as stdout:
+        roots = list_roots(paths, from_file)
+        path = roots[0]
+        batch = len(roots) > 1
+        if batch:
+            check_batch(roots)
+
+        if path.is_file() and path.suffix != '.md':
+            typer.secho("File detected, importing as page.")
+            typer.secho(
+                "This doesn't seem to be a Markdown file,"
+                "check the extension.",
+                fg=typer.colors.YELLOW
+            )
+            raise typer.Exit(EXT_ERROR)
+
+        if shelf and not path.is_dir():
+            typer.secho(
+                "Only a directory can be imported as a shelf.",
+                fg=typer.colors.RED
+            )
+            raise typer.Exit(1)
+
+        from bsimport import profiling
+        from bsimport.cache import RemoteIndex
+        from bsimport.limit import AdaptiveLimit
+        from bsimport.links import LinkIndex
+        from bsimport.manifest import Manifest
+        from bsimport.media import MediaCache
+        from bsimport.stats import Stats
+
+        manifest = Manifest.load()
+        journal = start_journal(manifest, roots, resume)
+        if journal is not None:
+            manifest.attach(journal)
+        # The books and chapters being created may exist already.
+        ensure = ensure or resume
+        if full:
+            for root in roots:
+                manifest.refresh(root)
+        index = RemoteIndex.load()
+        stats = Stats() if show_stats or stats_json else None
+        limit = None
+        if adaptive:
+            limit = AdaptiveLimit(jobs, stats=stats, on_change=report_limit)
+        media_cache = MediaCache.load() if media else None
+        link_index = None
+        if links and path.is_dir():
+            link_index = LinkIndex.build(path, manifest)
+            # Each directory links within itself.
+            for root in roots[1:]:
+                link_index.add_root(root, manifest)
+        threshold = compress_threshold if compress else None
+        # A connection per worker, or the workers past the pool wait for one.
+        pool_size = max(pool_size, jobs)
+        large = {
+            'stream_threshold': stream_threshold or None,
+            'split_size': split_size or None
+        }
+
+        profiler = None
+        if profile is not None:
+            profiler = profiling.Profiler(profile, profile_memory).start()
+
+        try:
+            if use_async and path.is_dir():
+                import asyncio
+
+                importer = get_importer(
+                    pool_size, True, max_retries, manifest, index, stats,
+                    media_cache, link_index, threshold, ensure=ensure,
+                    limit=limit, **large
+                )
+                if batch:
+                    typer.secho(
+                        f"{len(roots)} directories detected, importing each "
+                        f"as a {'shelf' if shelf else 'book'}."
+                    )
+                    asyncio.run(import_batch_async(
+                        importer, roots, shelf, jobs, parse_workers
+                    ))
+                elif shelf:
+                    typer.secho("Directory detected, importing as shelf.")
+                    asyncio.run(import_shelf_async(
+                        importer, path, jobs, parse_workers
+                    ))
+                else:
+                    typer.secho("Directory detected, importing as book.")
+                    asyncio.run(import_dir_async(
+                        importer, path, jobs, parse_workers
+                    ))
+                print_run_report(importer)
+                return
+
+            importer = get_importer(
+                pool_size, False, max_retries, manifest, index, stats,
+                media_cache, link_index, threshold, ensure=ensure,
+                limit=limit, **large
+            )
+
+            if batch:
+                typer.secho(
+                    f"{len(roots)} directories detected, importing each as a "
+                    f"{'shelf' if shelf else 'book'}."
+                )
+                import_batch(importer, roots, shelf, jobs, parse_workers)
+
+            elif shelf:
+                typer.secho("Directory detected, importing as shelf.")
+                import_shelf(importer, path, jobs, parse_workers)
+
+            elif path.is_dir():
+                typer.secho("Directory detected, importing as book.")
+                import_dir(importer, path, jobs, parse_workers)
+
+            elif path.is_file():
+                typer.secho("File detected, importing as page.")
+                import_single_file(importer, path)
+
+            print_run_report(importer)
+            importer.close()
+
+        finally:
+            saved = save_state(manifest, index, media_cache)
+            close_journal(manifest, journal, saved)
+            report_stats(stats, show_stats, stats_json, stdout)
+            if profiler is not None:
+                report_profile(profiler)
+
+
+def report_change(result: 'engine.Result') -> str:
+    """
+    Show the outcome of a change applied by `sync`.
+
+    :param result:
+        The result to show.
+    :type result: engine.Result
+
+    :return:
+        The outcome, see `report_result`, or 'renamed', 'moved' or
+        'deleted'.
+    :rtype: str
+    """
+
+    from bsimport import sync
+
+    if result.kind not in (sync.RENAMED, sync.MOVED, sync.DELETED):
+        return report_result(result)
+
+    if result.error:
+        typer.secho(
+            f"Sync failed with: {ERRORS[result.error]}",
+            fg=typer.colors.RED
+        )
+        typer.secho(f"Debug: {result.data}")
+        typer.secho(
+            f"Skipping '{str(result.path)}'",
+            fg=typer.colors.YELLOW
+        )
+        return 'skipped'
+
+    if result.kind == sync.RENAMED:
+        typer.secho(f"Renamed the chapter to '{result.path.stem}'")
+    elif result.kind == sync.MOVED:
+        typer.secho(f"Moved '{result.data}' to '{str(result.path)}'")
+    else:
+        typer.secho(f"Deleted '{str(result.path)}'")
+
+    return result.kind
+
+
+def print_sync_summary(name: str, outcomes: Counter):
+    """
+    Show how many changes were applied, by outcome.
+
+    :param name:
+        The name of the book.
+    :type name: str
+    :param outcomes:
+        The number of changes per outcome, see `report_change`.
+    :type outcomes: Counter
+    """
+
+    typer.secho(
+        f"Synchronized book {name} ({outcomes['imported']} pages sent, "
+        f"{outcomes['renamed']} chapters renamed, "
+        f"{outcomes['moved']} pages moved, "
+        f"{outcomes['deleted']} items deleted, "
+        f"{outcomes['unchanged']} pages unchanged, "
+        f"{outcomes['linked']} linked, "
+        f"{outcomes['skipped']} items skipped)",
+        fg=typer.colors.GREEN
+    )
+
+
+@app.command(name="sync")
+def sync_from(
+    path: Path = typer.Argument(
+        ...,
+        help="The directory to synchronize.",
+        exists=True,
+        file_okay=False,
+        readable=True,
+        resolve_path=True
+    ),
+    jobs: int = typer.Option(
+        1,
+        "--jobs",
+        "-j",
+        min=1,
+        help="The number of pages synchronized concurrently."
+    ),
+    parse_workers: int = typer.Option(
+        0,
+        "--parse-workers",
+        "-p",
+        min=0,
+        help="The number of processes parsing files while others are sent, "
+        "0 to parse them in the same workers."
+    ),
+    delete: bool = typer.Option(
+        True,
+        "--delete/--no-delete",
+        help="Delete the chapters and pages whose source was removed."
+    ),
+    ensure: bool = typer.Option(
+        False,
+        "--ensure",
+        help="Reuse the books and chapters that already exist with the same "
+        "name, e.g. from an interrupted import, instead of creating new ones."
+    ),
+    adaptive: bool = typer.Option(
+        False,
+        "--adaptive",
+        help="Adapt the number of pages sent at once to how Bookstack keeps "
+        "up, up to '--jobs': raise it while it answers as fast, lower it "
+        "when it throttles, fails or slows down."
+    ),
+    media: bool = typer.Option(
+        True,
+        "--media/--no-media",
+        help="Upload the images and files embedded in pages, each one once, "
+        "and point the embeds to them."
+    ),
+    links: bool = typer.Option(
+        True,
+        "--links/--no-links",
+        help="Point the wikilinks between pages to the pages they name."
+    ),
+    compress: bool = typer.Option(
+        False,
+        "--compress",
+        help="Send large request bodies gzipped, as is if Bookstack "
+        "rejects them."
+    ),
+    compress_threshold: int = typer.Option(
+        DEFAULT_COMPRESS_THRESHOLD,
+        "--compress-threshold",
+        min=0,
+        help="With '--compress', the size from which request bodies are "
+        "gzipped, in bytes."
+    ),
+    stream_threshold: int = typer.Option(
+        DEFAULT_STREAM_THRESHOLD,
+        "--stream-threshold",
+        min=0,
+        help="The size from which files are streamed from disk rather than "
+        "read in memory, in bytes, 0 to read them all."
+    ),
+    split_size: int = typer.Option(
+        0,
+        "--split-size",
+        min=0,
+        help="Split the pages larger than this, in characters, at their "
+        "headings into numbered pages of a chapter, 0 to never split them."
+    ),
+    show_stats: bool = typer.Option(
+        False,
+        "--stats",
+        help="Show where the time went at the end of the run."
+    ),
+    stats_json: Optional[Path] = typer.Option(
+        None,
+        "--stats-json",
+        help="Write the statistics of the run as JSON to this file, "
+        "'-' for the standard output, the rest going to the standard error.",
+        dir_okay=False
+    )
+) -> None:
+    """
+    Synchronize a directory with the book it was imported as.
+
+    Only the differences since the last import or sync are sent: new files
+    are created, modified files are updated, renamed or moved files and
+    directories are renamed or moved, and removed ones are deleted.
+    A directory that was never imported is imported as a new book.
+    Wikilinks are resolved as by 'import', use '--no-links' to leave them.
+    Use '--compress' to send large pages gzipped, '--split-size' to split
+    very large pages, '--adaptive' to adapt the number of pages sent at
+    once to how Bookstack keeps up.
+    """
+
+    with divert_output(stats_json) as stdout:
+        from bsimport import sync
+        from bsimport.cache import RemoteIndex
+        from bsimport.limit import AdaptiveLimit
+        from bsimport.links import LinkIndex
+        from bsimport.manifest import Manifest
+        from bsimport.media import MediaCache
+        from bsimport.stats import Stats
+
+        manifest = Manifest.load()
+        index = RemoteIndex.load()
+        stats = Stats() if show_stats or stats_json else None
+        limit = None
+        if adaptive:
+            limit = AdaptiveLimit(jobs, stats=stats, on_change=report_limit)
+        media_cache = MediaCache.load() if media else None
+        link_index = LinkIndex.build(path, manifest) if links else None
+        # A connection per worker.
+        importer = get_importer(
+            pool_size=max(DEFAULT_POOL_SIZE, jobs),
+            manifest=manifest, index=index, stats=stats, media=media_cache,
+            links=link_index,
+            compress_threshold=compress_threshold if compress else None,
+            stream_threshold=stream_threshold or None,
+            split_size=split_size or None,
+            ensure=ensure,
+            limit=limit
+        )
+
+        name = path.stem
+
+        try:
+            error, data = importer.import_book(path)
+
+            if error:
+                typer.secho(
+                    f"Create book failed with: {ERRORS[error]}",
+                    fg=typer.colors.RED
+                )
+                raise typer.Exit(error)
+
+            outcomes: Counter = Counter()
+
+            for result in sync.sync_dir(
+                importer, manifest, path, data, jobs, delete, parse_workers
+            ):
+                outcomes[report_change(result)] += 1
+
+            link_pages(importer, jobs, outcomes)
+
+            print_sync_summary(name, outcomes)
+
+        finally:
+            save_state(manifest, index, media_cache)
+            # Also on a failure or Ctrl-C, for what was sent until then.
+            print_run_report(importer)
+            importer.close()
+            report_stats(stats, show_stats, stats_json, stdout)
+
+
+@app.command(name="watch")
+def watch_dir(
+    path: Path = typer.Argument(
+        ...,
+        help="The directory to watch.",
+        exists=True,
+        file_okay=False,
+        readable=True,
+        resolve_path=True
+    ),
+    jobs: int = typer.Option(
+        1,
+        "--jobs",
+        "-j",
+        min=1,
+        help="The number of pages synchronized concurrently."
+    ),
+    debounce: float = typer.Option(
+        DEFAULT_DEBOUNCE,
+        "--debounce",
+        min=0.0,
+        help="How long to wait for changes to settle before sending them, "
+        "in seconds."
+    ),
+    interval: float = typer.Option(
+        DEFAULT_POLL_INTERVAL,
+        "--interval",
+        min=0.1,
+        help="How often to look for changes when polling, in seconds."
+    ),
+    polling: bool = typer.Option(
+        False,
+        "--polling",
+        help="Poll for changes even if watchdog is installed, e.g. on "
+        "network file systems."
+    ),
+    delete: bool = typer.Option(
+        True,
+        "--delete/--no-delete",
+        help="Delete the chapters and pages whose source was removed."
+    ),
+    media: bool = typer.Option(
+        True,
+        "--media/--no-media",
+        help="Upload the images and files embedded in pages, each one once, "
+        "and point the embeds to them."
+    ),
+    links: bool = typer.Option(
+        True,
+        "--links/--no-links",
+        help="Point the wikilinks between pages to the pages they name."
+    )
+) -> None:
+    """
+    Keep a directory synchronized with its book as it changes.
+
+    The directory is synchronized once, as by 'sync', then watched: once
+    changes settle, only the pages of the files saved are sent, over the
+    same connections. Removed, moved or new files and directories
+    synchronize the whole directory again.
+
+    Changes are found with watchdog if it is installed
+    (python -m pip install bsimport[watch]), by polling otherwise.
+    Stop with Ctrl-C.
+    """
+
+    import signal
+
+    from bsimport import sync, watch
+    from bsimport.cache import RemoteIndex
+    from bsimport.links import LinkIndex
+    from bsimport.manifest import Manifest
+    from bsimport.media import MediaCache
+
+    manifest = Manifest.load()
+    index = RemoteIndex.load()
+    media_cache = MediaCache.load() if media else None
+    link_index = LinkIndex.build(path, manifest) if links else None
+    importer = get_importer(
+        manifest=manifest, index=index, media=media_cache, links=link_index,
+        stream_threshold=DEFAULT_STREAM_THRESHOLD
+    )
+
+    # Stopped by a service manager as by Ctrl-C.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    name = path.stem
+    watcher = watch.Watcher(path, debounce, interval, polling)
+
+    try:
+        error, book_id = importer.import_book(path)
+
+        if error:
+            typer.secho(
+                f"Create book failed with: {ERRORS[error]}",
+                fg=typer.colors.RED
+            )
+            raise typer.Exit(error)
+
+        with watcher:
+            typer.secho(
+                f"Watching {path} ({watcher.backend}), press Ctrl-C to stop."
+            )
+
+            # The changes made while it wasn't watched come first.
+            changes = sync.sync_dir(
+                importer, manifest, path, book_id, jobs, delete
+            )
+
+            while True:
+                outcomes: Counter = Counter()
+                results = list()
+
+                for result in changes:
+                    results.append(result)
+                    outcomes[report_change(result)] += 1
+
+                link_pages(importer, jobs, outcomes)
+                save_state(manifest, index, media_cache)
+                print_sync_summary(name, outcomes)
+
+                # Failed changes are tried again with the next ones.
+                paths = watcher.take() | watch.retried(results)
+                changes = watch.apply_changes(
+                    importer, manifest, path, book_id, paths, jobs, delete
+                )
+
+    except KeyboardInterrupt:
+        typer.secho("Stopped watching.")
+
+    finally:
+        save_state(manifest, index, media_cache)
+        importer.close()
+
+
+def report_export(result: 'engine.Result') -> str:
+    """
+    Show the outcome of a chapter or page export.
+
+    :param result:
+        The result to show.
+    :type result: engine.Result
+
+    :return:
+        The outcome: 'skipped', 'failed', 'chapter' or 'exported'.
+    :rtype: str
+    """
+
+    from bsimport import engine
+
+    if result.error:
+        typer.secho(
+            f"Export {result.kind} failed with: {ERRORS[result.error]}",
+            fg=typer.colors.RED
+        )
+        typer.secho(f"Debug: {result.data}")
+        if result.kind == engine.BOOK:
+            return 'failed'
+        typer.secho(
+            f"Skipping {result.kind} '{str(result.path)}'",
+            fg=typer.colors.YELLOW
+        )
+        return 'skipped'
+
+    if result.kind == engine.CHAPTER:
+        typer.secho(f"Created the directory '{result.path.name}'")
+        return 'chapter'
+
+    typer.secho(f"Exported page '{result.data}'")
+    return 'exported'
+
+
+@app.command(name="export")
+def export_to(
+    book_id: int = typer.Argument(
+        ...,
+        help="The ID of the book to export."
+    ),
+    path: Path = typer.Argument(
+        ...,
+        help="The directory to export the book to, created if needed.",
+        file_okay=False,
+        resolve_path=True
+    ),
+    jobs: int = typer.Option(
+        1,
+        "--jobs",
+        "-j",
+        min=1,
+        help="The number of pages fetched concurrently."
+    ),
+    page_size: int = typer.Option(
+        DEFAULT_PAGE_SIZE,
+        "--page-size",
+        min=1,
+        max=500,
+        help="The number of chapters or pages listed per request."
+    ),
+    max_retries: int = typer.Option(
+        DEFAULT_MAX_RETRIES,
+        "--retries",
+        min=0,
+        help="The maximum number of times a throttled or failed request "
+        "is sent again."
+    ),
+    show_stats: bool = typer.Option(
+        False,
+        "--stats",
+        help="Show where the time went at the end of the run."
+    ),
+    stats_json: Optional[Path] = typer.Option(
+        None,
+        "--stats-json",
+        help="Write the statistics of the run as JSON to this file, "
+        "'-' for the standard output, the rest going to the standard error.",
+        dir_okay=False
+    )
+) -> None:
+    """
+    Export a book to a directory of Markdown files, laid out as 'import'
+    reads them: chapters become subdirectories, pages Markdown files with
+    their tags in the front matter.
+
+    Existing files of the same name are overwritten, others are left.
+    Use '--jobs' to fetch several pages at once.
+    """
+
+    with divert_output(stats_json) as stdout:
+        from bsimport import export
+        from bsimport.stats import Stats
+
+        stats = Stats() if show_stats or stats_json else None
+        # A connection per worker, and one for listing the next pages.
+        importer = get_importer(
+            pool_size=max(DEFAULT_POOL_SIZE, jobs + 1),
+            max_retries=max_retries,
+            stats=stats
+        )
+
+        outcomes: Counter = Counter()
+        error = SUCCESS
+
+        try:
+            for result in export.export_book(
+                importer, book_id, path, jobs, page_size
+            ):
+                outcome = report_export(result)
+                outcomes[outcome] += 1
+                if outcome == 'failed':
+                    error = result.error
+
+            typer.secho(
+                f"Exported book {book_id} to {path} "
+                f"({outcomes['exported']} pages exported, "
+                f"{outcomes['chapter']} chapters, "
+                f"{outcomes['skipped']} items skipped)",
+                fg=typer.colors.RED if error else typer.colors.GREEN
+            )
+
+            print_run_report(importer)
+
+        finally:
+            importer.close()
+
+        report_stats(stats, show_stats, stats_json, stdout)
+
+        if error:
+            raise typer.Exit(error)
+
+
+@app.command()
+def list_books(
+    page_size: int = typer.Option(
+        DEFAULT_PAGE_SIZE,
+        "--page-size",
+        min=1,
+        max=500,
+        help="The number of books fetched per request."
+    ),
+    prefetch: bool = typer.Option(
+        True,
+        "--prefetch/--no-prefetch",
+        help="Fetch the next books while showing the current ones."
+    ),
+    refresh: bool = typer.Option(
+        False,
+        "--refresh",
+        help="Ignore the local index and ask the instance."
+    ),
+    cache_ttl: int = typer.Option(
+        DEFAULT_CACHE_TTL,
+        "--cache-ttl",
+        min=0,
+        help="How long, in seconds, the local index of books is trusted."
+    )
+) -> None:
+    """
+    List all the accessible books and their ID.
+
+    The list is cached locally and refreshed once it is older than
+    '--cache-ttl' seconds.
+    """
+
+    from bsimport.cache import BOOKS, RemoteIndex
+    from bsimport.wrapper import RequestError
+
+    index = RemoteIndex.load(ttl=cache_ttl)
+    if refresh:
+        index.invalidate(BOOKS)
+
+    importer = get_importer(index=index)
+
+    error, books = importer.list_books(page_size, prefetch)
+
+    if error:
+        typer.secho(
+            f"Read list of books failed with: {ERRORS[error]}",
+            fg=typer.colors.RED
+        )
+        typer.secho(f"Debug: {books}")
+        raise typer.Exit(error)
+
+    typer.secho(
+        "\nBook list:\n"
+    )
+    columns = (
+        "ID.  ",
+        "| Title  "
+    )
+    headers = "".join(columns)
+    typer.secho(headers)
+
+    # The books are shown as they arrive, so the longest title isn't known.
+    total_length = 60
+    typer.secho("-" * total_length)
+
+    try:
+        for k, v in books:
+            typer.secho(
+                f"{k}{(len(columns[0]) - len(str(k))) * ' '}"
+                f"| {v}"
+            )
+    except RequestError as e:
+        typer.secho(
+            f"Read list of books failed with: {ERRORS[e.error]}",
+            fg=typer.colors.RED
+        )
+        typer.secho(f"Debug: {e.message}")
+        raise typer.Exit(e.error)
+
+    typer.secho("-" * total_length + "\n")
+
+    save_state(None, index)
+
+
+@app.command()
+def clear_cache() -> None:
+    """
+    Clear the local index of books, chapters and pages, and the cache of
+    uploaded files, so they are uploaded again.
+    """
+
+    from bsimport.cache import RemoteIndex
+    from bsimport.media import MediaCache
+
+    index = RemoteIndex.load()
+    index.invalidate()
+    media = MediaCache.load()
+    media.clear()
+
+    if not index.save() or not media.save():
+        typer.secho(
+            "Clearing the index failed.",
+            fg=typer.colors.RED
+        )
+        raise typer.Exit(1)
+
+    typer.secho("Cleared the index.", fg=typer.colors.GREEN)
 
 
 def _version_callback(value: bool) -> None:
@@ -488,5 +2525,5 @@ def main(
     notice = """Important notice:
     This tool is not maintained, so it may not work or behave in unexpected ways.
     Use at your own risk."""
-    typer.secho(notice, fg=typer.colors.YELLOW)
+    typer.secho(notice, fg=typer.colors.YELLOW, err=True)
     return
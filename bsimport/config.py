@@ -2,10 +2,11 @@
 # bsimport/config.py
 
 import configparser
+import functools
 import typer
 
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Any, List, Optional, Tuple
 
 from bsimport import (
     CONF_WRITE_ERROR, CONF_DIR_ERROR, CONF_FILE_ERROR,
@@ -14,9 +15,34 @@ from bsimport import (
 )
 
 
-# Returns /home/user/.config/rptodo
-CONFIG_DIR_PATH = Path(typer.get_app_dir(__app_name__))
-CONFIG_FILE_PATH = CONFIG_DIR_PATH / "config.ini"
+CONFIG_FILE_NAME = "config.ini"
+
+
+@functools.lru_cache(maxsize=None)
+def get_config_dir() -> Path:
+    """
+    Get the config directory, e.g. /home/user/.config/bsimport.
+
+    It is resolved on first use rather than when the module is imported,
+    so commands that don't need it don't pay for it.
+    """
+    return Path(typer.get_app_dir(__app_name__))
+
+
+def get_config_file() -> Path:
+    """
+    Get the path of the config file.
+    """
+    return get_config_dir() / CONFIG_FILE_NAME
+
+
+def __getattr__(name: str) -> Any:
+    # CONFIG_DIR_PATH and CONFIG_FILE_PATH are resolved on first access.
+    if name == 'CONFIG_DIR_PATH':
+        return get_config_dir()
+    if name == 'CONFIG_FILE_PATH':
+        return get_config_file()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def init_app(
@@ -25,13 +51,15 @@ def init_app(
     url: str
 ) -> Tuple[int, str]:
 
+    config_file = get_config_file()
+
     try:
-        CONFIG_DIR_PATH.mkdir(exist_ok=True)
+        get_config_dir().mkdir(exist_ok=True)
     except OSError:
         return CONF_DIR_ERROR, ""
 
     try:
-        CONFIG_FILE_PATH.touch(exist_ok=True)
+        config_file.touch(exist_ok=True)
     except OSError:
         return CONF_FILE_ERROR, ""
 
@@ -46,21 +74,23 @@ def init_app(
     }
 
     try:
-        with CONFIG_FILE_PATH.open('w') as file:
+        with config_file.open('w') as file:
             config_parser.write(file)
     except OSError:
         return CONF_WRITE_ERROR, ""
-    return SUCCESS, str(CONFIG_FILE_PATH)
+    return SUCCESS, str(config_file)
 
 
 def read_config() -> Tuple[int, List[str]]:
 
-    if not CONFIG_FILE_PATH.exists():
+    config_file = get_config_file()
+
+    if not config_file.exists():
         return NO_FILE_ERROR, []
 
     config = configparser.ConfigParser()
 
-    config.read(CONFIG_FILE_PATH)
+    config.read(config_file)
 
     try:
         gen = config['General']
@@ -97,12 +127,14 @@ def modify_config(
     :rtype: int
     """
 
-    if not CONFIG_FILE_PATH.exists():
+    config_file = get_config_file()
+
+    if not config_file.exists():
         return NO_FILE_ERROR, ""
 
     config = configparser.ConfigParser()
 
-    config.read(CONFIG_FILE_PATH)
+    config.read(config_file)
 
     res = "Successfully updated "
     items = list()
@@ -120,7 +152,7 @@ def modify_config(
     res += ", ".join(items)
 
     try:
-        with CONFIG_FILE_PATH.open('w') as file:
+        with config_file.open('w') as file:
             config.write(file)
     except OSError:
         return CONF_WRITE_ERROR, ""
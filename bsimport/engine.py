@@ -0,0 +1,818 @@
+"""This module provides the concurrent import engine for directories."""
+# bsimport/engine.py
+
+import asyncio
+
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor,
+    ThreadPoolExecutor, wait
+)
+from pathlib import Path
+from typing import (
+    Any, AsyncIterator, Deque, Dict, Iterator, List, NamedTuple, Optional,
+    Tuple
+)
+
+from bsimport import SUCCESS, profiling
+from bsimport.imp import (
+    AsyncImporter, Importer, IResponse, Page, read_page
+)
+
+
+BOOK = "book"
+CHAPTER = "chapter"
+PAGE = "page"
+LINK = "link"
+
+
+class Result(NamedTuple):
+    """
+    Represents the outcome of a single book, chapter or page import.
+    Contains:
+    - The kind of item, either BOOK, CHAPTER, PAGE or LINK for a page
+      sent again once its links are resolved.
+    - The path of the directory or file.
+    - An error code.
+    - The data returned by the Importer, e.g. the book or chapter ID,
+      the page name, an error message, etc.
+    - Whether anything was sent, False for pages unchanged since
+      the last import, or whose links didn't need sending again.
+    """
+    kind: str
+    path: Path
+    error: int
+    data: Any
+    changed: bool = True
+
+
+def list_pages(path: Path) -> List[Path]:
+    """
+    List the Markdown files directly inside a directory.
+
+    :param path:
+        The path to the directory.
+    :type path: Path
+
+    :return:
+        The Markdown files, sorted by name.
+    :rtype: List[Path]
+    """
+    return sorted(
+        child for child in path.iterdir()
+        if child.is_file() and child.suffix == '.md'
+    )
+
+
+def list_chapters(path: Path) -> List[Path]:
+    """
+    List the subdirectories directly inside a directory.
+
+    :param path:
+        The path to the directory.
+    :type path: Path
+
+    :return:
+        The subdirectories, sorted by name.
+    :rtype: List[Path]
+    """
+    return sorted(child for child in path.iterdir() if child.is_dir())
+
+
+class Task(NamedTuple):
+    """
+    Represents a book, chapter or page waiting to be imported.
+    Contains:
+    - The kind of item, either BOOK, CHAPTER, PAGE or LINK.
+    - The path of the directory or file.
+    - The ID of the book that will hold the item.
+    - The ID of the chapter that will hold the page, -1 if none.
+    """
+    kind: str
+    path: Path
+    book_id: int = -1
+    chapter_id: int = -1
+
+
+def plan_book(path: Path, book_id: int) -> Deque[Task]:
+    """
+    List the chapters, then the pages, found directly inside a directory.
+
+    The pages of the chapters are not included since they need the ID
+    of their chapter, see `plan_chapter`.
+
+    :param path:
+        The path to the directory imported as the book.
+    :type path: Path
+    :param book_id:
+        The ID of the book.
+    :type book_id: int
+
+    :return:
+        The tasks, in the order they should be run.
+    :rtype: Deque[Task]
+    """
+
+    tasks: Deque[Task] = deque()
+
+    for chapter in list_chapters(path):
+        tasks.append(Task(CHAPTER, chapter, book_id=book_id))
+
+    for page in list_pages(path):
+        tasks.append(Task(PAGE, page, book_id=book_id))
+
+    return tasks
+
+
+def plan_shelf(path: Path) -> Deque[Task]:
+    """
+    List the books of a shelf, i.e. the directories found directly inside
+    a directory.
+
+    The content of the books is not included since it needs the ID of
+    its book, see `plan_book`.
+
+    :param path:
+        The path to the directory imported as the shelf.
+    :type path: Path
+
+    :return:
+        The tasks.
+    :rtype: Deque[Task]
+    """
+    return plan_books(list_chapters(path))
+
+
+def plan_books(paths: List[Path]) -> Deque[Task]:
+    """
+    List some directories to import as books, e.g. those of several
+    shelves.
+
+    See `plan_shelf`.
+
+    :param paths:
+        The paths to the directories.
+    :type paths: List[Path]
+
+    :return:
+        The tasks.
+    :rtype: Deque[Task]
+    """
+    return deque(Task(BOOK, path) for path in paths)
+
+
+def plan_chapter(path: Path, chapter_id: int) -> List[Task]:
+    """
+    List the pages of a chapter once it has been created.
+
+    :param path:
+        The path to the directory imported as the chapter.
+    :type path: Path
+    :param chapter_id:
+        The ID of the chapter.
+    :type chapter_id: int
+
+    :return:
+        The tasks.
+    :rtype: List[Task]
+    """
+    return [
+        Task(PAGE, page, chapter_id=chapter_id) for page in list_pages(path)
+    ]
+
+
+def plan_next(task: Task, result: Result) -> List[Task]:
+    """
+    List the tasks a finished task makes possible: the content of the
+    book or chapter it created.
+
+    :param task:
+        The finished task.
+    :type task: Task
+    :param result:
+        Its result.
+    :type result: Result
+
+    :return:
+        The tasks, none for a page or a failed task.
+    :rtype: List[Task]
+    """
+
+    if result.error:
+        return []
+    if task.kind == BOOK:
+        return list(plan_book(task.path, result.data))
+    if task.kind == CHAPTER:
+        return plan_chapter(task.path, result.data)
+    return []
+
+
+def run_task(importer: Importer, task: Task) -> Result:
+    """
+    Import a book, a chapter or a page, skipping pages unchanged since
+    the last import.
+
+    :param importer:
+        The Importer to use.
+    :type importer: Importer
+    :param task:
+        The task to run.
+    :type task: Task
+
+    :return:
+        The result of the task.
+    :rtype: Result
+    """
+
+    if task.kind == BOOK:
+        error, data = importer.import_book(task.path)
+        return Result(task.kind, task.path, error, data)
+
+    if task.kind == CHAPTER:
+        error, data = importer.import_chapter(task.path, task.book_id)
+        return Result(task.kind, task.path, error, data)
+
+    if task.kind == LINK:
+        error, data = importer.link_page(
+            task.path, book_id=task.book_id, chapter_id=task.chapter_id
+        )
+        return Result(
+            task.kind, task.path, error, data, changed=data is not None
+        )
+
+    name = importer.unchanged_page(task.path, task.book_id, task.chapter_id)
+    if name is not None:
+        return Result(task.kind, task.path, SUCCESS, name, changed=False)
+
+    error, data = importer.import_page(
+        task.path, book_id=task.book_id, chapter_id=task.chapter_id
+    )
+    return Result(task.kind, task.path, error, data)
+
+
+def parse_task(
+    path: Path,
+    stream_threshold: Optional[int] = None
+) -> Tuple[IResponse, Dict[str, float]]:
+    """
+    Read and parse a file in a worker of the parse stage.
+
+    The text of a large file is sent back as a TextRange, so it isn't
+    copied between the processes.
+
+    :param path:
+        The path to the file.
+    :type path: Path
+    :param stream_threshold:
+        The size from which the file is streamed, see read_page.
+    :type stream_threshold: Optional[int]
+
+    :return:
+        The response of read_page, and the time spent reading and parsing,
+        recorded by the main process since stats aren't shared.
+    :rtype: Tuple[IResponse, Dict[str, float]]
+    """
+
+    timings: Dict[str, float] = dict()
+    return read_page(path, timings, stream_threshold), timings
+
+
+def upload_task(importer: Importer, task: Task, page: Page) -> Result:
+    """
+    Import a page parsed by the parse stage.
+
+    :param importer:
+        The Importer to use.
+    :type importer: Importer
+    :param task:
+        The task of the page.
+    :type task: Task
+    :param page:
+        The parsed file.
+    :type page: Page
+
+    :return:
+        The result of the task.
+    :rtype: Result
+    """
+
+    error, data = importer.upload_page(
+        task.path, page, book_id=task.book_id, chapter_id=task.chapter_id
+    )
+    return Result(task.kind, task.path, error, data)
+
+
+async def run_task_async(
+    importer: AsyncImporter,
+    task: Task,
+    parse_pool: Optional[Executor] = None
+) -> Result:
+    """
+    Import a book, a chapter or a page with an AsyncImporter.
+
+    See `run_task`. With a `parse_pool`, the file is parsed there while
+    the event loop keeps serving the other requests.
+    """
+
+    if task.kind == BOOK:
+        error, data = await importer.import_book(task.path)
+        return Result(task.kind, task.path, error, data)
+
+    if task.kind == CHAPTER:
+        error, data = await importer.import_chapter(task.path, task.book_id)
+        return Result(task.kind, task.path, error, data)
+
+    if task.kind == LINK:
+        error, data = await importer.link_page(
+            task.path, book_id=task.book_id, chapter_id=task.chapter_id
+        )
+        return Result(
+            task.kind, task.path, error, data, changed=data is not None
+        )
+
+    name = importer.unchanged_page(task.path, task.book_id, task.chapter_id)
+    if name is not None:
+        return Result(task.kind, task.path, SUCCESS, name, changed=False)
+
+    if parse_pool is None:
+        error, data = await importer.import_page(
+            task.path, book_id=task.book_id, chapter_id=task.chapter_id
+        )
+        return Result(task.kind, task.path, error, data)
+
+    loop = asyncio.get_running_loop()
+    response, timings = await loop.run_in_executor(
+        parse_pool, parse_task, task.path, importer.stream_threshold
+    )
+    importer.record_timings(task.path, timings)
+
+    error, page = response
+    if error:
+        return Result(task.kind, task.path, error, page)
+
+    error, data = await importer.upload_page(
+        task.path, page, book_id=task.book_id, chapter_id=task.chapter_id
+    )
+    return Result(task.kind, task.path, error, data)
+
+
+def import_book_content(
+    importer: Importer,
+    path: Path,
+    book_id: int,
+    jobs: int = 1,
+    parse_workers: int = 0
+) -> Iterator[Result]:
+    """
+    Import the chapters and pages of a directory into an existing book.
+
+    Chapters are created first, then pages are fanned out over a pool of
+    `jobs` workers. The pages of a chapter are only scheduled once the
+    chapter exists, since they need its ID. At most twice `jobs` tasks
+    are in flight at any time, so large vaults don't queue every page
+    at once.
+
+    With `parse_workers`, files are parsed by a pool of processes instead,
+    see `_run_pipeline`.
+
+    :param importer:
+        The Importer to use, shared by every worker.
+    :type importer: Importer
+    :param path:
+        The path to the directory imported as the book.
+    :type path: Path
+    :param book_id:
+        The ID of the book.
+    :type book_id: int
+    :param jobs:
+        The number of concurrent requests.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        workers sending the requests.
+    :type parse_workers: int
+
+    :yield:
+        The result of each chapter and page, in completion order.
+    :rtype: Iterator[Result]
+    """
+    yield from _run_tasks(
+        importer, plan_book(path, book_id), jobs, parse_workers
+    )
+
+
+def import_shelf_content(
+    importer: Importer,
+    path: Path,
+    jobs: int = 1,
+    parse_workers: int = 0
+) -> Iterator[Result]:
+    """
+    Import the directories of a directory as books, along with their
+    chapters and pages.
+
+    The books are created concurrently by the same workers as their
+    content, see `import_book_content`. Adding them to the shelf is left
+    to the caller, once every book exists.
+
+    :param importer:
+        The Importer to use, shared by every worker.
+    :type importer: Importer
+    :param path:
+        The path to the directory imported as the shelf.
+    :type path: Path
+    :param jobs:
+        The number of concurrent requests.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        workers sending the requests.
+    :type parse_workers: int
+
+    :yield:
+        The result of each book, chapter and page, in completion order.
+    :rtype: Iterator[Result]
+    """
+    yield from _run_tasks(importer, plan_shelf(path), jobs, parse_workers)
+
+
+def import_books_content(
+    importer: Importer,
+    paths: List[Path],
+    jobs: int = 1,
+    parse_workers: int = 0
+) -> Iterator[Result]:
+    """
+    Import some directories as books, along with their chapters and pages,
+    e.g. the directories of a batch or the books of several shelves.
+
+    The same workers import every book, so `jobs` bounds the requests of
+    the whole batch, see `import_shelf_content`.
+
+    :param importer:
+        The Importer to use, shared by every worker.
+    :type importer: Importer
+    :param paths:
+        The paths to the directories.
+    :type paths: List[Path]
+    :param jobs:
+        The number of concurrent requests.
+    :type jobs: int
+    :param parse_workers:
+        The number of processes parsing files, 0 to parse them in the
+        workers sending the requests.
+    :type parse_workers: int
+
+    :yield:
+        The result of each book, chapter and page, in completion order.
+    :rtype: Iterator[Result]
+    """
+    yield from _run_tasks(importer, plan_books(paths), jobs, parse_workers)
+
+
+def import_pages(
+    importer: Importer,
+    tasks: List[Task],
+    jobs: int = 1
+) -> Iterator[Result]:
+    """
+    Import some pages into existing books or chapters, e.g. the files
+    changed since the last sync, skipping those unchanged.
+
+    :param importer:
+        The Importer to use, shared by every worker.
+    :type importer: Importer
+    :param tasks:
+        The PAGE tasks, with the ID of their book or chapter.
+    :type tasks: List[Task]
+    :param jobs:
+        The number of concurrent requests.
+    :type jobs: int
+
+    :yield:
+        The result of each page, in completion order.
+    :rtype: Iterator[Result]
+    """
+    yield from _run_tasks(importer, deque(tasks), jobs, 0)
+
+
+def plan_links(importer: Importer) -> Deque[Task]:
+    """
+    List the pages sent with wikilinks to pages that didn't exist yet.
+
+    :param importer:
+        The Importer that sent them.
+    :type importer: Importer
+
+    :return:
+        The tasks.
+    :rtype: Deque[Task]
+    """
+    return deque(
+        Task(LINK, path, book_id, chapter_id)
+        for path, book_id, chapter_id in importer.pending_links()
+    )
+
+
+def link_pages(importer: Importer, jobs: int = 1) -> Iterator[Result]:
+    """
+    Send again the pages whose wikilinks weren't all resolved, once every
+    page of the run exists.
+
+    This is the second phase of an import: the pages are updated together,
+    over the same pool of `jobs` workers, only if more of their links are
+    resolved than when they were sent.
+
+    :param importer:
+        The Importer used for the first phase.
+    :type importer: Importer
+    :param jobs:
+        The number of concurrent requests.
+    :type jobs: int
+
+    :yield:
+        The result of each deferred page, in completion order.
+    :rtype: Iterator[Result]
+    """
+    yield from _run_tasks(importer, plan_links(importer), jobs, 0)
+
+
+def _run_tasks(
+    importer: Importer,
+    tasks: Deque[Task],
+    jobs: int,
+    parse_workers: int
+) -> Iterator[Result]:
+    """
+    Run tasks over a pool of `jobs` workers, scheduling the content of
+    each book and chapter once it is created, see `import_book_content`.
+
+    :yield:
+        The result of each task, in completion order.
+    :rtype: Iterator[Result]
+    """
+
+    if parse_workers > 0:
+        yield from _run_pipeline(importer, tasks, jobs, parse_workers)
+        return
+
+    max_pending = 2 * jobs
+    pending: Dict[Future, Task] = dict()
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+
+        while tasks or pending:
+
+            while tasks and len(pending) < max_pending:
+                task = tasks.popleft()
+                future = executor.submit(
+                    profiling.wrap(run_task), importer, task
+                )
+                pending[future] = task
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                task = pending.pop(future)
+                result = future.result()
+
+                tasks.extend(plan_next(task, result))
+
+                yield result
+
+
+def _run_pipeline(
+    importer: Importer,
+    tasks: Deque[Task],
+    jobs: int,
+    parse_workers: int
+) -> Iterator[Result]:
+    """
+    Run tasks as three stages joined by bounded queues:
+
+    - The walker takes the next task, skips unchanged pages and sends the
+      others to the parse stage, books and chapters straight to the upload
+      stage.
+    - The parse stage reads and parses files on `parse_workers` processes,
+      so parsing doesn't compete with the requests for the GIL.
+    - The upload stage sends the requests on `jobs` threads.
+
+    Each stage holds at most twice its number of workers, parsed pages
+    waiting for an upload slot included, so memory doesn't grow with the
+    size of the vault.
+
+    :yield:
+        The result of each chapter and page, in completion order.
+    :rtype: Iterator[Result]
+    """
+
+    max_parsing = 2 * parse_workers
+    max_uploading = 2 * jobs
+
+    parsing: Dict[Future, Task] = dict()
+    parsed: Deque[Tuple[Task, Page]] = deque()
+    uploading: Dict[Future, Task] = dict()
+
+    with ProcessPoolExecutor(
+        max_workers=parse_workers, **profiling.pool_options()
+    ) as parse_pool, ThreadPoolExecutor(max_workers=jobs) as upload_pool:
+
+        while tasks or parsing or parsed or uploading:
+
+            while parsed and len(uploading) < max_uploading:
+                task, page = parsed.popleft()
+                future = upload_pool.submit(
+                    profiling.wrap(upload_task), importer, task, page
+                )
+                uploading[future] = task
+
+            while tasks and len(parsing) + len(parsed) < max_parsing:
+
+                task = tasks[0]
+
+                if task.kind != PAGE:
+                    if len(uploading) >= max_uploading:
+                        break
+                    tasks.popleft()
+                    future = upload_pool.submit(
+                        profiling.wrap(run_task), importer, task
+                    )
+                    uploading[future] = task
+                    continue
+
+                tasks.popleft()
+
+                name = importer.unchanged_page(
+                    task.path, task.book_id, task.chapter_id
+                )
+                if name is not None:
+                    yield Result(
+                        task.kind, task.path, SUCCESS, name, changed=False
+                    )
+                    continue
+
+                parsing[parse_pool.submit(
+                    parse_task, task.path, importer.stream_threshold
+                )] = task
+
+            done, _ = wait(
+                list(parsing) + list(uploading), return_when=FIRST_COMPLETED
+            )
+
+            for future in done:
+
+                if future in parsing:
+                    task = parsing.pop(future)
+                    response, timings = future.result()
+                    importer.record_timings(task.path, timings)
+                    error, page = response
+                    if error:
+                        yield Result(task.kind, task.path, error, page)
+                    else:
+                        parsed.append((task, page))
+                    continue
+
+                task = uploading.pop(future)
+                result = future.result()
+
+                tasks.extend(plan_next(task, result))
+
+                yield result
+
+
+async def import_book_content_async(
+    importer: AsyncImporter,
+    path: Path,
+    book_id: int,
+    jobs: int = 1,
+    parse_workers: int = 0
+) -> AsyncIterator[Result]:
+    """
+    Import the chapters and pages of a directory into an existing book,
+    using a single event loop instead of a thread pool.
+
+    Follows the same order as `import_book_content`, with at most `jobs`
+    tasks in flight. With `parse_workers`, files are parsed by a pool of
+    processes while the loop waits on the network.
+
+    :yield:
+        The result of each chapter and page, in completion order.
+    :rtype: AsyncIterator[Result]
+    """
+
+    async for result in _run_tasks_async(
+        importer, plan_book(path, book_id), jobs, parse_workers
+    ):
+        yield result
+
+
+async def import_shelf_content_async(
+    importer: AsyncImporter,
+    path: Path,
+    jobs: int = 1,
+    parse_workers: int = 0
+) -> AsyncIterator[Result]:
+    """
+    Import the directories of a directory as books with an AsyncImporter.
+
+    See `import_shelf_content` and `import_book_content_async`.
+
+    :yield:
+        The result of each book, chapter and page, in completion order.
+    :rtype: AsyncIterator[Result]
+    """
+
+    async for result in _run_tasks_async(
+        importer, plan_shelf(path), jobs, parse_workers
+    ):
+        yield result
+
+
+async def import_books_content_async(
+    importer: AsyncImporter,
+    paths: List[Path],
+    jobs: int = 1,
+    parse_workers: int = 0
+) -> AsyncIterator[Result]:
+    """
+    Import some directories as books with an AsyncImporter.
+
+    See `import_books_content`.
+
+    :yield:
+        The result of each book, chapter and page, in completion order.
+    :rtype: AsyncIterator[Result]
+    """
+
+    async for result in _run_tasks_async(
+        importer, plan_books(paths), jobs, parse_workers
+    ):
+        yield result
+
+
+async def link_pages_async(
+    importer: AsyncImporter,
+    jobs: int = 1
+) -> AsyncIterator[Result]:
+    """
+    Send again the pages whose wikilinks weren't all resolved with an
+    AsyncImporter.
+
+    See `link_pages`.
+
+    :yield:
+        The result of each deferred page, in completion order.
+    :rtype: AsyncIterator[Result]
+    """
+
+    async for result in _run_tasks_async(
+        importer, plan_links(importer), jobs, 0
+    ):
+        yield result
+
+
+async def _run_tasks_async(
+    importer: AsyncImporter,
+    tasks: Deque[Task],
+    jobs: int,
+    parse_workers: int
+) -> AsyncIterator[Result]:
+    """
+    Run tasks on the event loop, see `import_book_content_async`.
+
+    :yield:
+        The result of each task, in completion order.
+    :rtype: AsyncIterator[Result]
+    """
+
+    pending: Dict[asyncio.Future, Task] = dict()
+    parse_pool = None
+    if parse_workers > 0:
+        parse_pool = ProcessPoolExecutor(
+            max_workers=parse_workers, **profiling.pool_options()
+        )
+
+    try:
+        while tasks or pending:
+
+            while tasks and len(pending) < jobs:
+                task = tasks.popleft()
+                future = asyncio.ensure_future(
+                    run_task_async(importer, task, parse_pool)
+                )
+                pending[future] = task
+
+            done, _ = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for future in done:
+                task = pending.pop(future)
+                result = future.result()
+
+                tasks.extend(plan_next(task, result))
+
+                yield result
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown()
@@ -0,0 +1,253 @@
+"""This module exports a book back to a directory of Markdown files."""
+# bsimport/export.py
+
+import os
+import re
+
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+)
+from pathlib import Path
+from typing import Any, Dict, Iterator, Set
+
+from bsimport import DEFAULT_PAGE_SIZE, FILE_WRITE_ERROR, SUCCESS, profiling
+from bsimport.engine import BOOK, CHAPTER, PAGE, Result
+from bsimport.imp import Importer
+from bsimport.wrapper import RequestError
+
+
+# Characters that can't be in a file name on Linux, macOS or Windows.
+UNSAFE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+# The longest file name written, in characters, leaving room for a
+# ' (2)' suffix and the '.tmp' of the file being written within the
+# 255 bytes most filesystems allow.
+MAX_NAME = 200
+
+
+def file_name(name: str, taken: Set[str], suffix: str = "") -> str:
+    """
+    Turn the name of a chapter or page into a file name, unique in its
+    directory.
+
+    :param name:
+        The name of the chapter or page.
+    :type name: str
+    :param taken:
+        The names already used in the directory, casefolded so that names
+        differing by case don't overwrite each other on case-insensitive
+        filesystems. The name returned is added to it.
+    :type taken: Set[str]
+    :param suffix:
+        The extension of the file, e.g. '.md'.
+    :type suffix: str
+
+    :return:
+        The file name.
+    :rtype: str
+    """
+
+    base = UNSAFE.sub('_', name)[:MAX_NAME].strip().strip('.')
+    if not base:
+        base = "Untitled"
+
+    candidate = base + suffix
+    number = 1
+    while candidate.casefold() in taken:
+        number += 1
+        candidate = f"{base} ({number}){suffix}"
+
+    taken.add(candidate.casefold())
+    return candidate
+
+
+def page_text(page: Dict[str, Any]) -> str:
+    """
+    Write a page as a Markdown file the import reads back: its tags in
+    the front matter, its name as the title, then its text.
+
+    Only the name of the tags is kept, the import doesn't read values.
+    Pages written with the WYSIWYG editor have no Markdown: their HTML is
+    written instead, which Markdown allows.
+
+    :param page:
+        The page, as Bookstack sends it.
+    :type page: Dict[str, Any]
+
+    :return:
+        The content of the file.
+    :rtype: str
+    """
+
+    head = ""
+    tags = [tag['name'] for tag in page.get('tags') or () if tag.get('name')]
+    if tags:
+        head = f"---\ntags: [{', '.join(tags)}]\n---\n"
+
+    text = page.get('markdown') or page.get('html') or ""
+    if text and not text.endswith('\n'):
+        text += '\n'
+
+    return f"{head}# {page['name']}\n\n{text}"
+
+
+def write_text(path: Path, text: str) -> None:
+    """
+    Write a file as a whole: it is written next to its path, then moved
+    in place, so an interrupted export never leaves a truncated page.
+
+    :raises OSError:
+        If the file can't be written.
+    """
+
+    tmp_path = path.with_name(path.name + '.tmp')
+
+    with tmp_path.open('w', encoding='utf-8', newline='') as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def export_page(importer: Importer, page_id: int, path: Path) -> Result:
+    """
+    Fetch a page and write it to a Markdown file.
+
+    The page is dropped once written, so an export holds at most one page
+    per worker in memory.
+
+    :param importer:
+        The Importer to use.
+    :type importer: Importer
+    :param page_id:
+        The ID of the page.
+    :type page_id: int
+    :param path:
+        The path of the file.
+    :type path: Path
+
+    :return:
+        The result, with the name of the page if successful.
+    :rtype: Result
+    """
+
+    error, data = importer.fetch_page(page_id)
+    if error:
+        return Result(PAGE, path, error, data)
+
+    try:
+        write_text(path, page_text(data))
+    except OSError as e:
+        return Result(PAGE, path, FILE_WRITE_ERROR, str(e))
+
+    return Result(PAGE, path, SUCCESS, data['name'])
+
+
+def export_book(
+    importer: Importer,
+    book_id: int,
+    path: Path,
+    jobs: int = 1,
+    count: int = DEFAULT_PAGE_SIZE
+) -> Iterator[Result]:
+    """
+    Export a book to a directory, laid out as the import expects it: its
+    chapters become subdirectories and its pages Markdown files.
+
+    The chapters and pages are listed `count` at a time, the next ones
+    being fetched while the current ones are handled. Pages are then
+    fetched and written over a pool of `jobs` workers, as they are listed.
+
+    :param importer:
+        The Importer to use.
+    :type importer: Importer
+    :param book_id:
+        The ID of the book.
+    :type book_id: int
+    :param path:
+        The directory to export the book to, created if needed. Files of
+        the same name are overwritten.
+    :type path: Path
+    :param jobs:
+        The number of pages fetched concurrently.
+    :type jobs: int
+    :param count:
+        The number of chapters or pages listed per request.
+    :type count: int
+
+    :yield:
+        The result of each chapter, in order, then of each page, in
+        completion order. A failed listing ends the export with a BOOK
+        result.
+    :rtype: Iterator[Result]
+    """
+
+    # A wrong ID would otherwise export an empty book.
+    error, book = importer.fetch_book(book_id)
+    if error:
+        yield Result(BOOK, path, error, book)
+        return
+
+    try:
+        path.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        yield Result(BOOK, path, FILE_WRITE_ERROR, str(e))
+        return
+
+    taken: Dict[Path, Set[str]] = {path: set()}
+    folders: Dict[int, Path] = dict()
+
+    error, chapters = importer.list_chapters(book_id, count)
+    if error:
+        yield Result(BOOK, path, error, chapters)
+        return
+
+    try:
+        for chapter in chapters:
+            folder = path / file_name(chapter['name'], taken[path])
+            taken[folder] = set()
+            # Its pages go there even if it can't be created, and fail.
+            folders[chapter['id']] = folder
+            try:
+                folder.mkdir(exist_ok=True)
+            except OSError as e:
+                yield Result(CHAPTER, folder, FILE_WRITE_ERROR, str(e))
+            else:
+                yield Result(CHAPTER, folder, SUCCESS, chapter['name'])
+    except RequestError as e:
+        yield Result(BOOK, path, e.error, e.message)
+        return
+
+    error, pages = importer.list_pages(book_id, count)
+    if error:
+        yield Result(BOOK, path, error, pages)
+        return
+
+    max_pending = 2 * jobs
+    pending: Set[Future] = set()
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+
+        try:
+            for page in pages:
+
+                # Drafts are only listed for their author, and unfinished.
+                if page.get('draft'):
+                    continue
+
+                folder = folders.get(page.get('chapter_id'), path)
+                file = folder / file_name(page['name'], taken[folder], '.md')
+                pending.add(executor.submit(
+                    profiling.wrap(export_page), importer, page['id'], file
+                ))
+
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+        except RequestError as e:
+            yield Result(BOOK, path, e.error, e.message)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
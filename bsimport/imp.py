@@ -1,11 +1,28 @@
 """This module provides a layer between the CLI and the API wrapper."""
 # bsimport/imp.py
 
+import threading
+import time
+
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple
-from bsimport import EMPTY_FILE_ERROR, FILE_READ_ERROR, SUCCESS
+from typing import (
+    Any, ContextManager, Dict, Generator, Iterator, List, NamedTuple,
+    Optional, Set, Tuple, TypeVar, Union
+)
+from bsimport import EMPTY_FILE_ERROR, FILE_READ_ERROR, SUCCESS, parser
 
-from bsimport.wrapper import Bookstack
+from bsimport.cache import BOOKS, CHAPTERS, PAGES, RemoteIndex
+from bsimport.limit import AdaptiveLimit
+from bsimport.links import LinkIndex
+from bsimport.manifest import BOOK, CHAPTER, PAGE, SHELF, Manifest
+from bsimport.media import Media, MediaCache, MediaUploader, rewrite
+from bsimport.parser import TextRange
+from bsimport.stats import CHECK, LINK, PARSE, READ, UPLOAD, Stats
+from bsimport.wrapper import (
+    DEFAULT_MAX_RETRIES, DEFAULT_PAGE_SIZE, DEFAULT_POOL_SIZE,
+    Bookstack, RequestError, RetryPolicy
+)
 
 
 class IResponse(NamedTuple):
@@ -19,257 +36,2027 @@ class IResponse(NamedTuple):
     data: Any
 
 
-class Importer():
+class Page(NamedTuple):
     """
-    A class to add a layer between the CLI and the wrapper.
+    Represents a parsed Markdown file, ready to be imported.
+    Contains:
+    - The name of the page.
+    - The Markdown text, or where it is in a large file, see read_page.
+    - The tags, None if there are none.
+    - The aliases, the other names wikilinks can use, None if there are
+      none.
     """
+    name: str
+    text: Union[str, TextRange]
+    tags: Optional[List[Dict[str, str]]]
+    aliases: Optional[List[str]] = None
 
-    def __init__(self, id: str, secret: str, url: str):
-        self._wrapper = Bookstack(id, secret, url)
 
-    def _parse_front_matter(
-        self,
-        content: List[str]
-    ) -> Tuple[List[Dict[str, str]], int]:
-        """
-        Parse the YAML front matter in search of tags.
+class Parts(NamedTuple):
+    """
+    Represents the pages a large file was split into.
+    Contains:
+    - The IDs of the pages, in order.
+    - The ID of the chapter created to hold them, -1 if they are in the
+      chapter of the file.
+    """
+    ids: List[int]
+    chapter: int = -1
 
-        :param content:
-            The content of the Markdown file to parse.
-        :type content: List[str]
 
-        :return:
-            The tags found, if any.
-        :rtype: List[Dict[str, str]]
-        :return:
-            The position of the end of the front matter, if it exists.
-        :rtype: int
-        """
+# What a step does besides calling a method of the wrapper: upload the
+# files a page embeds, log in the journal that an item is about to be
+# created, or find an existing book or chapter by name.
+STEP_MEDIA = "media"
+STEP_PLAN = "plan"
+STEP_LOOKUP = "lookup"
 
-        tags = list()
-        end = -1
 
-        if not content[0].startswith('---'):
-            return tags, end
+class Step(NamedTuple):
+    """
+    Represents a request an import needs, yielded by the steps of the
+    BaseImporter and sent by an Importer or an AsyncImporter.
+    Contains:
+    - The name of the wrapper method to call, or STEP_MEDIA, STEP_PLAN or
+      STEP_LOOKUP.
+    - The positional arguments.
+    - The keyword arguments.
+    """
+    action: str
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
 
-        tmp = []
 
-        for count, line in enumerate(content[1:]):
-            # Found the end of the front matter
-            if line.startswith('---'):
-                end = count + 1
-                break
+# The steps of an import: they yield the requests they need, are sent
+# back the responses, and return the result of the import.
+Steps = Generator[Step, Any, IResponse]
+
+T = TypeVar('T')
+
+
+def _step(action: str, *args: Any, **kwargs: Any) -> Step:
+    """
+    Describe a request, e.g. `_step('delete_page', 3)`.
+    """
+    return Step(action, args, kwargs)
+
+
+def _part_name(name: str, number: int) -> str:
+    """
+    Name a part of a split page, e.g. 'Name (2)', within 255 characters.
+    """
+
+    suffix = f" ({number})"
+    return name[:255 - len(suffix)] + suffix
+
+
+def _page_fields(
+    book_id: Optional[int] = -1,
+    chapter_id: Optional[int] = -1
+) -> Dict[str, Any]:
+    """
+    Get the fields to look up a page of a book or chapter by, see
+    `BaseImporter._lookup`. The pages of a book outside its chapters have
+    a 'chapter_id' of 0.
+    """
+
+    if chapter_id != -1:
+        return {'chapter_id': chapter_id}
+    return {'book_id': book_id, 'chapter_id': 0}
+
 
-            lc = line.split(':')
+def _parent(
+    book_id: Optional[int] = -1,
+    chapter_id: Optional[int] = -1
+) -> str:
+    """
+    Describe where a page goes, e.g. 'book:3' or 'chapter:5'.
+    """
+
+    if book_id != -1:
+        return f"book:{book_id}"
+    return f"chapter:{chapter_id}"
+
+
+def read_page(
+    file_path: Path,
+    timings: Optional[Dict[str, float]] = None,
+    stream_threshold: Optional[int] = None
+) -> IResponse:
+    """
+    Read and parse a Markdown file.
+
+    A plain function, so the parse stage of the engine can run it in
+    another process.
+
+    :param file_path:
+        The path to the file to read.
+    :type file_path: Path
+    :param timings:
+        If provided, receives the time spent reading and parsing the file,
+        in seconds, under READ and PARSE.
+    :type timings: Optional[Dict[str, float]]
+    :param stream_threshold:
+        The size from which the text of a file is left on disk, as a
+        TextRange, to be streamed when the page is sent. None to always
+        read it.
+    :type stream_threshold: Optional[int]
+
+    :return:
+        An error code.
+    :rtype: int
+    :return:
+        The parsed Page if successful, an error message otherwise.
+    :rtype: Union[Page, str]
+    """
+
+    start = time.perf_counter()
+
+    try:
+        parsed = None
+        if stream_threshold is not None and \
+                file_path.stat().st_size >= stream_threshold:
+            # Mapped rather than read, finding the text is the parsing.
+            read = time.perf_counter()
+            parsed = parser.parse_large(file_path)
+        if parsed is None:
+            with parser.open_buffer(file_path) as buf:
+                read = time.perf_counter()
+                parsed = None if buf is None else parser.parse(buf)
+    except (OSError, UnicodeDecodeError):
+        return IResponse(FILE_READ_ERROR, "")
+
+    if timings is not None:
+        timings[READ] = read - start
+        timings[PARSE] = time.perf_counter() - read
+
+    if parsed is None:
+        return IResponse(EMPTY_FILE_ERROR, "")
+
+    name, text, tags, aliases = parsed
+
+    if not name:
+        name = file_path.stem
 
-            # Improperly formatted or YAML list (not supported)
-            if len(lc) == 1:
-                continue
-            # Skip all other front matter content
-            if lc[0] != 'tags':
-                continue
+    if not tags:
+        tags = None
 
-            # Retrieve the tags
-            tmp = lc[1]
-            tmp = tmp.rstrip().lstrip()
-            tmp = tmp.rstrip(']')
-            tmp = tmp.lstrip('[')
-            tmp = tmp.split(', ')
+    if not aliases:
+        aliases = None
 
-        for tag in tmp:
-            tags.append({'name': tag})
+    return IResponse(SUCCESS, Page(name, text, tags, aliases))
 
-        return tags, end
 
-    def _parse_file(
+class BaseImporter():
+    """
+    The parsing, planning and manifest logic shared by the Importer and
+    the AsyncImporter.
+
+    Each import is written once, as steps yielding the requests they
+    need, see `Step`: the Importer sends them one after the other, the
+    AsyncImporter awaits them, see `Importer._run`.
+    """
+
+    _manifest: Optional[Manifest] = None
+    _index: Optional[RemoteIndex] = None
+    _stats: Optional[Stats] = None
+    _media: Optional[MediaUploader] = None
+    _links: Optional[LinkIndex] = None
+    _stream_threshold: Optional[int] = None
+    _split_size: Optional[int] = None
+    _ensure: bool = False
+    _limit: Optional[AdaptiveLimit] = None
+
+    def __init__(
         self,
-        content: List[str]
-    ) -> Tuple[str, str, List[Dict[str, str]]]:
+        wrapper: Any,
+        manifest: Optional[Manifest] = None,
+        index: Optional[RemoteIndex] = None,
+        stats: Optional[Stats] = None,
+        media: Optional[MediaCache] = None,
+        links: Optional[LinkIndex] = None,
+        stream_threshold: Optional[int] = None,
+        split_size: Optional[int] = None,
+        ensure: bool = False,
+        limit: Optional[AdaptiveLimit] = None
+    ):
+        """
+        :param wrapper:
+            The Bookstack, or AsyncBookstack, sending the requests.
+        :type wrapper: Any
         """
-        Parse the Markdown file to get the name from the title
-        and the tags from the front matter.
 
-        :param content:
-            The content of the Markdown file to parse.
-        :type content: List[str]
+        self._wrapper = wrapper
+        self._manifest = manifest
+        self._index = self._setup_ensure(ensure, index)
+        self._stats = stats
+        if media is not None:
+            self._media = MediaUploader(media)
+        self._links = links
+        self._stream_threshold = stream_threshold
+        self._split_size = split_size
+        self._limit = limit
 
-        :return:
-            The name of the page, taken from the title of the file
-            (H1 header).
-        :rtype: str
-        :return:
-            The rest of the text, without the H1 header.
-        :rtype: str
-        :return:
-            The tags found, if any.
-        :rtype: List[Dict[str, str]]
+    @property
+    def stream_threshold(self) -> Optional[int]:
+        """
+        The size from which files are streamed rather than read, None to
+        read them all, see read_page.
         """
-        tags, end = self._parse_front_matter(content)
-        start = 0 if (end == -1) else (end + 1)
+        return self._stream_threshold
 
-        text_start = -1
-        name = ""
-        for count, line in enumerate(content[start:]):
-            if line.startswith('# '):
-                name = line.rstrip()
-                name = name.lstrip('# ')
-            if line.startswith('## ') and text_start == -1:
-                text_start = count + start
-                break
+    def _timer(
+        self,
+        stage: str,
+        path: Optional[Path] = None
+    ) -> ContextManager[None]:
+        """
+        Time a stage if stats are collected, see Stats.timer.
+        """
 
-        text = ''.join(content[text_start:])
+        if self._stats is None:
+            return nullcontext()
+        return self._stats.timer(stage, path)
 
-        return name, text, tags
+    def _timings(self) -> Optional[Dict[str, float]]:
+        """
+        Get a dictionary for read_page to fill, if stats are collected.
+        """
+        return None if self._stats is None else dict()
 
-    def import_page(
+    def record_timings(
+        self,
+        path: Path,
+        timings: Optional[Dict[str, float]]
+    ) -> None:
+        """
+        Record the stages timed by read_page, if stats are collected.
+
+        :param path:
+            The path to the file.
+        :type path: Path
+        :param timings:
+            The time spent in each stage, in seconds.
+        :type timings: Optional[Dict[str, float]]
+        """
+
+        if self._stats is None or not timings:
+            return
+
+        for stage, seconds in timings.items():
+            self._stats.record_stage(stage, seconds, path)
+
+    def unchanged_page(
         self,
         file_path: Path,
         book_id: Optional[int] = -1,
         chapter_id: Optional[int] = -1
-    ) -> IResponse:
+    ) -> Optional[str]:
         """
-        Parse a Markdown file and import it as a page.
+        Check the manifest for a page already imported to the same book or
+        chapter and unchanged since.
 
         :param file_path:
             The path to the file to import.
         :type file_path: Path
-
         :param book_id:
             The ID of the book the page will be attached to.
-            Required without `chapter_id`.
         :type book_id: Optional[int]
         :param chapter_id:
             The ID of the chapter the page will be attached to.
-            Required without `book_id`.
         :type chapter_id: Optional[int]
 
         :return:
-            An error code.
-        :rtype: int
-        :return:
-            The name of the page if successful, the error message otherwise.
-        :rtype: str
+            The name of the page if it is unchanged, None otherwise.
+        :rtype: Optional[str]
         """
 
-        try:
-            with file_path.open('r') as file:
-                content = file.readlines()
-        except OSError:
-            return IResponse(FILE_READ_ERROR, "")
+        if self._manifest is None:
+            return None
 
-        if len(content) == 0:
-            return IResponse(EMPTY_FILE_ERROR, "")
+        with self._timer(CHECK, file_path):
+            entry, changed = self._manifest.page_state(
+                file_path, _parent(book_id, chapter_id)
+            )
 
-        name, text, tags = self._parse_file(content)
+        if entry is None or changed:
+            return None
 
-        if not name:
-            name = file_path.stem
+        return entry['name']
 
-        if not tags:
-            tags = None
+    def _find_media(
+        self,
+        file_path: Path,
+        text: str,
+        chapter_id: Optional[int] = -1
+    ) -> List[Media]:
+        """
+        Find the files embedded in a page, if media are uploaded.
 
-        if book_id != -1:
-            error, msg = self._wrapper.create_page(
-                name, text, tags, book_id=book_id
-            )
-        else:
-            error, msg = self._wrapper.create_page(
-                name, text, tags, chapter_id=chapter_id
-            )
+        Embeds are resolved within the directory imported as the book,
+        i.e. the page's directory, or its parent for a chapter's page.
+        """
 
-        if error:
-            return IResponse(error, msg)
-        else:
-            return IResponse(SUCCESS, name)
+        if self._media is None or isinstance(text, TextRange):
+            return []
 
-    def import_chapter(
+        root = file_path.parent
+        if chapter_id != -1:
+            root = root.parent
+
+        return self._media.find(file_path, text, root)
+
+    def media_stats(self) -> Optional[Dict[str, int]]:
+        """
+        Get the number of embedded files uploaded, reused and failed, None
+        if media aren't uploaded.
+        """
+        return None if self._media is None else self._media.stats()
+
+    def limit_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of the concurrency limit of the page uploads, None
+        if it isn't adaptive, see AdaptiveLimit.stats.
+        """
+        return None if self._limit is None else self._limit.stats()
+
+    def _loaded(
         self,
-        path: Path,
-        book_id: int
-    ) -> IResponse:
+        text: Union[str, TextRange]
+    ) -> Union[str, TextRange]:
         """
-        Create a chapter from the directory's name.
+        Read the text of a large file in memory if it may have embeds or
+        wikilinks to rewrite, since they can't be rewritten as it streams.
 
-        :param path:
-            The path to the directory.
-        :type path: Path
-        :param book_id:
-            The ID of the book the chapter belongs to.
-        :type book_id: int
+        :raises OSError:
+            If the file can't be read.
+        :raises UnicodeDecodeError:
+            If the text isn't in the encoding of the file.
+        """
+
+        if not isinstance(text, TextRange):
+            return text
+
+        needles = list()
+        if self._media is not None:
+            needles.append(b'![')
+        if self._links is not None:
+            needles.append(b'[[')
+
+        if needles and parser.contains(text, *needles):
+            return parser.read_text(text)
+
+        return text
+
+    def _rewrite(
+        self,
+        file_path: Path,
+        source: Union[str, TextRange],
+        media: List[Media],
+        urls: Dict[str, str]
+    ) -> Tuple[Union[str, TextRange], int]:
+        """
+        Point the embeds and wikilinks of a text to their files and pages,
+        see rewrite and `_link`. The text of a large file is left as is,
+        see `_loaded`.
+        """
+
+        if isinstance(source, TextRange):
+            return source, 0
+
+        return self._link(file_path, rewrite(source, media, urls))
+
+    def _split(
+        self,
+        text: Union[str, TextRange]
+    ) -> List[Union[str, TextRange]]:
+        """
+        Split a text larger than the split size at its headings, if large
+        pages are split, see parser.split_points.
 
         :return:
-            An error code.
-        :rtype: int
-        :return:
-            The chapter's ID if successful, the error message otherwise.
-        :rtype: Union[int, str]
+            The parts of the text, the text alone if it isn't split.
+        :rtype: List[Union[str, TextRange]]
         """
 
-        name = path.stem
+        if self._split_size is None:
+            return [text]
 
-        # description = None
-        # tags = None
+        if isinstance(text, str):
+            if len(text) <= self._split_size:
+                return [text]
+            starts = parser.split_points(text, self._split_size)
+            ends = starts[1:] + [len(text)]
+            return [text[start:end] for start, end in zip(starts, ends)]
 
-        error, data = self._wrapper.create_chapter(book_id, name)
+        if text.size <= self._split_size:
+            return [text]
 
-        if error:
-            return IResponse(error, data)
-        else:
-            chapter_id = data
-            return IResponse(SUCCESS, chapter_id)
+        return list(parser.split_range(text, self._split_size))
 
-    def import_book(
+    def _link(self, file_path: Path, text: str) -> Tuple[str, int]:
+        """
+        Point the wikilinks of a text to their pages, if links are
+        resolved, see LinkIndex.rewrite.
+        """
+
+        if self._links is None:
+            return text, 0
+
+        return self._links.rewrite(
+            text, self._wrapper.page_url, file_path
+        )
+
+    def _linked(
         self,
-        path: Path
-    ) -> IResponse:
+        file_path: Path,
+        page_id: int,
+        page: Page,
+        unresolved: int,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> None:
+        """
+        Index a page sent, deferring it if some of its links weren't
+        resolved, if links are resolved.
         """
-        Create a book from the directory's name.
 
-        :param path:
-            The path to the directory.
-        :type path: Path
+        if self._links is None:
+            return
+
+        self._links.add(file_path, page_id, page.aliases)
+        self._links.defer(file_path, unresolved, book_id, chapter_id)
+
+    def pending_links(self) -> List[Tuple[Path, int, int]]:
+        """
+        Get the pages sent with links to pages that didn't exist yet.
+
+        :return:
+            The path, book ID and chapter ID of each page.
+        :rtype: List[Tuple[Path, int, int]]
+        """
+        return [] if self._links is None else self._links.pending()
+
+    def _relink(
+        self,
+        file_path: Path,
+        chapter_id: Optional[int] = -1
+    ) -> IResponse:
+        """
+        Read a deferred page again and resolve its links, see `link_page`.
 
         :return:
             An error code.
         :rtype: int
         :return:
-            The book's ID if successful, the error message otherwise.
-        :rtype: Union[int, str]
+            The ID of the page, the page, its text and the number of links
+            left unresolved, if more links are resolved than when it was
+            sent. None if not, the error message otherwise.
+        :rtype: Union[Tuple[int, Page, str, int], None, str]
         """
 
-        name = path.stem
-
-        # description = None
-        # tags = None
+        before = self._links.unresolved(file_path)
 
-        error, data = self._wrapper.create_book(name)
+        timings = self._timings()
+        error, page = read_page(file_path, timings)
+        self.record_timings(file_path, timings)
 
         if error:
-            return IResponse(error, data)
-        else:
-            book_id = data
-            return IResponse(SUCCESS, book_id)
+            return IResponse(error, page)
+
+        media = self._find_media(file_path, page.text, chapter_id)
+        urls = self._media.known(media) if media else dict()
+        text, unresolved = self._rewrite(file_path, page.text, media, urls)
+
+        if unresolved >= before:
+            return IResponse(SUCCESS, None)
+
+        return IResponse(
+            SUCCESS, (self._links.page_id(file_path), page, text, unresolved)
+        )
 
-    def list_books(self) -> IResponse:
+    def _known_id(self, path: Path, kind: str, parent: str = "") -> int:
+        """
+        Get the ID `path` was imported as, -1 if unknown.
         """
-        Get the list of all accessible books.
+
+        if self._manifest is None:
+            return -1
+
+        return self._manifest.get_id(path, kind, parent)
+
+    def _plan(self, path: Path, kind: str) -> None:
+        """
+        Log that `path` is about to be created as a new `kind`, if the
+        manifest is journaled, see Manifest.plan.
+        """
+
+        if self._manifest is not None:
+            self._manifest.plan(path, kind)
+
+    def _index_add(self, kind: str, id: int, name: str, **fields: Any):
+        """
+        Write a created or updated item through to the index, if any.
+        """
+
+        if self._index is not None:
+            self._index.add(kind, dict(fields, id=id, name=name))
+
+    def _index_remove(self, kind: str, id: int, *pages: int):
+        """
+        Write a deleted item, and the pages deleted with it, through to
+        the index, if any.
+        """
+
+        if self._index is not None:
+            self._index.remove(kind, id)
+            for page_id in pages:
+                self._index.remove(PAGES, page_id)
+
+    def _setup_ensure(
+        self,
+        ensure: bool,
+        index: Optional[RemoteIndex]
+    ) -> Optional[RemoteIndex]:
+        """
+        Set up the ensure mode, see `_needs_lookup`.
 
         :return:
-            An error code.
-        :rtype: int
-        :return:
-            If successful, a dictionnary of books with the book's ID
-            as key and the book's name as value, the error message otherwise.
-        :rtype: Union[Dict[int, str], str]
+            The index names are looked up in: `index`, or an index kept in
+            memory if there is none and `ensure` is set.
+        :rtype: Optional[RemoteIndex]
+        """
+
+        self._ensure = ensure
+        # The kinds listed in the index by this run.
+        self._listed: Set[str] = set()
+        # The books created by this run, whose chapters can't exist yet.
+        self._new_books: Set[int] = set()
+
+        if ensure and index is None:
+            return RemoteIndex()
+        return index
+
+    def _needs_lookup(self, kind: str, book_id: int = -1) -> bool:
+        """
+        Whether to look for an existing book or chapter of the same name
+        before creating one: in ensure mode, an interrupted import run again
+        reuses the books and chapters it created instead of duplicating
+        them.
+        """
+
+        if not self._ensure:
+            return False
+        return kind == BOOKS or book_id not in self._new_books
+
+    def _known_page(self, path: Path) -> Tuple[int, str]:
+        """
+        Get the ID and parent `path` was imported as, -1 if unknown.
+        """
+
+        if self._manifest is None:
+            return -1, ""
+
+        entry = self._manifest.get(path)
+        if entry is None or entry['kind'] != PAGE:
+            return -1, ""
+
+        return entry['id'], entry['parent']
+
+    def _in_flight(self, path: Path, kind: str) -> bool:
         """
+        Whether `path` was being created as a new `kind` when the resumed
+        run stopped, so it is looked up before being created again, see
+        Manifest.in_flight.
+        """
+
+        if self._manifest is None or self._index is None:
+            return False
+
+        return self._manifest.in_flight(path, kind)
+
+    def _known_parts(self, path: Path) -> Optional[Parts]:
+        """
+        Get the pages `path` was split into, None if it wasn't.
+        """
+
+        if self._manifest is None:
+            return None
+
+        entry = self._manifest.get(path)
+        if entry is None or 'parts' not in entry:
+            return None
+
+        return Parts(list(entry['parts']), entry.get('chapter', -1))
+
+    def _record(
+        self,
+        path: Path,
+        kind: str,
+        id: int,
+        parent: str = "",
+        name: str = "",
+        stale: bool = False,
+        aliases: Optional[List[str]] = None,
+        unresolved: int = 0,
+        parts: Optional[Parts] = None
+    ) -> None:
+        """
+        Record a successful import in the manifest, if any.
+        """
+
+        if self._manifest is None:
+            return
+
+        # A page split in a single part is recorded as a plain page.
+        if parts is not None and len(parts.ids) < 2 and parts.chapter == -1:
+            parts = None
 
-        error, data = self._wrapper.list_books()
+        try:
+            self._manifest.record(
+                path, kind, id, parent, name, stale=stale, aliases=aliases,
+                unresolved=unresolved,
+                parts=None if parts is None else parts.ids,
+                chapter=-1 if parts is None else parts.chapter
+            )
+        except OSError:
+            # The file vanished, it will be imported again next time.
+            pass
+
+    def _import_page(
+        self,
+        file_path: Path,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> Steps:
+        """
+        The steps of `Importer.import_page`, see `_run`.
+        """
+
+        timings = self._timings()
+        error, page = read_page(
+            file_path, timings, self._stream_threshold
+        )
+        self.record_timings(file_path, timings)
 
         if error:
-            return IResponse(error, data)
+            return IResponse(error, page)
 
-        books = dict()
-        for book in data:
-            books[book['id']] = book['name']
+        return (
+            yield from self._upload_page(file_path, page, book_id, chapter_id)
+        )
+
+    def _upload_page(
+        self,
+        file_path: Path,
+        page: Page,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> Steps:
+        """
+        The steps of `Importer.upload_page`, see `_run`.
+        """
+
+        name, source, tags, aliases = page
+
+        with self._timer(UPLOAD, file_path):
+
+            try:
+                source = self._loaded(source)
+            except (OSError, UnicodeDecodeError) as e:
+                return IResponse(FILE_READ_ERROR, str(e))
+
+            parent = _parent(book_id, chapter_id)
+            page_id, known_parent = self._known_page(file_path)
+
+            if page_id == -1 and self._in_flight(file_path, PAGE):
+                error, data = yield _step(
+                    STEP_LOOKUP, PAGES, name,
+                    **_page_fields(book_id, chapter_id)
+                )
+                if error:
+                    return IResponse(error, data)
+                if data != -1:
+                    page_id, known_parent = data, parent
+
+            media = self._find_media(file_path, source, chapter_id)
+            urls: Dict[str, str] = dict()
+            if media and page_id != -1:
+                urls = yield _step(STEP_MEDIA, media, page_id)
+            elif media:
+                urls = self._media.known(media)
+            text, unresolved = self._rewrite(file_path, source, media, urls)
+
+            try:
+                parts = self._split(text)
+            except OSError as e:
+                return IResponse(FILE_READ_ERROR, str(e))
+
+            if len(parts) > 1 or self._known_parts(file_path) is not None:
+                return (yield from self._upload_parts(
+                    file_path, page, source, parts, media, urls, unresolved,
+                    book_id, chapter_id
+                ))
+
+            if page_id == -1:
+                yield _step(STEP_PLAN, file_path, PAGE)
+
+            if page_id != -1 and known_parent == parent:
+                error, data = yield _step(
+                    'update_page', page_id, name, text, tags
+                )
+            elif page_id != -1:
+                # Moved to another book or chapter.
+                error, data = yield _step(
+                    'update_page', page_id, name, text, tags,
+                    book_id=book_id, chapter_id=chapter_id
+                )
+            elif book_id != -1:
+                error, data = yield _step(
+                    'create_page', name, text, tags, book_id=book_id
+                )
+            else:
+                error, data = yield _step(
+                    'create_page', name, text, tags, chapter_id=chapter_id
+                )
+
+            if error:
+                return IResponse(error, data)
+
+            if any(item.digest not in urls for item in media) and \
+                    page_id == -1:
+                urls = yield _step(STEP_MEDIA, media, data)
+                text, unresolved = self._rewrite(
+                    file_path, source, media, urls
+                )
+                error, message = yield _step(
+                    'update_page', data, name, text, tags
+                )
+                if error:
+                    self._record(
+                        file_path, PAGE, data, parent, name, True, aliases
+                    )
+                    return IResponse(error, message)
+
+            # Pages whose files couldn't all be uploaded are sent again.
+            stale = any(item.digest not in urls for item in media)
+
+            self._record(
+                file_path, PAGE, data, parent, name, stale, aliases,
+                unresolved
+            )
+            self._index_add(
+                PAGES, data, name, book_id=book_id, chapter_id=chapter_id
+            )
+            self._linked(
+                file_path, data, page, unresolved, book_id, chapter_id
+            )
+            return IResponse(SUCCESS, name)
+
+    def _link_page(
+        self,
+        file_path: Path,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> Steps:
+        """
+        The steps of `Importer.link_page`, see `_run`.
+        """
+
+        with self._timer(LINK, file_path):
+
+            error, data = self._relink(file_path, chapter_id)
+
+            if error or data is None:
+                return IResponse(error, data)
+
+            page_id, page, text, unresolved = data
+
+            known = self._known_parts(file_path)
+            if known is not None:
+                return (yield from self._link_parts(
+                    file_path, page, text, unresolved, known, book_id,
+                    chapter_id
+                ))
+
+            error, message = yield _step(
+                'update_page', page_id, page.name, text, page.tags
+            )
+
+            if error:
+                # Sent again, and linked, by the next import.
+                self._record(
+                    file_path, PAGE, page_id, _parent(book_id, chapter_id),
+                    page.name, True, page.aliases
+                )
+                return IResponse(error, message)
+
+            if self._manifest is not None:
+                self._manifest.set_unresolved(file_path, unresolved)
+
+            return IResponse(SUCCESS, page.name)
+
+    def _upload_parts(
+        self,
+        file_path: Path,
+        page: Page,
+        source: Union[str, TextRange],
+        parts: List[Union[str, TextRange]],
+        media: List[Media],
+        urls: Dict[str, str],
+        unresolved: int,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> Steps:
+        """
+        Import a page split in parts, or that was, see `_upload_page`.
+
+        The parts are numbered pages of a chapter: the chapter of the file,
+        or a chapter named after it, created for them in its book.
+        """
+
+        name, _, tags, aliases = page
+        parent = _parent(book_id, chapter_id)
+        page_id, known_parent = self._known_page(file_path)
+        known = self._known_parts(file_path)
+
+        if known is not None and known_parent != parent:
+            # Moved: the parts are created again where the file is now.
+            error, data = yield from self._delete_parts(known)
+            if error:
+                return IResponse(error, data)
+            self._manifest.forget(file_path)
+            known, page_id = None, -1
+        elif known is None and page_id != -1:
+            # Grown past the split size, the page becomes the first part.
+            known = Parts([page_id])
+        elif known is None and self._in_flight(file_path, PAGE):
+            response, known = yield from self._find_parts(
+                name, len(parts), book_id, chapter_id
+            )
+            if response.error:
+                return response
+
+        if known is None or len(known.ids) < len(parts):
+            yield _step(STEP_PLAN, file_path, PAGE)
+
+        response, state = yield from self._send_parts(
+            name, parts, tags, book_id, chapter_id, known
+        )
+
+        if not response.error and page_id == -1 and \
+                any(item.digest not in urls for item in media):
+            urls = yield _step(STEP_MEDIA, media, state.ids[0])
+            text, unresolved = self._rewrite(file_path, source, media, urls)
+            response, state = yield from self._send_parts(
+                name, self._split(text), tags, book_id, chapter_id, state
+            )
+
+        # Pages whose files couldn't all be uploaded are sent again.
+        stale = bool(response.error) or \
+            any(item.digest not in urls for item in media)
+
+        if state.ids or state.chapter != -1:
+            self._record(
+                file_path, PAGE, state.ids[0] if state.ids else -1, parent,
+                name, stale, aliases, unresolved, state
+            )
+
+        if response.error:
+            return response
+
+        self._linked(
+            file_path, state.ids[0], page, unresolved, book_id, chapter_id
+        )
+        return IResponse(SUCCESS, name)
+
+    def _link_parts(
+        self,
+        file_path: Path,
+        page: Page,
+        text: str,
+        unresolved: int,
+        known: Parts,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> Steps:
+        """
+        Send again the parts of a page whose links are now resolved, see
+        `_link_page`.
+        """
+
+        response, state = yield from self._send_parts(
+            page.name, self._split(text), page.tags, book_id, chapter_id,
+            known
+        )
+
+        self._record(
+            file_path, PAGE, state.ids[0] if state.ids else -1,
+            _parent(book_id, chapter_id), page.name, bool(response.error),
+            page.aliases, unresolved, state
+        )
+
+        if response.error:
+            return response
+
+        return IResponse(SUCCESS, page.name)
+
+    def _send_parts(
+        self,
+        name: str,
+        parts: List[Union[str, TextRange]],
+        tags: Optional[List[Dict[str, str]]],
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1,
+        known: Optional[Parts] = None
+    ) -> Generator[Step, Any, Tuple[IResponse, Parts]]:
+        """
+        Create or update the pages of the parts of a page, and delete those
+        left over from a previous split.
+
+        A single part is a plain page again, in the book or chapter of
+        the file, and the chapter created for the parts is deleted.
+
+        :param name:
+            The name of the page.
+        :type name: str
+        :param parts:
+            The text of each part, in order.
+        :type parts: List[Union[str, TextRange]]
+        :param tags:
+            The tags of the page, given to every part.
+        :type tags: Optional[List[Dict[str, str]]]
+        :param book_id:
+            The ID of the book of the file.
+        :type book_id: Optional[int]
+        :param chapter_id:
+            The ID of the chapter of the file.
+        :type chapter_id: Optional[int]
+        :param known:
+            The pages of the previous split, if any.
+        :type known: Optional[Parts]
+
+        :return:
+            An error code, and the ID of the first page if successful, the
+            error message otherwise.
+        :rtype: IResponse
+        :return:
+            The pages that exist, even if it failed.
+        :rtype: Parts
+        """
+
+        ids = [] if known is None else list(known.ids)
+        chapter = -1 if known is None else known.chapter
+
+        if len(parts) == 1:
+            names = [name]
+            target = {'book_id': book_id, 'chapter_id': chapter_id}
+        else:
+            names = [
+                _part_name(name, number)
+                for number in range(1, len(parts) + 1)
+            ]
+            if chapter_id == -1 and chapter == -1:
+                error, data = yield _step('create_chapter', book_id, name)
+                if error:
+                    return IResponse(error, data), Parts(ids, chapter)
+                chapter = data
+                self._index_add(CHAPTERS, chapter, name, book_id=book_id)
+            # Only the chapter, the book would take precedence.
+            target = {'chapter_id': chapter_id if chapter_id != -1
+                      else chapter}
+
+        for number, (part_name, text) in enumerate(zip(names, parts)):
+            if number < len(ids):
+                error, data = yield _step(
+                    'update_page', ids[number], part_name, text, tags,
+                    **target
+                )
+            else:
+                error, data = yield _step(
+                    'create_page', part_name, text, tags, **target
+                )
+            if error:
+                return IResponse(error, data), Parts(ids, chapter)
+            if number == len(ids):
+                ids.append(data)
+            self._index_add(
+                PAGES, data, part_name, book_id=book_id,
+                chapter_id=target['chapter_id']
+            )
+
+        if len(parts) == 1 and chapter != -1:
+            # The other parts go with it.
+            error, data = yield _step('delete_chapter', chapter)
+            if error:
+                return IResponse(error, data), Parts(ids, chapter)
+            self._index_remove(CHAPTERS, chapter, *ids[1:])
+            chapter, ids = -1, ids[:1]
+
+        while len(ids) > len(parts):
+            error, data = yield _step('delete_page', ids[-1])
+            if error:
+                return IResponse(error, data), Parts(ids, chapter)
+            self._index_remove(PAGES, ids.pop())
+
+        return IResponse(SUCCESS, ids[0]), Parts(ids, chapter)
+
+    def _find_parts(
+        self,
+        name: str,
+        count: int,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> Generator[Step, Any, Tuple[IResponse, Optional[Parts]]]:
+        """
+        Look up the parts of a split page the resumed run was creating, by
+        name, see `_send_parts`.
+
+        :param name:
+            The name of the page.
+        :type name: str
+        :param count:
+            The number of parts.
+        :type count: int
+        :param book_id:
+            The ID of the book of the file.
+        :type book_id: Optional[int]
+        :param chapter_id:
+            The ID of the chapter of the file.
+        :type chapter_id: Optional[int]
+
+        :return:
+            An error code, and the error message if it failed.
+        :rtype: IResponse
+        :return:
+            The pages and chapter found, None if there are none.
+        :rtype: Optional[Parts]
+        """
+
+        chapter = -1
+        target = chapter_id
+        if chapter_id == -1:
+            error, data = yield _step(
+                STEP_LOOKUP, CHAPTERS, name, book_id=book_id
+            )
+            if error or data == -1:
+                return IResponse(error, data), None
+            chapter = target = data
+
+        ids: List[int] = list()
+        for number in range(1, count + 1):
+            error, data = yield _step(
+                STEP_LOOKUP, PAGES, _part_name(name, number),
+                chapter_id=target
+            )
+            if error:
+                return IResponse(error, data), None
+            if data == -1:
+                break
+            ids.append(data)
+
+        if not ids and chapter == -1:
+            return IResponse(SUCCESS, None), None
+        return IResponse(SUCCESS, None), Parts(ids, chapter)
+
+    def _delete_parts(self, known: Parts) -> Steps:
+        """
+        Delete the pages of a split page, with the chapter created for
+        them if any.
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            None if successful, the error message otherwise.
+        :rtype: Optional[str]
+        """
+
+        if known.chapter != -1:
+            error, data = yield _step('delete_chapter', known.chapter)
+            if error:
+                return IResponse(error, data)
+            self._index_remove(CHAPTERS, known.chapter, *known.ids)
+            return IResponse(SUCCESS, None)
+
+        for page_id in known.ids:
+            error, data = yield _step('delete_page', page_id)
+            if error:
+                return IResponse(error, data)
+            self._index_remove(PAGES, page_id)
+
+        return IResponse(SUCCESS, None)
+
+    def _import_chapter(self, path: Path, book_id: int) -> Steps:
+        """
+        The steps of `Importer.import_chapter`, see `_run`.
+        """
+
+        name = path.stem
+        parent = _parent(book_id)
+
+        chapter_id = self._known_id(path, CHAPTER, parent)
+        if chapter_id != -1:
+            return IResponse(SUCCESS, chapter_id)
+
+        if self._needs_lookup(CHAPTERS, book_id):
+            error, data = yield _step(
+                STEP_LOOKUP, CHAPTERS, name, book_id=book_id
+            )
+            if error:
+                return IResponse(error, data)
+            if data != -1:
+                self._record(path, CHAPTER, data, parent)
+                return IResponse(SUCCESS, data)
+
+        # description = None
+        # tags = None
+
+        yield _step(STEP_PLAN, path, CHAPTER)
+        error, data = yield _step('create_chapter', book_id, name)
+
+        if error:
+            return IResponse(error, data)
+        else:
+            chapter_id = data
+            self._record(path, CHAPTER, chapter_id, parent)
+            self._index_add(CHAPTERS, chapter_id, name, book_id=book_id)
+            return IResponse(SUCCESS, chapter_id)
+
+    def _import_book(self, path: Path) -> Steps:
+        """
+        The steps of `Importer.import_book`, see `_run`.
+        """
+
+        name = path.stem
+
+        book_id = self._known_id(path, BOOK)
+        if book_id != -1:
+            return IResponse(SUCCESS, book_id)
+
+        if self._needs_lookup(BOOKS):
+            error, data = yield _step(STEP_LOOKUP, BOOKS, name)
+            if error:
+                return IResponse(error, data)
+            if data != -1:
+                self._record(path, BOOK, data)
+                return IResponse(SUCCESS, data)
+
+        # description = None
+        # tags = None
+
+        yield _step(STEP_PLAN, path, BOOK)
+        error, data = yield _step('create_book', name)
+
+        if error:
+            return IResponse(error, data)
+        else:
+            book_id = data
+            self._new_books.add(book_id)
+            self._record(path, BOOK, book_id)
+            self._index_add(BOOKS, book_id, name)
+            return IResponse(SUCCESS, book_id)
+
+    def _import_shelf(self, path: Path, books: List[int]) -> Steps:
+        """
+        The steps of `Importer.import_shelf`, see `_run`.
+        """
+
+        shelf_id = self._known_id(path, SHELF)
+
+        if shelf_id != -1:
+            error, data = yield _step('update_shelf', shelf_id, books)
+        else:
+            error, data = yield _step('create_shelf', path.stem, books=books)
+
+        if error:
+            return IResponse(error, data)
+
+        self._record(path, SHELF, data)
+        return IResponse(SUCCESS, data)
+
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        Get the connection reuse statistics of the wrapper.
+
+        :return:
+            The number of requests sent, connections opened and
+            connections reused.
+        :rtype: Dict[str, int]
+        """
+        return self._wrapper.connection_stats()
+
+    def retry_stats(self) -> Dict[str, float]:
+        """
+        Get the retry statistics of the wrapper.
+
+        :return:
+            The number of retried requests and the time spent waiting
+            between attempts, in seconds.
+        :rtype: Dict[str, float]
+        """
+        return self._wrapper.retry_stats()
+
+    def compression_stats(self) -> Dict[str, int]:
+        """
+        Get the compression statistics of the wrapper.
+
+        :return:
+            The number of request bodies sent gzipped, their size before
+            compression and the bytes saved, and whether the server
+            rejected compressed bodies.
+        :rtype: Dict[str, int]
+        """
+        return self._wrapper.compression_stats()
+
+
+class Importer(BaseImporter):
+    """
+    A class to add a layer between the CLI and the wrapper.
+    """
+
+    def __init__(
+        self,
+        id: str,
+        secret: str,
+        url: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        manifest: Optional[Manifest] = None,
+        index: Optional[RemoteIndex] = None,
+        stats: Optional[Stats] = None,
+        media: Optional[MediaCache] = None,
+        links: Optional[LinkIndex] = None,
+        compress_threshold: Optional[int] = None,
+        stream_threshold: Optional[int] = None,
+        split_size: Optional[int] = None,
+        ensure: bool = False,
+        limit: Optional[AdaptiveLimit] = None
+    ):
+        # A single wrapper, and so a single connection pool,
+        # is shared by every request of the run.
+        wrapper = Bookstack(
+            id, secret, url,
+            pool_size=pool_size,
+            retry=RetryPolicy(max_retries=max_retries),
+            stats=stats,
+            compress_threshold=compress_threshold,
+            limit=limit
+        )
+        super().__init__(
+            wrapper, manifest, index, stats, media, links, stream_threshold,
+            split_size, ensure, limit
+        )
+        self._lookup_lock = threading.Lock()
+
+    def close(self) -> None:
+        """
+        Close the wrapper's connections.
+        """
+        if self._media is not None:
+            self._media.close()
+        self._wrapper.close()
+
+    def _run(self, steps: Generator[Step, Any, T]) -> T:
+        """
+        Run the steps of an import, sending the requests they yield one
+        after the other and sending them back the responses.
+        """
+
+        response = None
+
+        while True:
+            try:
+                step = steps.send(response)
+            except StopIteration as stop:
+                return stop.value
+            response = self._take(step)
+
+    def _take(self, step: Step) -> Any:
+        """
+        Send the request of a step, see `_run`.
+        """
+
+        if step.action == STEP_MEDIA:
+            return self._media.upload(self._wrapper, *step.args)
+        if step.action == STEP_PLAN:
+            return self._plan(*step.args)
+        if step.action == STEP_LOOKUP:
+            return self._lookup(*step.args, **step.kwargs)
+
+        method = getattr(self._wrapper, step.action)
+        return method(*step.args, **step.kwargs)
+
+    def import_page(
+        self,
+        file_path: Path,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> IResponse:
+        """
+        Parse a Markdown file and import it as a page.
+
+        If the manifest knows the page, it is updated instead, and moved
+        if it was imported to another book or chapter.
+
+        :param file_path:
+            The path to the file to import.
+        :type file_path: Path
+
+        :param book_id:
+            The ID of the book the page will be attached to.
+            Required without `chapter_id`.
+        :type book_id: Optional[int]
+        :param chapter_id:
+            The ID of the chapter the page will be attached to.
+            Required without `book_id`.
+        :type chapter_id: Optional[int]
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The name of the page if successful, the error message otherwise.
+        :rtype: str
+        """
+
+        return self._run(self._import_page(file_path, book_id, chapter_id))
+
+    def upload_page(
+        self,
+        file_path: Path,
+        page: Page,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> IResponse:
+        """
+        Import an already parsed Markdown file as a page.
+
+        See `import_page`, this is its network half.
+
+        The files it embeds are uploaded and the embeds pointed to them.
+        Files need a page to be uploaded to: an existing page gets them
+        before it is updated, a new page is created first and updated
+        once they are uploaded, unless they all were uploaded before.
+
+        Wikilinks to pages that exist are pointed to them, the page is
+        deferred if some point to pages that don't yet, see `link_page`.
+
+        :param file_path:
+            The path to the parsed file.
+        :type file_path: Path
+        :param page:
+            The parsed file.
+        :type page: Page
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The name of the page if successful, the error message otherwise.
+        :rtype: str
+        """
+
+        return self._run(
+            self._upload_page(file_path, page, book_id, chapter_id)
+        )
+
+    def link_page(
+        self,
+        file_path: Path,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> IResponse:
+        """
+        Send again a page whose wikilinks weren't all resolved when it was
+        imported, now that the pages they point to exist.
+
+        The file is read again rather than kept in memory until then, and
+        the page is only sent if more of its links are resolved.
+
+        :param file_path:
+            The path to the file, see `pending_links`.
+        :type file_path: Path
+        :param book_id:
+            The ID of the book holding the page.
+        :type book_id: Optional[int]
+        :param chapter_id:
+            The ID of the chapter holding the page.
+        :type chapter_id: Optional[int]
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The name of the page if it was sent, None if there was no need
+            to, the error message otherwise.
+        :rtype: Optional[str]
+        """
+
+        return self._run(self._link_page(file_path, book_id, chapter_id))
+
+    def import_chapter(
+        self,
+        path: Path,
+        book_id: int
+    ) -> IResponse:
+        """
+        Create a chapter from the directory's name, unless the manifest
+        knows it already.
+
+        :param path:
+            The path to the directory.
+        :type path: Path
+        :param book_id:
+            The ID of the book the chapter belongs to.
+        :type book_id: int
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The chapter's ID if successful, the error message otherwise.
+        :rtype: Union[int, str]
+        """
+
+        return self._run(self._import_chapter(path, book_id))
+
+    def import_book(
+        self,
+        path: Path
+    ) -> IResponse:
+        """
+        Create a book from the directory's name, unless the manifest
+        knows it already.
+
+        :param path:
+            The path to the directory.
+        :type path: Path
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The book's ID if successful, the error message otherwise.
+        :rtype: Union[int, str]
+        """
+
+        return self._run(self._import_book(path))
+
+    def _lookup(self, kind: str, name: str, **fields: Any) -> IResponse:
+        """
+        Find an existing book, chapter or page by name, see
+        `_needs_lookup` and `_in_flight`.
+
+        Every item of the kind is listed into the index the first time,
+        in one paginated fetch, and only looked up in the index after:
+        the items created by the run are written through.
+
+        :param kind:
+            BOOKS, CHAPTERS or PAGES.
+        :type kind: str
+        :param name:
+            The name of the item.
+        :type name: str
+        :param fields:
+            The other fields to match, e.g. `book_id` for a chapter.
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The ID of the item, -1 if there is none, the error message
+            otherwise.
+        :rtype: Union[int, str]
+        """
+
+        # Workers looking up chapters wait for the first one's listing.
+        with self._lookup_lock:
+            if kind not in self._listed:
+                error, items = self._wrapper.list_all(
+                    kind, count=500, prefetch=True
+                )
+                if error:
+                    return IResponse(error, items)
+                try:
+                    self._index.refresh(kind, items)
+                except RequestError as e:
+                    return IResponse(e.error, e.message)
+                self._listed.add(kind)
+
+        return IResponse(SUCCESS, self._index.find(kind, name, **fields))
+
+    def import_shelf(
+        self,
+        path: Path,
+        books: List[int]
+    ) -> IResponse:
+        """
+        Create a shelf from the directory's name holding `books`, or set
+        the books of the shelf if the manifest knows it already.
+
+        Either way a single request is sent, however many books there are.
+
+        :param path:
+            The path to the directory.
+        :type path: Path
+        :param books:
+            The IDs of the books on the shelf, in order.
+        :type books: List[int]
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The shelf's ID if successful, the error message otherwise.
+        :rtype: Union[int, str]
+        """
+
+        return self._run(self._import_shelf(path, books))
+
+    def rename_chapter(self, old: str, path: Path) -> IResponse:
+        """
+        Rename the chapter imported from the directory `old`, which has been
+        renamed to `path`.
+
+        :param old:
+            The previous resolved path of the directory.
+        :type old: str
+        :param path:
+            The new path of the directory.
+        :type path: Path
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The chapter's ID if successful, the error message otherwise.
+        :rtype: Union[int, str]
+        """
+
+        chapter_id = self._known_id(Path(old), CHAPTER, None)
+
+        error, data = self._wrapper.update_chapter(chapter_id, path.stem)
+
+        if error:
+            return IResponse(error, data)
+
+        self._manifest.move(old, path)
+        if self._index is not None:
+            self._index.invalidate(CHAPTERS)
+        return IResponse(SUCCESS, chapter_id)
+
+    def move_page(self, old: str, path: Path) -> None:
+        """
+        Record that the file `old` has been moved or renamed to `path`,
+        so that importing `path` updates the existing page.
+
+        :param old:
+            The previous resolved path of the file.
+        :type old: str
+        :param path:
+            The new path of the file.
+        :type path: Path
+        """
+        self._manifest.move(old, path)
+
+    def delete(self, old: str) -> IResponse:
+        """
+        Delete the chapter or page imported from a file or directory
+        that no longer exists.
+
+        :param old:
+            The resolved path of the source.
+        :type old: str
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The deleted item's ID if successful, the error message otherwise.
+        :rtype: Union[int, str]
+        """
+
+        entry = self._manifest.get(Path(old))
+
+        if 'parts' in entry:
+            error, data = self._run(self._delete_parts(
+                Parts(entry['parts'], entry.get('chapter', -1))
+            ))
+            if error:
+                return IResponse(error, data)
+            self._manifest.remove(old)
+            return IResponse(SUCCESS, entry['id'])
+
+        if entry['kind'] == CHAPTER:
+            error, data = self._wrapper.delete_chapter(entry['id'])
+        else:
+            error, data = self._wrapper.delete_page(entry['id'])
+
+        if error:
+            return IResponse(error, data)
+
+        self._manifest.remove(old)
+        kind = CHAPTERS if entry['kind'] == CHAPTER else PAGES
+        self._index_remove(kind, entry['id'])
+        return IResponse(SUCCESS, entry['id'])
+
+    def list_books(
+        self,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = True
+    ) -> IResponse:
+        """
+        Get the list of all accessible books.
+
+        The books are fetched lazily, `count` at a time, as the iterator
+        is consumed.
+
+        :param count:
+            The number of books per request.
+        :type count: int
+        :param prefetch:
+            Whether to fetch the next books while the current ones are
+            being consumed.
+        :type prefetch: bool
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            If successful, an iterator over the book's ID and name,
+            the error message otherwise. The iterator raises a RequestError
+            if fetching the next books fails.
+        :rtype: Union[Iterator[Tuple[int, str]], str]
+        """
+
+        if self._index is not None and self._index.fresh(BOOKS):
+            return IResponse(SUCCESS, self._index.items(BOOKS))
+
+        error, data = self._wrapper.list_books(count, prefetch)
+
+        if error:
+            return IResponse(error, data)
+
+        return IResponse(SUCCESS, self._iter_books(data))
+
+    def _iter_books(
+        self,
+        data: Iterator[Dict[str, Any]]
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Yield the ID and name of each book, refreshing the index once
+        every book has been seen.
+        """
+
+        books = list()
+
+        for book in data:
+            books.append(book)
+            yield book['id'], book['name']
+
+        if self._index is not None:
+            self._index.refresh(BOOKS, books)
+
+    def find_book(self, name: str) -> IResponse:
+        """
+        Resolve the name of a book to its ID, using the index if it is
+        fresh, fetching the list of books otherwise.
+
+        :param name:
+            The name of the book.
+        :type name: str
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The ID of the book, -1 if there is none with this name,
+            the error message otherwise.
+        :rtype: Union[int, str]
+        """
+
+        error, books = self.list_books(count=500)
+
+        if error:
+            return IResponse(error, books)
+
+        try:
+            for id, book_name in books:
+                # Without an index, stop at the first match. With one, go
+                # through every book so that the index is refreshed.
+                if self._index is None and book_name == name:
+                    return IResponse(SUCCESS, id)
+        except RequestError as e:
+            return IResponse(e.error, e.message)
+
+        if self._index is None:
+            return IResponse(SUCCESS, -1)
+
+        return IResponse(SUCCESS, self._index.find(BOOKS, name))
+
+    def list_chapters(
+        self,
+        book_id: int,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = True
+    ) -> IResponse:
+        """
+        Get the list of the chapters of a book, fetched lazily like
+        `list_books`.
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            If successful, an iterator over the chapters, as Bookstack lists
+            them, the error message otherwise. The iterator raises a
+            RequestError if fetching the next chapters fails.
+        :rtype: Union[Iterator[Dict[str, Any]], str]
+        """
+
+        error, data = self._wrapper.list_chapters(book_id, count, prefetch)
+        return IResponse(error, data)
+
+    def list_pages(
+        self,
+        book_id: int,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = True
+    ) -> IResponse:
+        """
+        Get the list of the pages of a book, without their content, see
+        `list_chapters`.
+        """
+
+        error, data = self._wrapper.list_pages(book_id, count, prefetch)
+        return IResponse(error, data)
+
+    def fetch_book(self, book_id: int) -> IResponse:
+        """
+        Get the name and description of a book, with the list of its
+        chapters and pages.
+
+        :param book_id:
+            The ID of the book.
+        :type book_id: int
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The book, as Bookstack sends it, if successful, the error
+            message otherwise.
+        :rtype: Union[Dict[str, Any], str]
+        """
+
+        error, data = self._wrapper.read_book(book_id)
+        return IResponse(error, data)
+
+    def fetch_page(self, page_id: int) -> IResponse:
+        """
+        Get the name, Markdown, HTML and tags of a page.
+
+        :param page_id:
+            The ID of the page.
+        :type page_id: int
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The page, as Bookstack sends it, if successful, the error
+            message otherwise.
+        :rtype: Union[Dict[str, Any], str]
+        """
+
+        error, data = self._wrapper.read_page(page_id)
+        return IResponse(error, data)
+
+
+class AsyncImporter(BaseImporter):
+    """
+    The asyncio counterpart of the Importer: the methods are coroutines
+    sharing a single AsyncBookstack and return the same IResponse.
+    """
+
+    def __init__(
+        self,
+        id: str,
+        secret: str,
+        url: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        manifest: Optional[Manifest] = None,
+        index: Optional[RemoteIndex] = None,
+        stats: Optional[Stats] = None,
+        media: Optional[MediaCache] = None,
+        links: Optional[LinkIndex] = None,
+        compress_threshold: Optional[int] = None,
+        stream_threshold: Optional[int] = None,
+        split_size: Optional[int] = None,
+        ensure: bool = False,
+        limit: Optional[AdaptiveLimit] = None
+    ):
+        # Imported here so that aiohttp is only loaded by async imports.
+        from bsimport.aiowrapper import AsyncBookstack
+
+        wrapper = AsyncBookstack(
+            id, secret, url,
+            pool_size=pool_size,
+            retry=RetryPolicy(max_retries=max_retries),
+            stats=stats,
+            compress_threshold=compress_threshold,
+            limit=limit
+        )
+        super().__init__(
+            wrapper, manifest, index, stats, media, links, stream_threshold,
+            split_size, ensure, limit
+        )
+        self._lookup_lock: Any = None
+
+    async def close(self) -> None:
+        """
+        Close the wrapper's connections.
+        """
+        await self._wrapper.close()
+
+    async def _run(self, steps: Generator[Step, Any, T]) -> T:
+        """
+        Run the steps of an import, awaiting the requests they yield one
+        after the other, see Importer._run.
+        """
+
+        response = None
+
+        while True:
+            try:
+                step = steps.send(response)
+            except StopIteration as stop:
+                return stop.value
+            response = await self._take(step)
+
+    async def _take(self, step: Step) -> Any:
+        """
+        Send the request of a step, see `_run`.
+        """
+
+        if step.action == STEP_MEDIA:
+            return await self._media.upload_async(self._wrapper, *step.args)
+        if step.action == STEP_PLAN:
+            return await self._plan_async(*step.args)
+        if step.action == STEP_LOOKUP:
+            return await self._lookup(*step.args, **step.kwargs)
+
+        method = getattr(self._wrapper, step.action)
+        return await method(*step.args, **step.kwargs)
+
+    async def _plan_async(self, path: Path, kind: str) -> None:
+        """
+        Log that `path` is about to be created, see BaseImporter._plan.
+
+        The journal waits for the record to be on disk, in another thread
+        so the other tasks go on meanwhile.
+        """
+
+        if self._manifest is None or not self._manifest.journaled:
+            return
+
+        import asyncio
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._plan, path, kind
+        )
+
+    async def import_page(
+        self,
+        file_path: Path,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> IResponse:
+        """
+        Parse a Markdown file and import it as a page.
+
+        See Importer.import_page.
+        """
+
+        return await self._run(
+            self._import_page(file_path, book_id, chapter_id)
+        )
+
+    async def upload_page(
+        self,
+        file_path: Path,
+        page: Page,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> IResponse:
+        """
+        Import an already parsed Markdown file as a page.
+
+        See Importer.upload_page.
+        """
+
+        return await self._run(
+            self._upload_page(file_path, page, book_id, chapter_id)
+        )
+
+    async def link_page(
+        self,
+        file_path: Path,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> IResponse:
+        """
+        Send again a page whose wikilinks weren't all resolved when it was
+        imported.
+
+        See Importer.link_page.
+        """
+
+        return await self._run(self._link_page(file_path, book_id, chapter_id))
+
+    async def import_chapter(self, path: Path, book_id: int) -> IResponse:
+        """
+        Create a chapter from the directory's name, unless the manifest
+        knows it already.
+
+        See Importer.import_chapter.
+        """
+
+        return await self._run(self._import_chapter(path, book_id))
+
+    async def import_book(self, path: Path) -> IResponse:
+        """
+        Create a book from the directory's name, unless the manifest
+        knows it already.
+
+        See Importer.import_book.
+        """
+
+        return await self._run(self._import_book(path))
+
+    async def _lookup(
+        self,
+        kind: str,
+        name: str,
+        **fields: Any
+    ) -> IResponse:
+        """
+        Find an existing book, chapter or page by name.
+
+        See Importer._lookup.
+        """
+
+        # Created on the event loop, which doesn't exist in __init__.
+        if self._lookup_lock is None:
+            import asyncio
+            self._lookup_lock = asyncio.Lock()
+
+        async with self._lookup_lock:
+            if kind not in self._listed:
+                error, items = await self._wrapper.list_all(
+                    kind, count=500, prefetch=True
+                )
+                if error:
+                    return IResponse(error, items)
+                try:
+                    self._index.refresh(kind, [item async for item in items])
+                except RequestError as e:
+                    return IResponse(e.error, e.message)
+                self._listed.add(kind)
+
+        return IResponse(SUCCESS, self._index.find(kind, name, **fields))
+
+    async def import_shelf(
+        self,
+        path: Path,
+        books: List[int]
+    ) -> IResponse:
+        """
+        Create a shelf from the directory's name holding `books`, or set
+        the books of the shelf if the manifest knows it already.
+
+        See Importer.import_shelf.
+        """
+
+        return await self._run(self._import_shelf(path, books))
+
+    async def list_books(
+        self,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = True
+    ) -> IResponse:
+        """
+        Get the list of all accessible books.
+
+        See Importer.list_books, the iterator is asynchronous.
+        """
+
+        error, data = await self._wrapper.list_books(count, prefetch)
+
+        if error:
+            return IResponse(error, data)
 
-        return IResponse(SUCCESS, books)
+        return IResponse(
+            SUCCESS, ((book['id'], book['name']) async for book in data)
+        )
@@ -0,0 +1,278 @@
+"""This module keeps a crash-safe journal of the imports in progress."""
+# bsimport/journal.py
+
+import json
+import os
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from bsimport import config
+
+
+JOURNAL_FILE_PATH = config.CONFIG_DIR_PATH / "journal.jsonl"
+
+# Operations of the journal.
+START = "start"
+PLAN = "plan"
+RECORD = "record"
+MOVE = "move"
+REMOVE = "remove"
+UNRESOLVED = "unresolved"
+
+# The records that must be on disk before the change they announce is
+# made: `append` waits for them to be synced, see `Journal`.
+WRITE_AHEAD = (START, PLAN)
+
+# The other records are written and synced to disk once this many are
+# waiting, or once the oldest has waited FLUSH_INTERVAL seconds, or with
+# the next write-ahead record: a sync costs a few milliseconds, once per
+# batch. A crash loses those still waiting, which only makes a resumed
+# run send again what they recorded.
+FLUSH_SIZE = 256
+FLUSH_INTERVAL = 0.2
+
+
+class Journal():
+    """
+    An append-only journal of the changes made to the manifest during a
+    run, and of the books, chapters and pages about to be created, so that
+    a run killed before saving the manifest can be resumed, see `replay`.
+
+    Records are JSON lines, appended by the workers: a background thread
+    writes them by batches and syncs the file to disk after each batch.
+    Appending a write-ahead record, e.g. PLAN before a page is created,
+    waits until it is synced, so a resumed run knows every item that may
+    exist; the workers waiting at the same time share a single sync.
+    Other records are appended without waiting.
+    """
+
+    def __init__(self, path: Path = JOURNAL_FILE_PATH):
+        self._path = path
+        self._file: Optional[Any] = None
+        self._condition = threading.Condition()
+        self._pending: List[str] = list()
+        self._oldest = 0.0
+        # The number of records appended, and of records synced to disk.
+        self._appended = 0
+        self._synced = 0
+        # The number of workers waiting for their record to be synced.
+        self._waiting = 0
+        self._closed = False
+        self._error: Optional[OSError] = None
+        self._thread = threading.Thread(
+            target=self._run, name="bsimport-journal", daemon=True
+        )
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def start(self, roots: List[Path], append: bool = False) -> 'Journal':
+        """
+        Open the journal and start writing it.
+
+        :param roots:
+            The files or directories imported by the run.
+        :type roots: List[Path]
+        :param append:
+            Whether to keep the records of the previous run, when resuming
+            it, rather than start a new journal.
+        :type append: bool
+
+        :raises OSError:
+            If the journal can't be created.
+
+        :return:
+            The journal.
+        :rtype: Journal
+        """
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self._path.open('a' if append else 'w', encoding='utf-8')
+        self._thread.start()
+        self.append(START, paths=[str(root.resolve()) for root in roots])
+        return self
+
+    def append(self, op: str, **fields: Any) -> None:
+        """
+        Add a record, written with the next batch. Write-ahead records are
+        written at once, and the call returns once they are on disk, or
+        once writing the journal failed.
+
+        :param op:
+            The operation, e.g. RECORD.
+        :type op: str
+        :param fields:
+            The fields of the record, serializable to JSON.
+        """
+
+        line = json.dumps(dict(fields, op=op)) + '\n'
+
+        with self._condition:
+            if self._closed:
+                return
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(line)
+            self._appended += 1
+
+            if op not in WRITE_AHEAD:
+                # The writer waits for the first record, then for the
+                # batch.
+                if len(self._pending) in (1, FLUSH_SIZE):
+                    self._condition.notify_all()
+                return
+
+            appended = self._appended
+            self._waiting += 1
+            self._condition.notify_all()
+            try:
+                while self._synced < appended and self._error is None \
+                        and self._thread.is_alive():
+                    self._condition.wait()
+            finally:
+                self._waiting -= 1
+
+    def _run(self) -> None:
+        """
+        Write the batches of records as they fill up or age, until closed.
+        """
+
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if len(self._pending) >= FLUSH_SIZE:
+                        break
+                    if self._pending and self._waiting:
+                        break
+                    if self._pending:
+                        wait = self._oldest + FLUSH_INTERVAL - time.monotonic()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._condition.wait(wait)
+                batch, self._pending = self._pending, list()
+                appended = self._appended
+                closed = self._closed
+
+            # The records appended while this batch is written go with the
+            # next one, along with the workers waiting for them.
+            if batch:
+                self._write(batch)
+
+            with self._condition:
+                self._synced = appended
+                self._condition.notify_all()
+
+            if closed:
+                return
+
+    def _write(self, batch: List[str]) -> None:
+        """
+        Write a batch of records and sync them to disk.
+        """
+
+        if self._error is not None:
+            return
+
+        try:
+            self._file.write(''.join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            # The run goes on without the journal, see `close`.
+            self._error = e
+
+    def close(self, complete: bool = False) -> Optional[OSError]:
+        """
+        Write the remaining records and close the journal.
+
+        :param complete:
+            Whether the records are safe in the saved manifest, in which
+            case the journal is deleted.
+        :type complete: bool
+
+        :return:
+            The error that stopped the journal from being written, if any.
+        :rtype: Optional[OSError]
+        """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        if self._thread.is_alive():
+            self._thread.join()
+        if self._file is not None:
+            self._file.close()
+
+        if complete and self._error is None:
+            try:
+                self._path.unlink()
+            except OSError:
+                pass
+
+        return self._error
+
+
+class Replay(NamedTuple):
+    """
+    Represents the journal left by an interrupted run.
+    Contains:
+    - The files or directories the run imported.
+    - The changes made to the manifest, in order, see Manifest.replay.
+    - The kind of the items that were about to be created when the run
+      stopped, by resolved path: they may exist without being recorded.
+    """
+    roots: List[str]
+    operations: List[Dict[str, Any]]
+    in_flight: Dict[str, str]
+
+
+def replay(path: Path = JOURNAL_FILE_PATH) -> Optional[Replay]:
+    """
+    Read the journal of an interrupted run.
+
+    A record cut by the crash, the last line, is ignored.
+
+    :param path:
+        The path to the journal.
+    :type path: Path
+
+    :return:
+        The content of the journal, None if there is none.
+    :rtype: Optional[Replay]
+    """
+
+    try:
+        with path.open('r', encoding='utf-8') as file:
+            lines = file.readlines()
+    except OSError:
+        return None
+
+    roots: List[str] = list()
+    operations: List[Dict[str, Any]] = list()
+    in_flight: Dict[str, str] = dict()
+
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+
+        op = record['op']
+
+        if op == START:
+            roots = roots or record['paths']
+        elif op == PLAN:
+            in_flight[record['path']] = record['kind']
+        else:
+            if op == RECORD:
+                in_flight.pop(record['path'], None)
+            operations.append(record)
+
+    return Replay(roots, operations, in_flight)
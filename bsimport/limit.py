@@ -0,0 +1,219 @@
+"""This module adapts the number of concurrent requests to the server."""
+# bsimport/limit.py
+
+import asyncio
+import threading
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from bsimport.stats import Stats
+
+
+# The limit is multiplied by BACKOFF when the server is overloaded.
+BACKOFF = 0.5
+
+# The latency spikes when its recent mean exceeds TOLERANCE times its
+# long-run mean. The means are exponential: a new sample weighs RECENT in
+# the first, LONG_RUN in the second, so a single slow request doesn't
+# count as a spike but a slowdown lasting a few requests does.
+TOLERANCE = 2.0
+RECENT = 0.2
+LONG_RUN = 0.02
+
+
+class AdaptiveLimit():
+    """
+    Limits the number of requests in flight, adapting the limit to how
+    the server keeps up (additive increase, multiplicative decrease).
+
+    The limit starts at `minimum` and grows by one per successful request,
+    doubling every round trip, until the server is first overloaded, then
+    by one per round trip. It is halved when a request is throttled or
+    fails with a server error, or when the latency spikes, at most once
+    per round trip: the requests already in flight when it is cut were
+    sent at the previous limit and don't cut it again.
+
+    A limit is shared by the threads of a wrapper, or by the tasks of a
+    single event loop, not both.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        minimum: int = 1,
+        stats: Optional[Stats] = None,
+        on_change: Optional[Callable[[int, int], Any]] = None
+    ):
+        """
+        :param maximum:
+            The highest limit, e.g. the number of workers.
+        :type maximum: int
+        :param minimum:
+            The lowest limit, and the first.
+        :type minimum: int
+        :param stats:
+            Records the changes of the limit, if provided.
+        :type stats: Optional[Stats]
+        :param on_change:
+            Called with the previous limit and the new one when it
+            changes, from the thread or task that changed it.
+        :type on_change: Optional[Callable[[int, int], Any]]
+        """
+
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self._stats = stats
+        self._on_change = on_change
+
+        self._condition = threading.Condition()
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._limit = float(minimum)
+        self._slow_start = True
+        self._in_flight = 0
+        # The requests sent before the last cut, still in flight.
+        self._hold = 0
+        self._recent: Optional[float] = None
+        self._long_run: Optional[float] = None
+        self._peak = minimum
+        self._decreases = 0
+
+        if stats is not None:
+            stats.record_limit(minimum)
+
+    @property
+    def limit(self) -> int:
+        """
+        The current number of requests allowed in flight.
+        """
+        return int(self._limit)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the state of the limit.
+
+        :return:
+            The current limit, the highest it reached, the number of
+            times it was cut and the long-run mean latency, in
+            milliseconds, None before the first request.
+        :rtype: Dict[str, Any]
+        """
+
+        with self._condition:
+            return {
+                'limit': int(self._limit),
+                'peak': self._peak,
+                'decreases': self._decreases,
+                'latency_ms': None if self._long_run is None
+                else self._long_run * 1000
+            }
+
+    def acquire(self) -> None:
+        """
+        Wait until a request can be sent, from a thread.
+        """
+
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    async def acquire_async(self) -> None:
+        """
+        Wait until a request can be sent, from a task. Tasks are let
+        through in the order they came.
+        """
+
+        with self._condition:
+            if not self._waiters and self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._condition:
+                if waiter.done() and not waiter.cancelled():
+                    # Let through just as it was cancelled.
+                    self._in_flight -= 1
+                    self._wake()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+    def release(self, seconds: Optional[float], overloaded: bool) -> None:
+        """
+        Free the slot of a request once answered, and adapt the limit.
+
+        :param seconds:
+            The time the request took, None if it failed without an answer.
+        :type seconds: Optional[float]
+        :param overloaded:
+            Whether the answer, or the lack of one, tells that the server
+            is overloaded, e.g. a 429 or a 503.
+        :type overloaded: bool
+        """
+
+        with self._condition:
+            self._in_flight -= 1
+            previous = int(self._limit)
+            self._update(seconds, overloaded)
+            current = int(self._limit)
+            self._peak = max(self._peak, current)
+            self._wake()
+
+        if current == previous:
+            return
+        if self._stats is not None:
+            self._stats.record_limit(current)
+        if self._on_change is not None:
+            self._on_change(previous, current)
+
+    def _update(self, seconds: Optional[float], overloaded: bool) -> None:
+        """
+        Adapt the limit to the outcome of a request, under the lock.
+        """
+
+        if self._hold:
+            self._hold -= 1
+
+        # Errors are often answered fast, they don't say how fast the
+        # server is.
+        if not overloaded and seconds is not None:
+            if self._recent is None or self._long_run is None:
+                self._recent = self._long_run = seconds
+            else:
+                self._recent += RECENT * (seconds - self._recent)
+                self._long_run += LONG_RUN * (seconds - self._long_run)
+            overloaded = self._recent > TOLERANCE * self._long_run
+
+        if overloaded:
+            if not self._hold:
+                self._limit = max(float(self.minimum), self._limit * BACKOFF)
+                self._slow_start = False
+                self._hold = self._in_flight
+                self._decreases += 1
+            return
+
+        if self._slow_start:
+            self._limit += 1
+        else:
+            self._limit += 1 / self._limit
+        self._limit = min(self._limit, float(self.maximum))
+
+    def _wake(self) -> None:
+        """
+        Let waiting requests through while the limit allows, under the
+        lock.
+        """
+
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+        self._condition.notify_all()
@@ -0,0 +1,404 @@
+"""This module resolves the wikilinks between pages."""
+# bsimport/links.py
+
+import os
+import re
+import threading
+
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from bsimport.manifest import PAGE, Manifest
+from bsimport.media import code_blocks
+
+
+# Obsidian's links, e.g. [[Other note]] or [[folder/Other note#Part|text]].
+# Embeds, starting with '!', are skipped by `find_links`: a lookbehind in
+# the pattern would keep the regex engine from searching for '[[' first,
+# which makes it several times slower.
+WIKILINK = re.compile(r'\[\[([^\[\]|#^]+)([#^][^\]|]*)?(?:\|([^\]]*))?\]\]')
+
+
+class Link(NamedTuple):
+    """
+    Represents a wikilink in a page.
+    Contains:
+    - The start and end of the link in the text.
+    - The note linked to, as written.
+    - The text of the link, as Obsidian shows it.
+    """
+    start: int
+    end: int
+    target: str
+    label: str
+
+
+def find_links(text: str) -> List[Link]:
+    """
+    Find the wikilinks of a Markdown text, outside code blocks.
+
+    :param text:
+        The Markdown text.
+    :type text: str
+
+    :return:
+        The links, in order.
+    :rtype: List[Link]
+    """
+
+    if '[[' not in text:
+        return []
+
+    links = list()
+
+    for match in WIKILINK.finditer(text):
+        start = match.start()
+        if start and text[start - 1] == '!':
+            continue
+        target, heading, label = match.groups()
+        target = target.strip()
+        name = target[:-3] if target.endswith('.md') else target
+        if label:
+            label = label.strip()
+        elif heading:
+            label = f"{name} > {heading[1:].strip()}"
+        else:
+            label = name
+        links.append(Link(start, match.end(), target, label))
+
+    if not links:
+        return links
+
+    blocks = code_blocks(text)
+
+    return [
+        link for link in links
+        if not any(start <= link.start < end for start, end in blocks)
+    ]
+
+
+def link_key(name: str) -> str:
+    """
+    Normalize the name of a note, as links are case insensitive and may
+    end with '.md'.
+
+    :param name:
+        The file name, path in the vault or alias of a note.
+    :type name: str
+
+    :return:
+        The key of the note in the index.
+    :rtype: str
+    """
+
+    key = name.strip().replace(os.sep, '/').casefold()
+    if key.endswith('.md'):
+        key = key[:-3]
+    return key
+
+
+class LinkIndex():
+    """
+    Maps the names a note can be linked by, i.e. its file name, its path
+    in the vault and its aliases, to the page it was imported as.
+
+    The index starts with the pages of previous imports, from the
+    manifest, and grows as pages are created. Resolving a link is then a
+    couple of dictionary lookups, however large the vault is.
+
+    Pages sent with links to pages that didn't exist yet are deferred:
+    once every page of the run exists they are read and sent again, see
+    `pending`. Pages whose links still point nowhere are deferred by the
+    next import too, so they are linked once the pages are created.
+
+    An index can hold several vaults, see `add_root`: links are resolved
+    within the vault of the note linking.
+    """
+
+    def __init__(self, root: Path):
+        # Paths are kept as the engine lists them, under the resolved root,
+        # resolving each one would cost more than resolving the links.
+        self._root = os.path.join(str(root.resolve()), "")
+        # The deepest first, so a path belongs to the nearest one.
+        self._roots: List[str] = [self._root]
+        self._lock = threading.Lock()
+        # root -> key -> path, by file name and by path in the vault.
+        self._names: Dict[str, Dict[str, str]] = {self._root: dict()}
+        # root -> key -> path, by alias, when no file has the name.
+        self._aliases: Dict[str, Dict[str, str]] = {self._root: dict()}
+        # path -> page ID
+        self._ids: Dict[str, int] = dict()
+        # path -> (book ID, chapter ID, unresolved links)
+        self._pending: Dict[str, Tuple[int, int, int]] = dict()
+
+    @classmethod
+    def build(
+        cls,
+        root: Path,
+        manifest: Optional[Manifest] = None
+    ) -> 'LinkIndex':
+        """
+        Index the pages imported from a directory.
+
+        :param root:
+            The directory imported, links are resolved within it.
+        :type root: Path
+        :param manifest:
+            The manifest of previous imports, if any.
+        :type manifest: Optional[Manifest]
+
+        :return:
+            The index.
+        :rtype: LinkIndex
+        """
+
+        index = cls(root)
+        index.add_root(root, manifest)
+
+        return index
+
+    def add_root(
+        self,
+        root: Path,
+        manifest: Optional[Manifest] = None
+    ) -> None:
+        """
+        Index the pages imported from another directory, whose notes link
+        to each other rather than to the notes of the other directories.
+
+        :param root:
+            The directory imported.
+        :type root: Path
+        :param manifest:
+            The manifest of previous imports, if any.
+        :type manifest: Optional[Manifest]
+        """
+
+        prefix = os.path.join(str(root.resolve()), "")
+
+        with self._lock:
+
+            if prefix not in self._names:
+                self._roots.append(prefix)
+                self._roots.sort(key=len, reverse=True)
+                self._names[prefix] = dict()
+                self._aliases[prefix] = dict()
+
+            if manifest is None:
+                return
+
+            for path, entry in manifest.under(root).items():
+
+                if entry['kind'] != PAGE:
+                    continue
+
+                self._add(path, entry['id'], entry.get('aliases', ()))
+
+                unresolved = entry.get('unresolved', 0)
+                if unresolved and os.path.exists(path):
+                    kind, parent = entry['parent'].split(':')
+                    ids = (int(parent), -1) if kind == 'book' \
+                        else (-1, int(parent))
+                    self._pending[path] = (*ids, unresolved)
+
+    def _root_of(self, path: str) -> str:
+        """
+        Get the directory a file was imported from, the first one if it
+        is in none.
+        """
+
+        for root in self._roots:
+            if path.startswith(root):
+                return root
+
+        return self._root
+
+    def _add(self, path: str, page_id: int, aliases: List[str]) -> None:
+        """
+        Index a page, see `add`. The lock must be held.
+        """
+
+        self._ids[path] = page_id
+
+        root = self._root_of(path)
+        relative = path[len(root):] \
+            if path.startswith(root) else os.path.basename(path)
+        names = (os.path.basename(relative), relative)
+
+        # The first path wins, so the same names always resolve to the
+        # same page, whatever the order pages are created in.
+        by_name = self._names[root]
+        for key in map(link_key, names):
+            known = by_name.get(key)
+            if known is None or path < known:
+                by_name[key] = path
+
+        by_alias = self._aliases[root]
+        for key in map(link_key, aliases):
+            known = by_alias.get(key)
+            if known is None or path < known:
+                by_alias[key] = path
+
+    def add(
+        self,
+        path: Path,
+        page_id: int,
+        aliases: Optional[List[str]] = None
+    ) -> None:
+        """
+        Index a page.
+
+        :param path:
+            The path to the Markdown file.
+        :type path: Path
+        :param page_id:
+            The ID of the page.
+        :type page_id: int
+        :param aliases:
+            The other names of the note, from its front matter.
+        :type aliases: Optional[List[str]]
+        """
+
+        with self._lock:
+            self._add(str(path), page_id, aliases or ())
+
+    def _resolve(self, target: str, root: str) -> Optional[int]:
+        """
+        Get the ID of the page a link from a note of `root` points to,
+        None if there is none. The lock must be held.
+        """
+
+        key = link_key(target)
+        by_name = self._names[root]
+        path = by_name.get(key) or self._aliases[root].get(key)
+
+        # A path Obsidian shortened, or relative to the linking note.
+        if path is None and '/' in key:
+            path = by_name.get(key.rsplit('/', 1)[1])
+
+        return None if path is None else self._ids.get(path)
+
+    def rewrite(
+        self,
+        text: str,
+        url: Callable[[int], str],
+        path: Optional[Path] = None
+    ) -> Tuple[str, int]:
+        """
+        Point the wikilinks of a text to the pages they name.
+
+        Links to notes without a page yet are left as they are.
+
+        :param text:
+            The Markdown text.
+        :type text: str
+        :param url:
+            Gives the URL of a page from its ID.
+        :type url: Callable[[int], str]
+        :param path:
+            The path to the note, whose directory the links are resolved
+            in, the first one if None.
+        :type path: Optional[Path]
+
+        :return:
+            The text.
+        :rtype: str
+        :return:
+            The number of links left as they are.
+        :rtype: int
+        """
+
+        links = find_links(text)
+        if not links:
+            return text, 0
+
+        parts = list()
+        position = 0
+        unresolved = 0
+
+        with self._lock:
+            root = self._root if path is None else self._root_of(str(path))
+            ids = [self._resolve(link.target, root) for link in links]
+
+        for link, page_id in zip(links, ids):
+            if page_id is None:
+                unresolved += 1
+                continue
+            parts.append(text[position:link.start])
+            parts.append(f"[{link.label}]({url(page_id)})")
+            position = link.end
+
+        parts.append(text[position:])
+
+        return "".join(parts), unresolved
+
+    def page_id(self, path: Path) -> int:
+        """
+        Get the ID of the page imported from a file, -1 if unknown.
+        """
+
+        with self._lock:
+            return self._ids.get(str(path), -1)
+
+    def defer(
+        self,
+        path: Path,
+        unresolved: int,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> None:
+        """
+        Remember a page sent with unresolved links, to send it again once
+        every page exists. A page sent with none isn't deferred anymore.
+
+        :param path:
+            The path to the Markdown file.
+        :type path: Path
+        :param unresolved:
+            The number of links left as they were.
+        :type unresolved: int
+        :param book_id:
+            The ID of the book holding the page.
+        :type book_id: Optional[int]
+        :param chapter_id:
+            The ID of the chapter holding the page.
+        :type chapter_id: Optional[int]
+        """
+
+        with self._lock:
+            if unresolved:
+                self._pending[str(path)] = (book_id, chapter_id, unresolved)
+            else:
+                self._pending.pop(str(path), None)
+
+    def pending(self) -> List[Tuple[Path, int, int]]:
+        """
+        Get the deferred pages.
+
+        :return:
+            The path, book ID and chapter ID of each page, in path order.
+        :rtype: List[Tuple[Path, int, int]]
+        """
+
+        with self._lock:
+            return [
+                (Path(path), book_id, chapter_id)
+                for path, (book_id, chapter_id, _) in sorted(
+                    self._pending.items()
+                )
+            ]
+
+    def unresolved(self, path: Path) -> int:
+        """
+        Stop deferring a page.
+
+        :return:
+            The number of links it was sent with unresolved, 0 if it
+            wasn't deferred.
+        :rtype: int
+        """
+
+        with self._lock:
+            entry = self._pending.pop(str(path), None)
+
+        return 0 if entry is None else entry[2]
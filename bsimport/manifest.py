@@ -0,0 +1,527 @@
+"""This module keeps track of what has already been imported."""
+# bsimport/manifest.py
+
+import hashlib
+import json
+import os
+import threading
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from bsimport import config
+from bsimport.journal import (
+    MOVE, PLAN, RECORD, REMOVE, UNRESOLVED, Journal
+)
+
+
+MANIFEST_FILE_PATH = config.CONFIG_DIR_PATH / "manifest.json"
+
+SHELF = "shelf"
+BOOK = "book"
+CHAPTER = "chapter"
+PAGE = "page"
+
+
+def file_hash(path: Path) -> str:
+    """
+    Get the SHA-256 digest of a file, reading it by chunks.
+
+    :param path:
+        The path to the file.
+    :type path: Path
+
+    :return:
+        The hexadecimal digest.
+    :rtype: str
+    """
+
+    digest = hashlib.sha256()
+
+    with path.open('rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class Manifest():
+    """
+    Maps each imported file or directory to the ID of the book, chapter or
+    page it was imported as, along with what's needed to detect changes:
+    the modification time, the size and the content hash of pages.
+
+    Entries are keyed by the resolved path of the source, so the same
+    manifest can hold several vaults.
+    """
+
+    def __init__(self, path: Path = MANIFEST_FILE_PATH):
+        self._path = path
+        self._entries: Dict[str, Dict[str, Any]] = dict()
+        self._lock = threading.Lock()
+        self._journal: Optional[Journal] = None
+        # The directories and files whose pages count as changed this run,
+        # see `refresh`.
+        self._stale: List[str] = list()
+        # The sources an interrupted run was creating, see `replay`.
+        self._in_flight: Dict[str, str] = dict()
+
+    @classmethod
+    def load(cls, path: Path = MANIFEST_FILE_PATH) -> 'Manifest':
+        """
+        Read the manifest from disk.
+
+        :param path:
+            The path to the manifest file.
+        :type path: Path
+
+        :return:
+            The manifest, empty if the file doesn't exist or is invalid.
+        :rtype: Manifest
+        """
+
+        manifest = cls(path)
+
+        try:
+            with path.open('r') as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return manifest
+
+        if isinstance(entries, dict):
+            manifest._entries = entries
+
+        return manifest
+
+    def save(self) -> bool:
+        """
+        Write the manifest to disk, replacing the previous one atomically.
+
+        :return:
+            Whether the manifest was saved.
+        :rtype: bool
+        """
+
+        tmp_path = self._path.with_suffix('.tmp')
+
+        with self._lock:
+            try:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                with tmp_path.open('w') as file:
+                    json.dump(self._entries, file)
+                os.replace(tmp_path, self._path)
+            except OSError:
+                return False
+
+        return True
+
+    def attach(self, journal: Optional[Journal]) -> None:
+        """
+        Log every change to the manifest in a journal, until the manifest
+        is saved, see `replay`.
+
+        :param journal:
+            The journal, None to stop logging.
+        :type journal: Optional[Journal]
+        """
+        self._journal = journal
+
+    @property
+    def journaled(self) -> bool:
+        """
+        Whether the changes are logged in a journal, see `attach`.
+        """
+        return self._journal is not None
+
+    def _log(self, op: str, **fields: Any) -> None:
+        """
+        Log a change in the journal, if any.
+        """
+
+        if self._journal is not None:
+            self._journal.append(op, **fields)
+
+    def replay(
+        self,
+        operations: List[Dict[str, Any]],
+        in_flight: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Apply the changes logged in the journal of an interrupted run.
+
+        :param operations:
+            The changes, in order, see journal.replay.
+        :type operations: List[Dict[str, Any]]
+        :param in_flight:
+            The kind of the sources that were being created when the run
+            stopped, by resolved path, see `in_flight`.
+        :type in_flight: Optional[Dict[str, str]]
+        """
+
+        if in_flight is not None:
+            self._in_flight.update(in_flight)
+
+        for operation in operations:
+            op = operation['op']
+            if op == RECORD:
+                with self._lock:
+                    self._entries[operation['path']] = operation['entry']
+            elif op == MOVE:
+                self.move(operation['old'], Path(operation['new']))
+            elif op == REMOVE:
+                self.remove(operation['old'])
+            elif op == UNRESOLVED:
+                self.set_unresolved(
+                    Path(operation['path']), operation['unresolved']
+                )
+
+    def in_flight(self, path: Path, kind: str) -> bool:
+        """
+        Whether a source was being created as a new `kind` when the
+        replayed run stopped: it may exist without being in the manifest.
+
+        :param path:
+            The path to the source.
+        :type path: Path
+        :param kind:
+            SHELF, BOOK, CHAPTER or PAGE.
+        :type kind: str
+        """
+
+        if not self._in_flight:
+            return False
+
+        return self._in_flight.get(str(path.resolve())) == kind
+
+    def plan(self, path: Path, kind: str) -> None:
+        """
+        Log in the journal, if any, that a file or directory is about to be
+        imported as a new `kind`, so a resumed run knows it may exist.
+
+        :param path:
+            The path to the source.
+        :type path: Path
+        :param kind:
+            SHELF, BOOK, CHAPTER or PAGE.
+        :type kind: str
+        """
+        self._log(PLAN, path=str(path.resolve()), kind=kind)
+
+    def get(self, path: Path) -> Optional[Dict[str, Any]]:
+        """
+        Get the entry of a file or directory.
+
+        :param path:
+            The path to the source.
+        :type path: Path
+
+        :return:
+            The entry, None if the source was never imported.
+        :rtype: Optional[Dict[str, Any]]
+        """
+
+        with self._lock:
+            return self._entries.get(str(path.resolve()))
+
+    def get_id(
+        self,
+        path: Path,
+        kind: str,
+        parent: Optional[str] = ""
+    ) -> int:
+        """
+        Get the remote ID of a source imported as `kind` under `parent`.
+
+        :param path:
+            The path to the source.
+        :type path: Path
+        :param kind:
+            SHELF, BOOK, CHAPTER or PAGE.
+        :type kind: str
+        :param parent:
+            The remote parent, None to accept any.
+        :type parent: Optional[str]
+
+        :return:
+            The ID, -1 if there is no matching entry.
+        :rtype: int
+        """
+
+        entry = self.get(path)
+
+        if entry is None or entry['kind'] != kind:
+            return -1
+        if parent is not None and entry.get('parent', "") != parent:
+            return -1
+
+        return entry['id']
+
+    def record(
+        self,
+        path: Path,
+        kind: str,
+        id: int,
+        parent: str = "",
+        name: str = "",
+        digest: Optional[str] = None,
+        stale: bool = False,
+        aliases: Optional[List[str]] = None,
+        unresolved: int = 0,
+        parts: Optional[List[int]] = None,
+        chapter: int = -1
+    ) -> None:
+        """
+        Record the import of a file or directory.
+
+        :param path:
+            The path to the source.
+        :type path: Path
+        :param kind:
+            SHELF, BOOK, CHAPTER or PAGE.
+        :type kind: str
+        :param id:
+            The remote ID.
+        :type id: int
+        :param parent:
+            The remote parent, e.g. 'book:3' or 'chapter:5'.
+        :type parent: str
+        :param name:
+            The name of the page.
+        :type name: str
+        :param digest:
+            The content hash of a page, computed if not provided.
+        :type digest: Optional[str]
+        :param stale:
+            Whether the page must be sent again next time even if it is
+            unchanged, e.g. because some of its media couldn't be uploaded.
+            Its ID is kept so it is updated rather than created again.
+        :type stale: bool
+        :param aliases:
+            The other names of the page wikilinks can use, see LinkIndex.
+        :type aliases: Optional[List[str]]
+        :param unresolved:
+            The number of wikilinks of the page to pages that didn't exist,
+            see `set_unresolved`.
+        :type unresolved: int
+        :param parts:
+            The IDs of the pages a large file was split into, `id` being
+            the first one.
+        :type parts: Optional[List[int]]
+        :param chapter:
+            The ID of the chapter created to hold the parts, -1 if they
+            are in the chapter of the file.
+        :type chapter: int
+        """
+
+        entry: Dict[str, Any] = {
+            'kind': kind,
+            'id': id,
+            'parent': parent
+        }
+
+        if kind == PAGE and stale:
+            entry['name'] = name
+            entry['mtime'] = -1
+            entry['size'] = -1
+            entry['hash'] = ""
+        elif kind == PAGE:
+            stat = path.stat()
+            entry['name'] = name
+            entry['mtime'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            entry['hash'] = digest if digest is not None else file_hash(path)
+
+        if kind == PAGE and aliases:
+            entry['aliases'] = aliases
+        if kind == PAGE and unresolved:
+            entry['unresolved'] = unresolved
+        if kind == PAGE and parts is not None:
+            entry['parts'] = parts
+        if kind == PAGE and chapter != -1:
+            entry['chapter'] = chapter
+
+        key = str(path.resolve())
+
+        with self._lock:
+            self._entries[key] = entry
+            self._log(RECORD, path=key, entry=entry)
+
+    def set_unresolved(self, path: Path, unresolved: int) -> None:
+        """
+        Update the number of wikilinks of a page to pages that don't exist,
+        so the page is linked again once they do, even if it is unchanged.
+
+        :param path:
+            The path to the Markdown file.
+        :type path: Path
+        :param unresolved:
+            The number of links.
+        :type unresolved: int
+        """
+
+        key = str(path.resolve())
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            self._log(UNRESOLVED, path=key, unresolved=unresolved)
+            if unresolved:
+                entry['unresolved'] = unresolved
+            else:
+                entry.pop('unresolved', None)
+
+    def under(self, root: Path) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the entries of everything inside a directory.
+
+        :param root:
+            The path to the directory.
+        :type root: Path
+
+        :return:
+            The entries keyed by path, without the directory's own entry.
+        :rtype: Dict[str, Dict[str, Any]]
+        """
+
+        prefix = os.path.join(str(root.resolve()), "")
+
+        with self._lock:
+            return {
+                path: dict(entry) for path, entry in self._entries.items()
+                if path.startswith(prefix)
+            }
+
+    def move(self, old: str, new: Path) -> None:
+        """
+        Move the entries of a renamed file or directory, and of everything
+        in it, to the new path.
+
+        :param old:
+            The previous resolved path.
+        :type old: str
+        :param new:
+            The new path.
+        :type new: Path
+        """
+
+        key = str(new.resolve())
+        prefix = os.path.join(old, "")
+
+        with self._lock:
+            self._log(MOVE, old=old, new=key)
+            for path in list(self._entries):
+                if path == old:
+                    self._entries[key] = self._entries.pop(path)
+                elif path.startswith(prefix):
+                    moved = os.path.join(key, path[len(prefix):])
+                    self._entries[moved] = self._entries.pop(path)
+
+    def remove(self, old: str) -> None:
+        """
+        Remove the entries of a file or directory and of everything in it.
+
+        :param old:
+            The resolved path of the source.
+        :type old: str
+        """
+
+        prefix = os.path.join(old, "")
+
+        with self._lock:
+            self._log(REMOVE, old=old)
+            for path in list(self._entries):
+                if path == old or path.startswith(prefix):
+                    del self._entries[path]
+
+    def forget(self, root: Path) -> None:
+        """
+        Remove the entries of a file or directory and of everything in it.
+
+        :param root:
+            The path to the source.
+        :type root: Path
+        """
+        self.remove(str(root.resolve()))
+
+    def refresh(self, root: Path) -> None:
+        """
+        Count the pages of a file or directory as changed until the end of
+        the run, so they are sent again to the pages, chapters and books
+        they were imported as, unlike `forget`.
+
+        :param root:
+            The path to the source.
+        :type root: Path
+        """
+
+        key = str(root.resolve())
+        self._stale.extend((key, os.path.join(key, "")))
+
+    def _is_stale(self, path: Path) -> bool:
+        """
+        Whether a page counts as changed, see `refresh`.
+        """
+
+        if not self._stale:
+            return False
+
+        key = str(path.resolve())
+        return any(
+            key == stale or key.startswith(stale) for stale in self._stale
+        )
+
+    def page_state(
+        self,
+        path: Path,
+        parent: str
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Check whether a page changed since it was imported under `parent`.
+
+        The modification time and size are compared first, the file is
+        only hashed when one of them differs.
+
+        :param path:
+            The path to the Markdown file.
+        :type path: Path
+        :param parent:
+            The remote parent the page is imported to.
+        :type parent: str
+
+        :return:
+            The entry of the page, None if it was never imported there.
+        :rtype: Optional[Dict[str, Any]]
+        :return:
+            Whether the page changed.
+        :rtype: bool
+        """
+
+        entry = self.get(path)
+
+        if entry is None or entry['kind'] != PAGE:
+            return None, True
+        if entry['parent'] != parent:
+            return None, True
+        if self._is_stale(path):
+            return entry, True
+
+        try:
+            stat = path.stat()
+        except OSError:
+            return entry, True
+
+        same_size = stat.st_size == entry['size']
+        if same_size and stat.st_mtime_ns == entry['mtime']:
+            return entry, False
+
+        if file_hash(path) != entry['hash']:
+            return entry, True
+
+        # Touched but not modified, remember the new stat to skip the hash
+        # on the next run.
+        with self._lock:
+            entry['mtime'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+
+        return entry, False
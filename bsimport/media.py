@@ -0,0 +1,612 @@
+"""This module uploads the images and files embedded in pages."""
+# bsimport/media.py
+
+import asyncio
+import json
+import os
+import re
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from bsimport import config
+from bsimport.manifest import file_hash
+
+
+MEDIA_FILE_PATH = config.CONFIG_DIR_PATH / "media.json"
+
+IMAGE = "image"
+ATTACHMENT = "attachment"
+
+# The formats accepted by Bookstack's image gallery, other files are
+# uploaded as attachments.
+IMAGE_EXTENSIONS = frozenset(('.png', '.jpg', '.jpeg', '.gif', '.webp'))
+
+# The number of files uploaded concurrently.
+DEFAULT_MEDIA_JOBS = 4
+
+# Obsidian's embeds, e.g. ![[diagram.png]] or ![[diagram.png|300]].
+WIKI_EMBED = re.compile(r'!\[\[([^\]|#^]+)(?:[#^][^\]|]*)?(?:\|[^\]]*)?\]\]')
+
+# Markdown images, e.g. ![alt](img/x.png) or ![alt](<my img.png> "title").
+MARKDOWN_EMBED = re.compile(
+    r'!\[([^\]]*)\]\(\s*(<[^>]*>|[^\s)]+)'
+    r'(?:\s+(?:"[^"]*"|\'[^\']*\'))?\s*\)'
+)
+
+# The opening or closing line of a fenced code block.
+FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})', re.MULTILINE)
+
+
+class Embed(NamedTuple):
+    """
+    Represents a file embedded in a page.
+    Contains:
+    - The start and end of the embed in the text.
+    - The target, as written.
+    - The label of the link, the file name for Obsidian's embeds.
+    """
+    start: int
+    end: int
+    target: str
+    label: str
+
+
+class Media(NamedTuple):
+    """
+    Represents an embedded file found on disk.
+    Contains:
+    - The embed.
+    - The path to the file.
+    - The content hash of the file, which identifies it remotely.
+    - The kind of upload, either IMAGE or ATTACHMENT.
+    """
+    embed: Embed
+    path: Path
+    digest: str
+    kind: str
+
+
+def code_blocks(text: str) -> List[Tuple[int, int]]:
+    """
+    Find the fenced code blocks of a text, where embeds are left alone.
+
+    :return:
+        The start and end of each block.
+    :rtype: List[Tuple[int, int]]
+    """
+
+    blocks = list()
+    opening = None
+
+    for match in FENCE.finditer(text):
+        fence = match.group(1)
+        if opening is None:
+            opening = match
+        elif fence[0] == opening.group(1)[0] and \
+                len(fence) >= len(opening.group(1)):
+            blocks.append((opening.start(), match.end()))
+            opening = None
+
+    if opening is not None:
+        blocks.append((opening.start(), len(text)))
+
+    return blocks
+
+
+def find_embeds(text: str) -> List[Embed]:
+    """
+    Find the files embedded in a Markdown text, outside code blocks.
+
+    :param text:
+        The Markdown text.
+    :type text: str
+
+    :return:
+        The embeds, in order.
+    :rtype: List[Embed]
+    """
+
+    if '![' not in text:
+        return []
+
+    embeds = list()
+
+    for match in WIKI_EMBED.finditer(text):
+        target = match.group(1).strip()
+        embeds.append(
+            Embed(match.start(), match.end(), target, Path(target).name)
+        )
+
+    for match in MARKDOWN_EMBED.finditer(text):
+        target = match.group(2)
+        if target.startswith('<'):
+            target = target[1:-1]
+        embeds.append(
+            Embed(match.start(), match.end(), unquote(target), match.group(1))
+        )
+
+    blocks = code_blocks(text)
+    embeds = [
+        embed for embed in embeds
+        if not any(start <= embed.start < end for start, end in blocks)
+    ]
+
+    return sorted(embeds)
+
+
+def rewrite(text: str, media: List[Media], urls: Dict[str, str]) -> str:
+    """
+    Point the embeds of a text to their uploaded files.
+
+    Images become Markdown images, other files links to the attachment.
+    Embeds without a URL are left as they are.
+
+    :param text:
+        The Markdown text.
+    :type text: str
+    :param media:
+        The embedded files, see `MediaUploader.find`.
+    :type media: List[Media]
+    :param urls:
+        The URL of each uploaded file, by content hash.
+    :type urls: Dict[str, str]
+
+    :return:
+        The text.
+    :rtype: str
+    """
+
+    parts = list()
+    position = 0
+
+    for item in media:
+        url = urls.get(item.digest)
+        if url is None:
+            continue
+        embed = item.embed
+        link = f"[{embed.label}]({url})"
+        parts.append(text[position:embed.start])
+        parts.append("!" + link if item.kind == IMAGE else link)
+        position = embed.end
+
+    parts.append(text[position:])
+
+    return "".join(parts)
+
+
+class MediaCache():
+    """
+    An on-disk map of the files already uploaded, by content hash, to
+    their remote URL.
+
+    A file is identified by its content rather than its path, so the same
+    image embedded in many pages, or copied around the vault, is only
+    uploaded once.
+    """
+
+    def __init__(self, path: Path = MEDIA_FILE_PATH):
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = dict()
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: Path = MEDIA_FILE_PATH) -> 'MediaCache':
+        """
+        Read the cache from disk.
+
+        :param path:
+            The path to the cache file.
+        :type path: Path
+
+        :return:
+            The cache, empty if the file doesn't exist or is invalid.
+        :rtype: MediaCache
+        """
+
+        cache = cls(path)
+
+        try:
+            with path.open('r') as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return cache
+
+        if isinstance(entries, dict):
+            cache._entries = entries
+
+        return cache
+
+    def save(self) -> bool:
+        """
+        Write the cache to disk if it changed, replacing the previous one
+        atomically.
+
+        :return:
+            Whether the cache is saved.
+        :rtype: bool
+        """
+
+        tmp_path = self._path.with_suffix('.tmp')
+
+        with self._lock:
+            if not self._dirty:
+                return True
+
+            try:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                with tmp_path.open('w') as file:
+                    json.dump(self._entries, file)
+                os.replace(tmp_path, self._path)
+            except OSError:
+                return False
+
+            self._dirty = False
+
+        return True
+
+    def get(self, digest: str) -> Optional[str]:
+        """
+        Get the URL of an uploaded file.
+
+        :param digest:
+            The content hash of the file.
+        :type digest: str
+
+        :return:
+            The URL, None if the file was never uploaded.
+        :rtype: Optional[str]
+        """
+
+        with self._lock:
+            entry = self._entries.get(digest)
+
+        return None if entry is None else entry['url']
+
+    def add(self, digest: str, kind: str, url: str) -> None:
+        """
+        Record an uploaded file.
+
+        :param digest:
+            The content hash of the file.
+        :type digest: str
+        :param kind:
+            IMAGE or ATTACHMENT.
+        :type kind: str
+        :param url:
+            The URL of the file.
+        :type url: str
+        """
+
+        with self._lock:
+            self._entries[digest] = {'kind': kind, 'url': url}
+            self._dirty = True
+
+    def clear(self) -> None:
+        """
+        Forget every uploaded file, so they are uploaded again.
+        """
+
+        with self._lock:
+            self._entries = dict()
+            self._dirty = True
+
+
+class MediaUploader():
+    """
+    Finds the files embedded in pages and uploads them, each one once.
+
+    Uploads run on their own pool of `jobs` threads, or as tasks of the
+    event loop, so the files of a page are sent concurrently while the
+    workers of the engine go on with other pages. A file embedded by pages
+    imported at the same time is only sent by the first one, the others
+    wait for its upload.
+    """
+
+    def __init__(self, cache: MediaCache, jobs: int = DEFAULT_MEDIA_JOBS):
+        self._cache = cache
+        self._jobs = jobs
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._uploads: Dict[str, Future] = dict()
+        self._async_uploads: Dict[str, asyncio.Future] = dict()
+        # path -> (mtime, size, digest), so a file is hashed once per run.
+        self._digests: Dict[Path, Tuple[int, int, str]] = dict()
+        # root -> file name -> path, for Obsidian's shortest links.
+        self._names: Dict[Path, Dict[str, Path]] = dict()
+        self._counts = {'uploaded': 0, 'reused': 0, 'failed': 0}
+
+    def close(self) -> None:
+        """
+        Stop the upload threads.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of files uploaded, reused from earlier uploads and
+        whose upload failed.
+        """
+
+        with self._lock:
+            return dict(self._counts)
+
+    def _by_name(self, root: Path) -> Dict[str, Path]:
+        """
+        Index the files under `root` by name, the first one in path order
+        winning, like Obsidian resolves a link to a file name.
+        """
+
+        with self._lock:
+            names = self._names.get(root)
+
+        if names is not None:
+            return names
+
+        names = dict()
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories[:] = sorted(
+                name for name in subdirectories if not name.startswith('.')
+            )
+            for name in sorted(files):
+                names.setdefault(name, Path(directory) / name)
+
+        with self._lock:
+            self._names[root] = names
+
+        return names
+
+    def _resolve(
+        self,
+        target: str,
+        directory: Path,
+        root: Path
+    ) -> Optional[Path]:
+        """
+        Find the file an embed points to, relative to the page, then to
+        the root of the vault, then by its name. Files outside the vault
+        are never uploaded.
+        """
+
+        if urlparse(target).scheme or target.startswith(('/', '#')):
+            return None
+
+        candidates = [directory / target, root / target]
+        by_name = self._by_name(root).get(Path(target).name)
+        if by_name is not None:
+            candidates.append(by_name)
+
+        for candidate in candidates:
+            try:
+                path = candidate.resolve()
+                path.relative_to(root.resolve())
+            except (OSError, ValueError):
+                continue
+            if path.suffix != '.md' and path.is_file():
+                return path
+
+        return None
+
+    def _digest(self, path: Path) -> str:
+        """
+        Hash a file, reusing the hash of an unmodified file.
+        """
+
+        stat = path.stat()
+
+        with self._lock:
+            known = self._digests.get(path)
+
+        if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2]
+
+        digest = file_hash(path)
+
+        with self._lock:
+            self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+
+        return digest
+
+    def find(self, file_path: Path, text: str, root: Path) -> List[Media]:
+        """
+        Find the files embedded in a page.
+
+        :param file_path:
+            The path to the page.
+        :type file_path: Path
+        :param text:
+            The Markdown text of the page.
+        :type text: str
+        :param root:
+            The directory imported as the book, embeds can't point outside.
+        :type root: Path
+
+        :return:
+            The embedded files found on disk, in order.
+        :rtype: List[Media]
+        """
+
+        media = list()
+
+        for embed in find_embeds(text):
+            path = self._resolve(embed.target, file_path.parent, root)
+            if path is None:
+                continue
+            try:
+                digest = self._digest(path)
+            except OSError:
+                continue
+            kind = IMAGE if path.suffix.lower() in IMAGE_EXTENSIONS \
+                else ATTACHMENT
+            media.append(Media(embed, path, digest, kind))
+
+        return media
+
+    def known(self, media: List[Media]) -> Dict[str, str]:
+        """
+        Get the URLs of the files already uploaded.
+
+        :return:
+            The URL of each file, by content hash.
+        :rtype: Dict[str, str]
+        """
+
+        urls = dict()
+
+        for item in media:
+            url = self._cache.get(item.digest)
+            if url is not None:
+                urls[item.digest] = url
+
+        return urls
+
+    def _send(self, wrapper: Any, item: Media, page_id: int) -> Optional[str]:
+        """
+        Upload a file and remember its URL.
+        """
+
+        if item.kind == IMAGE:
+            error, url = wrapper.upload_image(item.path, page_id)
+        else:
+            error, url = wrapper.upload_attachment(item.path, page_id)
+
+        return self._sent(item, None if error else url)
+
+    def _sent(self, item: Media, url: Optional[str]) -> Optional[str]:
+        """
+        Count an upload and remember the URL of the file, if it succeeded.
+        """
+
+        with self._lock:
+            self._counts['failed' if url is None else 'uploaded'] += 1
+
+        if url is not None:
+            self._cache.add(item.digest, item.kind, url)
+
+        return url
+
+    def _unique(self, media: List[Media]) -> Dict[str, Media]:
+        """
+        Keep one file per content hash.
+        """
+        return {item.digest: item for item in reversed(media)}
+
+    def upload(
+        self,
+        wrapper: Any,
+        media: List[Media],
+        page_id: int
+    ) -> Dict[str, str]:
+        """
+        Upload the files not uploaded yet, concurrently, and wait for them.
+
+        :param wrapper:
+            The Bookstack wrapper to upload with.
+        :type wrapper: Bookstack
+        :param media:
+            The embedded files, see `find`.
+        :type media: List[Media]
+        :param page_id:
+            The ID of the page the new files are uploaded to.
+        :type page_id: int
+
+        :return:
+            The URL of each file uploaded now or before, by content hash.
+            Files whose upload failed are missing.
+        :rtype: Dict[str, str]
+        """
+
+        urls = self.known(media)
+        futures: Dict[str, Future] = dict()
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._jobs)
+
+            for digest, item in self._unique(media).items():
+                if digest in urls:
+                    self._counts['reused'] += 1
+                    continue
+                future = self._uploads.get(digest)
+                if future is None:
+                    future = self._pool.submit(
+                        self._send, wrapper, item, page_id
+                    )
+                    self._uploads[digest] = future
+                else:
+                    self._counts['reused'] += 1
+                futures[digest] = future
+
+        for digest, future in futures.items():
+            url = future.result()
+            if url is not None:
+                urls[digest] = url
+
+        # A failed upload is tried again by the next page embedding it.
+        with self._lock:
+            for digest, future in futures.items():
+                if digest not in urls and self._uploads.get(digest) is future:
+                    del self._uploads[digest]
+
+        return urls
+
+    async def _send_async(
+        self,
+        wrapper: Any,
+        item: Media,
+        page_id: int
+    ) -> Optional[str]:
+        """
+        Upload a file with an AsyncBookstack, see `_send`.
+        """
+
+        if item.kind == IMAGE:
+            error, url = await wrapper.upload_image(item.path, page_id)
+        else:
+            error, url = await wrapper.upload_attachment(item.path, page_id)
+
+        return self._sent(item, None if error else url)
+
+    async def upload_async(
+        self,
+        wrapper: Any,
+        media: List[Media],
+        page_id: int
+    ) -> Dict[str, str]:
+        """
+        Upload the files not uploaded yet with an AsyncBookstack.
+
+        See `upload`, the files are uploaded by tasks of the event loop.
+        """
+
+        urls = self.known(media)
+        futures: Dict[str, asyncio.Future] = dict()
+
+        for digest, item in self._unique(media).items():
+            if digest in urls:
+                self._counts['reused'] += 1
+                continue
+            future = self._async_uploads.get(digest)
+            if future is None:
+                future = asyncio.ensure_future(
+                    self._send_async(wrapper, item, page_id)
+                )
+                self._async_uploads[digest] = future
+            else:
+                self._counts['reused'] += 1
+            futures[digest] = future
+
+        for digest, url in zip(
+            futures, await asyncio.gather(*futures.values())
+        ):
+            if url is not None:
+                urls[digest] = url
+            elif self._async_uploads.get(digest) is futures[digest]:
+                del self._async_uploads[digest]
+
+        return urls
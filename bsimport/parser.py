@@ -0,0 +1,598 @@
+"""This module parses Markdown files into the name, text and tags of a page."""
+# bsimport/parser.py
+
+import locale
+import mmap
+import re
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple,
+    Union
+)
+
+
+# Files at least this large are memory-mapped instead of read.
+MMAP_THRESHOLD = 1 << 20
+
+Buffer = Union[bytes, mmap.mmap]
+
+# The size of the chunks a large file is scanned by, read rather than
+# mapped so that its pages don't count in the memory of the process.
+SCAN_CHUNK_SIZE = 1 << 20
+
+
+# An old Mac newline, '\r' alone, which `scan` doesn't see as a line end.
+LONE_CR = re.compile(rb'\r(?!\n)')
+
+# A heading line, where a large text can be split, or the opening or
+# closing line of a fenced code block, see media.FENCE, as its marker.
+SPLIT = re.compile(r'^(?: {0,3}(`{3,}|~{3,})|#{1,6}[ \t])', re.MULTILINE)
+SPLIT_BYTES = re.compile(SPLIT.pattern.encode(), re.MULTILINE)
+
+
+class TextRange(NamedTuple):
+    """
+    Represents the text of a large Markdown file, left on disk to be
+    streamed rather than decoded in memory.
+    Contains:
+    - The path to the file.
+    - The byte offsets the text starts and ends at, newlines not
+      normalized.
+    - The encoding of the file.
+    """
+    path: Path
+    start: int
+    end: int
+    encoding: str
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+class Layout(NamedTuple):
+    """
+    Represents where the parts of a Markdown file are, by byte offset.
+    Contains:
+    - The start and end of the tags after 'tags:' in the front matter,
+      -1 if there are none.
+    - The start and end of the aliases after 'aliases:' in the front
+      matter, -1 if there are none.
+    - The start of the H1 header line, -1 if there is none.
+    - The start of the text, i.e. of the first H2 header line or, without
+      one, of the last line.
+    """
+    tags_start: int
+    tags_end: int
+    aliases_start: int
+    aliases_end: int
+    name_start: int
+    text_start: int
+
+
+def _line_end(buf: Buffer, start: int) -> int:
+    """
+    Get the offset right after the line starting at `start`,
+    newline included.
+    """
+
+    end = buf.find(b'\n', start)
+    return len(buf) if end == -1 else end + 1
+
+
+def scan(buf: Buffer) -> Layout:
+    """
+    Find the front matter tags, the title and the start of the text of
+    a Markdown file in a single pass, without splitting it into lines.
+
+    The rules are those of the original line-based parser:
+    - The front matter starts with a line starting with '---' and ends at
+      the next one. The last 'tags:' line in it wins. Without an end, every
+      line after the first one is part of it, and the title and text are
+      then searched from the start of the file.
+    - Aliases are found like tags, on the last 'aliases:' line.
+    - The title is the last '# ' line before the first '## ' line.
+    - The text starts at the first '## ' line. Without one, the text is
+      only the last line.
+
+    :param buf:
+        The content of the file, newlines normalized to '\\n'.
+    :type buf: Buffer
+
+    :return:
+        The offsets of each part.
+    :rtype: Layout
+    """
+
+    size = len(buf)
+    start = 0
+    tags_start = tags_end = -1
+    aliases_start = aliases_end = -1
+
+    first_end = buf.find(b'\n')
+    if buf[:3] == b'---' and first_end != -1:
+
+        close = buf.find(b'\n---', first_end)
+        matter_end = size if close == -1 else close + 1
+
+        tags = buf.rfind(b'\ntags:', first_end, matter_end)
+        if tags != -1:
+            tags_start = tags + 6
+            line_end = _line_end(buf, tags_start)
+            tags_end = buf.find(b':', tags_start, line_end)
+            if tags_end == -1:
+                tags_end = line_end
+
+        aliases = buf.rfind(b'\naliases:', first_end, matter_end)
+        if aliases != -1:
+            aliases_start = aliases + 9
+            aliases_end = _line_end(buf, aliases_start)
+
+        if close != -1:
+            start = _line_end(buf, close + 1)
+
+    text_start = -1
+    if buf[start:start + 3] == b'## ':
+        text_start = start
+    else:
+        h2 = buf.find(b'\n## ', start)
+        if h2 != -1:
+            text_start = h2 + 1
+
+    limit = size if text_start == -1 else text_start
+    name_start = -1
+    h1 = buf.rfind(b'\n# ', start, limit)
+    if h1 != -1:
+        name_start = h1 + 1
+    elif buf[start:start + 2] == b'# ' and start < limit:
+        name_start = start
+
+    if text_start == -1:
+        # Keep the behaviour of the original parser: the last line.
+        text_start = buf.rfind(b'\n', 0, size - 1) + 1
+
+    return Layout(
+        tags_start, tags_end, aliases_start, aliases_end, name_start,
+        text_start
+    )
+
+
+def parse_head(
+    buf: Buffer,
+    encoding: str
+) -> Tuple[str, int, List[Dict[str, str]], List[str]]:
+    """
+    Parse the title, tags and aliases of a Markdown file, and find where
+    its text starts, without decoding the text.
+
+    :param buf:
+        The content of the file, lines ending with '\\n' or '\\r\\n'.
+    :type buf: Buffer
+    :param encoding:
+        The encoding of the file.
+    :type encoding: str
+
+    :return:
+        The name of the page, empty if there is none, see `parse`.
+    :rtype: str
+    :return:
+        The offset of the text.
+    :rtype: int
+    :return:
+        The tags found, if any.
+    :rtype: List[Dict[str, str]]
+    :return:
+        The aliases found, if any.
+    :rtype: List[str]
+    """
+
+    layout = scan(buf)
+
+    with memoryview(buf) as view:
+
+        tags = list()
+        if layout.tags_start != -1:
+            raw = str(view[layout.tags_start:layout.tags_end], encoding)
+            raw = raw.strip().rstrip(']').lstrip('[')
+            tags = [{'name': tag} for tag in raw.split(', ')]
+
+        aliases = list()
+        if layout.aliases_start != -1:
+            raw = str(
+                view[layout.aliases_start:layout.aliases_end], encoding
+            )
+            raw = raw.strip().rstrip(']').lstrip('[')
+            aliases = [alias for alias in raw.split(', ') if alias]
+
+        name = ""
+        if layout.name_start != -1:
+            end = _line_end(buf, layout.name_start)
+            name = str(view[layout.name_start:end], encoding)
+            name = name.rstrip().lstrip('# ')
+
+    return name, layout.text_start, tags, aliases
+
+
+def parse(
+    buf: Buffer,
+    encoding: Optional[str] = None
+) -> Tuple[str, str, List[Dict[str, str]], List[str]]:
+    """
+    Parse the content of a Markdown file.
+
+    Only the title line, the tags and the text are decoded, the text
+    directly from the buffer.
+
+    :param buf:
+        The content of the file, newlines normalized to '\\n'.
+    :type buf: Buffer
+    :param encoding:
+        The encoding of the file, the locale's by default.
+    :type encoding: Optional[str]
+
+    :return:
+        The name of the page, taken from the title of the file
+        (H1 header), empty if there is none.
+    :rtype: str
+    :return:
+        The rest of the text, without the H1 header.
+    :rtype: str
+    :return:
+        The tags found, if any.
+    :rtype: List[Dict[str, str]]
+    :return:
+        The aliases found, if any.
+    :rtype: List[str]
+    """
+
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+
+    name, start, tags, aliases = parse_head(buf, encoding)
+
+    with memoryview(buf) as view:
+        text = str(view[start:], encoding)
+
+    return name, text, tags, aliases
+
+
+@contextmanager
+def open_buffer(file_path: Path) -> Iterator[Optional[Buffer]]:
+    """
+    Read a Markdown file, memory-mapping it if it is large.
+
+    :param file_path:
+        The path to the file.
+    :type file_path: Path
+
+    :yield:
+        The content of the file, newlines normalized to '\\n'. None if
+        the file is empty.
+    :rtype: Iterator[Optional[Buffer]]
+
+    :raises OSError:
+        If the file can't be read.
+    """
+
+    with file_path.open('rb') as file:
+
+        size = file.seek(0, 2)
+        if size == 0:
+            yield None
+            return
+
+        if size < MMAP_THRESHOLD:
+            file.seek(0)
+            data: Buffer = file.read()
+        else:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        buf = data
+        # Text mode would translate '\r\n' and '\r', do the same
+        # in the rare files that need it.
+        if buf.find(b'\r') != -1:
+            buf = buf[:].replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        yield buf
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def parse_file(
+    file_path: Path
+) -> Optional[Tuple[str, str, List[Dict[str, str]], List[str]]]:
+    """
+    Read and parse a Markdown file, see `open_buffer` and `parse`.
+
+    :param file_path:
+        The path to the file.
+    :type file_path: Path
+
+    :return:
+        The name, text, tags and aliases. None if the file is empty.
+    :rtype: Optional[Tuple[str, str, List[Dict[str, str]], List[str]]]
+
+    :raises OSError:
+        If the file can't be read.
+    :raises UnicodeDecodeError:
+        If the file isn't in the locale's encoding.
+    """
+
+    with open_buffer(file_path) as buf:
+        return None if buf is None else parse(buf)
+
+
+def _chunks(
+    file: BinaryIO,
+    start: int,
+    end: int,
+    overlap: int = 0
+) -> Iterator[bytes]:
+    """
+    Read the bytes of a file from `start` to `end` by chunks, each one
+    starting with the last `overlap` bytes of the previous one.
+    """
+
+    file.seek(start)
+    tail = b""
+
+    while start < end:
+        piece = file.read(min(SCAN_CHUNK_SIZE, end - start))
+        if not piece:
+            return
+        start += len(piece)
+        chunk = tail + piece
+        yield chunk
+        tail = chunk[len(chunk) - overlap:]
+
+
+def _has_lone_cr(file: BinaryIO, size: int) -> bool:
+    """
+    Check whether a file has old Mac newlines, see LONE_CR.
+    """
+
+    for chunk in _chunks(file, 0, size, 1):
+        match = LONE_CR.search(chunk)
+        # A '\r' ending a chunk is checked again with the next byte.
+        if match is not None and (
+            match.start() < len(chunk) - 1 or file.tell() >= size
+        ):
+            return True
+
+    return False
+
+
+def parse_large(
+    file_path: Path,
+    encoding: Optional[str] = None
+) -> Optional[Tuple[str, TextRange, List[Dict[str, str]], List[str]]]:
+    """
+    Parse a large Markdown file without reading its text in memory: only
+    the title, tags and aliases are decoded, the text is left on disk.
+
+    Files with old Mac newlines ('\\r' alone) can't be parsed in place,
+    they are left to `parse_file`.
+
+    :param file_path:
+        The path to the file.
+    :type file_path: Path
+    :param encoding:
+        The encoding of the file, the locale's by default.
+    :type encoding: Optional[str]
+
+    :return:
+        The name, text, tags and aliases. None if the file is empty or
+        must be parsed by `parse_file`.
+    :rtype: Optional[Tuple[str, TextRange, List[Dict[str, str]],
+                           List[str]]]
+
+    :raises OSError:
+        If the file can't be read.
+    :raises UnicodeDecodeError:
+        If the title, tags or aliases aren't in the encoding.
+    """
+
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+
+    with file_path.open('rb') as file:
+        size = file.seek(0, 2)
+        if size == 0 or _has_lone_cr(file, size):
+            return None
+        buf = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with buf:
+        name, start, tags, aliases = parse_head(buf, encoding)
+
+    return name, TextRange(file_path, start, size, encoding), tags, aliases
+
+
+def read_text(text: TextRange) -> str:
+    """
+    Read and decode the text of a large file, see `parse_large`.
+
+    :raises OSError:
+        If the file can't be read.
+    :raises UnicodeDecodeError:
+        If the text isn't in the encoding of the file.
+    """
+
+    with text.path.open('rb') as file:
+        file.seek(text.start)
+        raw = file.read(text.size)
+
+    if raw.find(b'\r') != -1:
+        raw = raw.replace(b'\r\n', b'\n')
+
+    return raw.decode(text.encoding)
+
+
+def contains(text: TextRange, *needles: bytes) -> bool:
+    """
+    Check whether the text of a large file contains any of `needles`,
+    without decoding it.
+    """
+
+    overlap = max(map(len, needles)) - 1
+
+    with text.path.open('rb') as file:
+        return any(
+            chunk.find(needle) != -1
+            for chunk in _chunks(file, text.start, text.end, overlap)
+            for needle in needles
+        )
+
+
+def _headings(
+    chunks: Iterable[Tuple[int, Union[str, bytes]]],
+    pattern: 're.Pattern'
+) -> Iterator[int]:
+    """
+    Find the heading lines outside fenced code blocks, in chunks of whole
+    lines, see SPLIT.
+
+    :param chunks:
+        The offset and content of each chunk, in order.
+    :type chunks: Iterable[Tuple[int, Union[str, bytes]]]
+    :param pattern:
+        SPLIT, or its bytes counterpart.
+    :type pattern: re.Pattern
+
+    :return:
+        The offset of each heading line.
+    :rtype: Iterator[int]
+    """
+
+    # The marker of the open fenced code block, where lines starting with
+    # '#' aren't headings.
+    opening = None
+
+    for offset, chunk in chunks:
+        for match in pattern.finditer(chunk):
+            marker = match.group(1)
+            if marker is None:
+                if opening is None:
+                    yield offset + match.start()
+            elif opening is None:
+                opening = marker
+            elif marker[:1] == opening[:1] and len(marker) >= len(opening):
+                opening = None
+
+
+def _pack(headings: Iterable[int], length: int, size: int) -> List[int]:
+    """
+    Make parts as large as possible from sections, see `split_points`.
+    """
+
+    starts = [0]
+    # The last heading the current part could end at.
+    last = None
+
+    for start in headings:
+
+        if start <= starts[-1]:
+            continue
+
+        if start - starts[-1] <= size:
+            last = start
+            continue
+        if last is not None:
+            starts.append(last)
+            last = None
+            if start - starts[-1] <= size:
+                last = start
+                continue
+        starts.append(start)
+
+    if last is not None and length - starts[-1] > size:
+        starts.append(last)
+
+    return starts
+
+
+def split_points(text: Union[str, Buffer], size: int) -> List[int]:
+    """
+    Find where to split a text into parts of at most `size` characters or
+    bytes, at heading lines outside fenced code blocks.
+
+    Parts are made as large as possible. A section larger than `size`,
+    from one heading to the next, is kept whole.
+
+    :param text:
+        The text, decoded or not.
+    :type text: Union[str, Buffer]
+    :param size:
+        The maximum size of a part.
+    :type size: int
+
+    :return:
+        The offset each part starts at, the first one is always 0.
+    :rtype: List[int]
+    """
+
+    if len(text) <= size:
+        return [0]
+
+    pattern = SPLIT if isinstance(text, str) else SPLIT_BYTES
+
+    return _pack(_headings([(0, text)], pattern), len(text), size)
+
+
+def _line_chunks(
+    file: BinaryIO,
+    start: int,
+    end: int
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Read the bytes of a file from `start` to `end` by chunks of whole
+    lines, see `_chunks`.
+
+    :return:
+        The offset of each chunk from `start`, and the chunk.
+    :rtype: Iterator[Tuple[int, bytes]]
+    """
+
+    offset = 0
+    carry = b""
+
+    for piece in _chunks(file, start, end):
+        chunk = carry + piece
+        cut = chunk.rfind(b'\n') + 1
+        if cut == 0:
+            carry = chunk
+            continue
+        yield offset, chunk[:cut]
+        offset += cut
+        carry = chunk[cut:]
+
+    if carry:
+        yield offset, carry
+
+
+def split_range(text: TextRange, size: int) -> List[TextRange]:
+    """
+    Split the text of a large file at its headings, reading it by chunks
+    rather than in memory, see `split_points`.
+
+    :raises OSError:
+        If the file can't be read.
+    """
+
+    if text.size <= size:
+        return [text]
+
+    with text.path.open('rb') as file:
+        starts = _pack(
+            _headings(_line_chunks(file, text.start, text.end), SPLIT_BYTES),
+            text.size, size
+        )
+
+    ends = starts[1:] + [text.size]
+
+    return [
+        text._replace(start=text.start + start, end=text.start + end)
+        for start, end in zip(starts, ends)
+    ]
@@ -0,0 +1,256 @@
+"""This module profiles a whole run, worker pools included."""
+# bsimport/profiling.py
+
+import cProfile
+import functools
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+
+from multiprocessing import util
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# The number of frames kept for each allocation.
+TRACEBACK_LIMIT = 10
+
+# Since Python 3.12, a profiler sees every thread, and only one can run.
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+_active: Optional['Profiler'] = None
+_worker_profile: Optional[cProfile.Profile] = None
+
+
+class Profiler():
+    """
+    Profiles the CPU time, and optionally the allocations, of a run.
+
+    The main thread is profiled directly. Functions run by worker threads
+    go through `wrap`, which profiles them in a profiler per thread, and
+    worker processes start with `init_worker`, which profiles them until
+    they exit. Everything is merged into a single pstats file when the
+    profiler stops.
+
+    Allocations are traced with tracemalloc, which covers every thread of
+    a process. The top allocation sites of the run and of the worker
+    processes are written next to the CPU profile.
+    """
+
+    def __init__(self, path: Path, memory_top: int = 0):
+        self.path = path
+        self.memory_top = memory_top
+        self._profile = cProfile.Profile()
+        self._main = threading.get_ident()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread_profiles: List[cProfile.Profile] = list()
+
+    @property
+    def memory_path(self) -> Path:
+        """
+        The path of the memory allocation report.
+        """
+        return self.path.with_name(self.path.name + ".memory.txt")
+
+    def start(self) -> 'Profiler':
+        """
+        Start profiling the current thread and the workers started from now.
+        """
+
+        global _active
+
+        if self.memory_top:
+            tracemalloc.start(TRACEBACK_LIMIT)
+
+        _active = self
+        self._profile.enable()
+
+        return self
+
+    def stop(self) -> Tuple[Path, Optional[Path]]:
+        """
+        Stop profiling and write the reports.
+
+        :return:
+            The path of the CPU profile.
+        :rtype: Path
+        :return:
+            The path of the memory allocation report, None if allocations
+            weren't traced.
+        :rtype: Optional[Path]
+        """
+
+        global _active
+
+        self._profile.disable()
+        _active = None
+
+        stats = pstats.Stats(self._profile)
+
+        with self._lock:
+            for profile in self._thread_profiles:
+                stats.add(profile)
+
+        for path in self._collect('worker-cpu'):
+            stats.add(str(path))
+            path.unlink()
+
+        stats.dump_stats(str(self.path))
+
+        if not self.memory_top:
+            return self.path, None
+
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        snapshots = [snapshot]
+        for path in self._collect('worker-memory'):
+            snapshots.append(tracemalloc.Snapshot.load(str(path)))
+            path.unlink()
+
+        self._write_memory_report(snapshots, peak)
+
+        return self.path, self.memory_path
+
+    def _collect(self, kind: str) -> List[Path]:
+        """
+        List the reports written by the worker processes.
+        """
+        prefix = f"{self.path.name}.{kind}."
+        return sorted(
+            path for path in self.path.parent.iterdir()
+            if path.name.startswith(prefix)
+        )
+
+    def _write_memory_report(
+        self,
+        snapshots: List[tracemalloc.Snapshot],
+        peak: int
+    ) -> None:
+        """
+        Write the top allocation sites, summed over every process.
+        """
+
+        sites: Dict[str, List[int]] = dict()
+
+        for snapshot in snapshots:
+            snapshot = snapshot.filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            for stat in snapshot.statistics('traceback'):
+                key = "\n".join(stat.traceback.format())
+                site = sites.setdefault(key, [0, 0])
+                site[0] += stat.size
+                site[1] += stat.count
+
+        top = sorted(sites.items(), key=lambda item: -item[1][0])
+
+        with self.memory_path.open('w') as file:
+            file.write(
+                f"Peak traced memory of the main process: "
+                f"{peak / 1024:.1f} KiB\n"
+                f"Top {self.memory_top} allocation sites still allocated "
+                f"at the end, over {len(snapshots)} process(es):\n\n"
+            )
+            for rank, (site, (size, count)) in enumerate(
+                top[:self.memory_top], 1
+            ):
+                file.write(
+                    f"#{rank}: {size / 1024:.1f} KiB in {count} blocks\n"
+                    f"{site}\n\n"
+                )
+
+    def wrap(self, function: Callable) -> Callable:
+        """
+        Wrap a function run by a worker thread so it is profiled.
+        """
+
+        if PROFILES_ALL_THREADS:
+            return function
+
+        @functools.wraps(function)
+        def profiled(*args: Any, **kwargs: Any) -> Any:
+
+            # Profiling the main thread again would stop its profiler.
+            if threading.get_ident() == self._main:
+                return function(*args, **kwargs)
+
+            profile = getattr(self._local, 'profile', None)
+            if profile is None:
+                profile = cProfile.Profile()
+                self._local.profile = profile
+                with self._lock:
+                    self._thread_profiles.append(profile)
+
+            return profile.runcall(function, *args, **kwargs)
+
+        return profiled
+
+
+def wrap(function: Callable) -> Callable:
+    """
+    Wrap a function run by a worker thread so it is profiled, if a run
+    is being profiled. Returns the function itself otherwise.
+    """
+
+    if _active is None:
+        return function
+    return _active.wrap(function)
+
+
+def pool_options() -> Dict[str, Any]:
+    """
+    Get the options of a ProcessPoolExecutor whose workers are profiled,
+    if a run is being profiled.
+    """
+
+    if _active is None:
+        return dict()
+
+    return {
+        'initializer': init_worker,
+        'initargs': (str(_active.path), _active.memory_top)
+    }
+
+
+def init_worker(path: str, memory_top: int) -> None:
+    """
+    Start profiling a worker process until it exits.
+    """
+
+    global _active, _worker_profile
+
+    # A forked worker inherits the profiler of its parent.
+    if _active is not None:
+        _active._profile.disable()
+        _active = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    if memory_top:
+        tracemalloc.start(TRACEBACK_LIMIT)
+
+    _worker_profile = cProfile.Profile()
+    _worker_profile.enable()
+
+    # Run when the worker exits, which doesn't run atexit handlers.
+    util.Finalize(None, _dump_worker, args=(path,), exitpriority=10)
+
+
+def _dump_worker(path: str) -> None:
+    """
+    Write the reports of a worker process, see `init_worker`.
+    """
+
+    if _worker_profile is not None:
+        _worker_profile.disable()
+        _worker_profile.dump_stats(f"{path}.worker-cpu.{os.getpid()}")
+
+    if tracemalloc.is_tracing():
+        tracemalloc.take_snapshot().dump(f"{path}.worker-memory.{os.getpid()}")
+        tracemalloc.stop()
@@ -0,0 +1,278 @@
+"""This module records where the time of a run goes."""
+# bsimport/stats.py
+
+import heapq
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Stages of a page import, besides the requests.
+CHECK = "check"
+READ = "read"
+PARSE = "parse"
+UPLOAD = "upload"
+LINK = "link"
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# The number of slowest files reported.
+SLOWEST = 10
+
+
+def endpoint(method: str, path: str) -> str:
+    """
+    Name the endpoint of a request, IDs replaced by a placeholder so that
+    e.g. every page update is counted together.
+
+    :param method:
+        The HTTP method.
+    :type method: str
+    :param path:
+        The path of the endpoint, relative to the API's URL.
+    :type path: str
+
+    :return:
+        The endpoint, e.g. 'PUT pages/{id}'.
+    :rtype: str
+    """
+
+    parts = [
+        '{id}' if part.isdigit() else part
+        for part in path.split('?')[0].split('/')
+    ]
+    return f"{method.upper()} {'/'.join(parts)}"
+
+
+def bucket(seconds: float) -> str:
+    """
+    Get the label of the histogram bucket of a latency.
+    """
+
+    milliseconds = seconds * 1000
+    for bound in BUCKETS:
+        if milliseconds <= bound:
+            return f"<={bound}ms"
+    return f">{BUCKETS[-1]}ms"
+
+
+class Stats():
+    """
+    Collects the timings of a run: every request attempt by endpoint and
+    status, the time spent in each stage of a page import, the total
+    time of each file, and the changes of the adaptive concurrency limit.
+
+    Every method is thread-safe, so a single instance is shared by the
+    importer, its wrapper and the workers of the engine.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._requests: Dict[str, Dict[str, Any]] = dict()
+        self._stages: Dict[str, Dict[str, float]] = dict()
+        self._files: Dict[str, float] = dict()
+        self._limit: Optional[Dict[str, Any]] = None
+
+    def record_request(
+        self,
+        method: str,
+        path: str,
+        status: Optional[int],
+        seconds: float,
+        sent: int = 0
+    ) -> None:
+        """
+        Record a request attempt.
+
+        :param method:
+            The HTTP method.
+        :type method: str
+        :param path:
+            The path of the endpoint, relative to the API's URL.
+        :type path: str
+        :param status:
+            The status code of the response, None if there was none.
+        :type status: Optional[int]
+        :param seconds:
+            The time until the response was received.
+        :type seconds: float
+        :param sent:
+            The size of the request body, in bytes.
+        :type sent: int
+        """
+
+        name = endpoint(method, path)
+        status_name = "error" if status is None else str(status)
+
+        with self._lock:
+            entry = self._requests.setdefault(name, {
+                'count': 0,
+                'seconds': 0.0,
+                'max_ms': 0.0,
+                'bytes_sent': 0,
+                'statuses': dict(),
+                'histogram': dict()
+            })
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+            entry['bytes_sent'] += sent
+            statuses = entry['statuses']
+            statuses[status_name] = statuses.get(status_name, 0) + 1
+            histogram = entry['histogram']
+            label = bucket(seconds)
+            histogram[label] = histogram.get(label, 0) + 1
+
+    def record_stage(
+        self,
+        stage: str,
+        seconds: float,
+        path: Optional[Path] = None
+    ) -> None:
+        """
+        Record the time spent in a stage, and add it to the total of
+        the file it was spent on.
+
+        :param stage:
+            CHECK, READ, PARSE or UPLOAD.
+        :type stage: str
+        :param seconds:
+            The time spent.
+        :type seconds: float
+        :param path:
+            The file, if any.
+        :type path: Optional[Path]
+        """
+
+        with self._lock:
+            entry = self._stages.setdefault(stage, {
+                'count': 0,
+                'seconds': 0.0
+            })
+            entry['count'] += 1
+            entry['seconds'] += seconds
+
+            if path is not None:
+                key = str(path)
+                self._files[key] = self._files.get(key, 0.0) + seconds
+
+    def record_limit(self, limit: int) -> None:
+        """
+        Record a new concurrency limit, see limit.AdaptiveLimit.
+
+        :param limit:
+            The number of requests now allowed in flight.
+        :type limit: int
+        """
+
+        now = time.perf_counter()
+
+        with self._lock:
+            entry = self._limit
+            if entry is None:
+                self._limit = {
+                    'limit': limit,
+                    'min': limit,
+                    'max': limit,
+                    'changes': 0,
+                    'start': now,
+                    'since': now,
+                    'weighted': 0.0
+                }
+                return
+            entry['weighted'] += entry['limit'] * (now - entry['since'])
+            entry['since'] = now
+            entry['limit'] = limit
+            entry['min'] = min(entry['min'], limit)
+            entry['max'] = max(entry['max'], limit)
+            entry['changes'] += 1
+
+    @contextmanager
+    def timer(
+        self,
+        stage: str,
+        path: Optional[Path] = None
+    ) -> Iterator[None]:
+        """
+        Record the time spent in the block as a stage, see `record_stage`.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start, path)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the run.
+
+        :return:
+            The elapsed time, the total of requests and bytes sent, the
+            requests by endpoint, the stages, the slowest files and the
+            concurrency limit, None if it wasn't adaptive, ready to be
+            dumped as JSON.
+        :rtype: Dict[str, Any]
+        """
+
+        with self._lock:
+            requests = {
+                name: {
+                    **entry,
+                    'statuses': dict(entry['statuses']),
+                    'histogram': {
+                        label: entry['histogram'][label]
+                        for label in self._labels()
+                        if label in entry['histogram']
+                    },
+                    'mean_ms': entry['seconds'] / entry['count'] * 1000
+                }
+                for name, entry in sorted(self._requests.items())
+            }
+            stages = {
+                name: dict(entry) for name, entry in self._stages.items()
+            }
+            slowest: List[Tuple[str, float]] = heapq.nlargest(
+                SLOWEST, self._files.items(), key=lambda item: item[1]
+            )
+            concurrency = None
+            if self._limit is not None:
+                entry = self._limit
+                now = time.perf_counter()
+                weighted = entry['weighted'] + \
+                    entry['limit'] * (now - entry['since'])
+                concurrency = {
+                    key: entry[key]
+                    for key in ('limit', 'min', 'max', 'changes')
+                }
+                # Averaged over time since the limit was created.
+                concurrency['mean'] = weighted / max(
+                    now - entry['start'], 1e-9
+                )
+
+        return {
+            'elapsed': time.perf_counter() - self._start,
+            'requests': sum(entry['count'] for entry in requests.values()),
+            'bytes_sent': sum(
+                entry['bytes_sent'] for entry in requests.values()
+            ),
+            'endpoints': requests,
+            'stages': stages,
+            'slowest_files': [
+                {'path': path, 'seconds': seconds}
+                for path, seconds in slowest
+            ],
+            'concurrency': concurrency
+        }
+
+    @staticmethod
+    def _labels() -> List[str]:
+        """
+        Get the labels of the histogram buckets, in order.
+        """
+        return [f"<={bound}ms" for bound in BUCKETS] + [f">{BUCKETS[-1]}ms"]
@@ -0,0 +1,194 @@
+"""This module synchronizes a directory with the book it was imported as."""
+# bsimport/sync.py
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from bsimport import SUCCESS
+from bsimport.engine import (
+    Result, import_book_content, list_chapters, list_pages
+)
+from bsimport.imp import Importer
+from bsimport.manifest import CHAPTER, PAGE, Manifest, file_hash
+
+
+RENAMED = "renamed"
+MOVED = "moved"
+DELETED = "deleted"
+
+
+def _vanished(
+    manifest: Manifest,
+    path: Path,
+    kind: str
+) -> Dict[str, Dict]:
+    """
+    Get the entries of the chapters or pages whose source no longer exists.
+    """
+    return {
+        old: entry for old, entry in manifest.under(path).items()
+        if entry['kind'] == kind and not Path(old).exists()
+    }
+
+
+def find_renamed_chapters(
+    manifest: Manifest,
+    path: Path
+) -> List[Tuple[str, Path]]:
+    """
+    Match the new subdirectories of a book with the vanished ones they were
+    renamed from, using the content hashes of their pages.
+
+    :param manifest:
+        The manifest of previous imports.
+    :type manifest: Manifest
+    :param path:
+        The path to the directory imported as the book.
+    :type path: Path
+
+    :return:
+        The previous path and the new path of each renamed directory.
+    :rtype: List[Tuple[str, Path]]
+    """
+
+    vanished = _vanished(manifest, path, CHAPTER)
+    if not vanished:
+        return []
+
+    pages = _vanished(manifest, path, PAGE)
+    hashes = {
+        old: {
+            entry['hash'] for page, entry in pages.items()
+            if entry['parent'] == f"chapter:{chapter['id']}"
+        }
+        for old, chapter in vanished.items()
+    }
+
+    renamed = list()
+
+    for chapter in list_chapters(path):
+
+        if manifest.get(chapter) is not None or not hashes:
+            continue
+
+        local = {file_hash(page) for page in list_pages(chapter)}
+        old, overlap = max(
+            ((old, len(local & known)) for old, known in hashes.items()),
+            key=lambda match: match[1]
+        )
+
+        if overlap:
+            renamed.append((old, chapter))
+            del hashes[old]
+
+    return renamed
+
+
+def find_moved_pages(
+    manifest: Manifest,
+    path: Path
+) -> List[Tuple[str, Path]]:
+    """
+    Match the new Markdown files of a book with the vanished ones they were
+    moved or renamed from, using their content hash.
+
+    :param manifest:
+        The manifest of previous imports.
+    :type manifest: Manifest
+    :param path:
+        The path to the directory imported as the book.
+    :type path: Path
+
+    :return:
+        The previous path and the new path of each moved file.
+    :rtype: List[Tuple[str, Path]]
+    """
+
+    vanished = _vanished(manifest, path, PAGE)
+    if not vanished:
+        return []
+
+    by_hash = {entry['hash']: old for old, entry in vanished.items()}
+
+    moved = list()
+    directories = [path] + list_chapters(path)
+
+    for directory in directories:
+        for page in list_pages(directory):
+
+            if manifest.get(page) is not None:
+                continue
+
+            old = by_hash.pop(file_hash(page), None)
+            if old is not None:
+                moved.append((old, page))
+
+    return moved
+
+
+def sync_dir(
+    importer: Importer,
+    manifest: Manifest,
+    path: Path,
+    book_id: int,
+    jobs: int = 1,
+    delete: bool = True,
+    parse_workers: int = 0
+) -> Iterator[Result]:
+    """
+    Apply the local changes of a directory to the book it was imported as.
+
+    Only what differs is sent: renamed subdirectories rename their chapter,
+    moved files move their page, new files are created, modified files are
+    updated, and the chapters and pages whose source was removed are
+    deleted. Unchanged files cost no request.
+
+    :param importer:
+        The Importer to use, sharing `manifest`.
+    :type importer: Importer
+    :param manifest:
+        The manifest of previous imports.
+    :type manifest: Manifest
+    :param path:
+        The path to the directory imported as the book.
+    :type path: Path
+    :param book_id:
+        The ID of the book.
+    :type book_id: int
+    :param jobs:
+        The number of concurrent requests for chapters and pages.
+    :type jobs: int
+    :param delete:
+        Whether to delete the chapters and pages whose source was removed.
+    :type delete: bool
+    :param parse_workers:
+        The number of processes parsing files, see `import_book_content`.
+    :type parse_workers: int
+
+    :yield:
+        The result of each change.
+    :rtype: Iterator[Result]
+    """
+
+    for old, chapter in find_renamed_chapters(manifest, path):
+        error, data = importer.rename_chapter(old, chapter)
+        yield Result(RENAMED, chapter, error, data)
+
+    for old, page in find_moved_pages(manifest, path):
+        importer.move_page(old, page)
+        yield Result(MOVED, page, SUCCESS, old)
+
+    yield from import_book_content(
+        importer, path, book_id, jobs, parse_workers
+    )
+
+    if not delete:
+        return
+
+    # Deleting a chapter deletes its pages, so chapters go first.
+    for kind in (CHAPTER, PAGE):
+        for old in _vanished(manifest, path, kind):
+            if manifest.get(Path(old)) is None:
+                continue
+            error, data = importer.delete(old)
+            yield Result(DELETED, Path(old), error, data)
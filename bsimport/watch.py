@@ -0,0 +1,393 @@
+"""This module keeps a directory synchronized with its book as it changes."""
+# bsimport/watch.py
+
+import os
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    from watchdog.events import (
+        EVENT_TYPE_CLOSED_NO_WRITE, EVENT_TYPE_OPENED, FileSystemEvent,
+        FileSystemEventHandler
+    )
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+from bsimport import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, SUCCESS
+from bsimport.engine import (
+    CHAPTER, PAGE, Result, Task, import_pages, list_chapters, list_pages
+)
+from bsimport.imp import Importer
+from bsimport.manifest import Manifest
+from bsimport.sync import sync_dir
+
+
+# How long changes keep coming before they are applied anyway, as a
+# multiple of the debounce delay, so a file saved every second is still
+# sent.
+MAX_DELAY_FACTOR = 10
+
+# The longest `Changes.take` waits at once, so that Ctrl-C isn't held up.
+TICK = 1.0
+
+
+def relevant(root: Path, path: Path, directory: bool) -> bool:
+    """
+    Check whether a change to `path` can change the book imported from
+    `root`: a subdirectory, imported as a chapter, or a Markdown file in
+    `root` or in a subdirectory.
+
+    :param root:
+        The directory imported as the book.
+    :type root: Path
+    :param path:
+        The path that changed.
+    :type path: Path
+    :param directory:
+        Whether `path` is, or was, a directory.
+    :type directory: bool
+
+    :return:
+        Whether the change is relevant.
+    :rtype: bool
+    """
+
+    try:
+        parts = path.relative_to(root).parts
+    except ValueError:
+        return False
+
+    if directory:
+        return len(parts) == 1
+
+    return path.suffix == '.md' and 1 <= len(parts) <= 2
+
+
+class Changes():
+    """
+    Collects the paths changed under a directory, and hands them over
+    once they settle.
+
+    Editors write a file several times per save, and a sync touching many
+    files writes them over a few seconds: changes are only handed over
+    once none came for `debounce` seconds, as a single set, each path
+    once however many times it changed.
+    """
+
+    def __init__(self, debounce: float = DEFAULT_DEBOUNCE):
+        self._debounce = debounce
+        self._max_delay = debounce * MAX_DELAY_FACTOR
+        self._condition = threading.Condition()
+        self._paths: Set[Path] = set()
+        self._first = 0.0
+        self._last = 0.0
+
+    def add(self, path: Path) -> None:
+        """
+        Record that `path` changed.
+        """
+
+        with self._condition:
+            now = time.monotonic()
+            if not self._paths:
+                self._first = now
+            self._paths.add(path)
+            self._last = now
+            self._condition.notify()
+
+    def take(self) -> Set[Path]:
+        """
+        Wait for changes to settle, and take them.
+
+        :return:
+            The paths changed, at least one.
+        :rtype: Set[Path]
+        """
+
+        with self._condition:
+            while True:
+                wait = TICK
+                if self._paths:
+                    settled = min(
+                        self._last + self._debounce,
+                        self._first + self._max_delay
+                    )
+                    wait = settled - time.monotonic()
+                    if wait <= 0:
+                        paths, self._paths = self._paths, set()
+                        return paths
+                self._condition.wait(min(wait, TICK))
+
+
+class _Handler(FileSystemEventHandler):
+    """
+    Forwards the relevant events of watchdog's observer to Changes.
+    """
+
+    def __init__(self, root: Path, changes: Changes):
+        super().__init__()
+        self._root = root
+        self._changes = changes
+
+    def on_any_event(self, event: 'FileSystemEvent') -> None:
+
+        # Reading a file, as importing it does, isn't a change.
+        if event.event_type in (EVENT_TYPE_OPENED, EVENT_TYPE_CLOSED_NO_WRITE):
+            return
+        # Nor is its directory's modification time, when it is written.
+        if event.is_directory and event.event_type == 'modified':
+            return
+
+        for raw in (event.src_path, getattr(event, 'dest_path', '')):
+            if not raw:
+                continue
+            path = Path(os.fsdecode(raw))
+            if relevant(self._root, path, event.is_directory):
+                self._changes.add(path)
+
+
+class _Poller(threading.Thread):
+    """
+    Finds the changes under a directory by comparing the modification
+    time and size of its files every `interval` seconds, where watchdog
+    isn't available.
+    """
+
+    def __init__(self, root: Path, changes: Changes, interval: float):
+        super().__init__(name="bsimport-poller", daemon=True)
+        self._root = root
+        self._changes = changes
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._state = self._snapshot()
+
+    def _snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        """
+        Get the modification time and size of the chapters and pages,
+        directories having a size of -1.
+        """
+
+        state: Dict[Path, Tuple[int, int]] = dict()
+
+        try:
+            chapters = list_chapters(self._root)
+            directories = [self._root] + chapters
+            for chapter in chapters:
+                state[chapter] = (0, -1)
+            for directory in directories:
+                for page in list_pages(directory):
+                    stat = page.stat()
+                    state[page] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            # Changed while being listed, the next round sees the rest.
+            pass
+
+        return state
+
+    def run(self) -> None:
+
+        while not self._stopped.wait(self._interval):
+            state = self._snapshot()
+            for path in state.keys() | self._state.keys():
+                if state.get(path) != self._state.get(path):
+                    self._changes.add(path)
+            self._state = state
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class Watcher():
+    """
+    Watches a directory imported as a book, with watchdog (inotify on
+    Linux) if it is installed, by polling otherwise.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        debounce: float = DEFAULT_DEBOUNCE,
+        interval: float = DEFAULT_POLL_INTERVAL,
+        polling: bool = False
+    ):
+        self._root = root
+        self._changes = Changes(debounce)
+
+        if Observer is None or polling:
+            self._observer = None
+            self._poller = _Poller(root, self._changes, interval)
+        else:
+            self._observer = Observer()
+            self._observer.schedule(
+                _Handler(root, self._changes), str(root), recursive=True
+            )
+            self._poller = None
+
+    @property
+    def backend(self) -> str:
+        """
+        The name of what finds the changes, e.g. 'InotifyObserver'.
+        """
+
+        if self._observer is None:
+            return "polling"
+        return type(self._observer).__name__
+
+    def start(self) -> 'Watcher':
+        if self._observer is not None:
+            self._observer.start()
+        else:
+            self._poller.start()
+        return self
+
+    def stop(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        else:
+            self._poller.stop()
+            self._poller.join()
+
+    def __enter__(self) -> 'Watcher':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def take(self) -> Set[Path]:
+        """
+        Wait for changes to settle and take them, see Changes.take.
+        """
+        return self._changes.take()
+
+
+def plan_changes(
+    importer: Importer,
+    root: Path,
+    book_id: int,
+    paths: Set[Path]
+) -> Tuple[Optional[List[Task]], List[Result]]:
+    """
+    Plan the import of the pages changed in a directory.
+
+    Only new and modified Markdown files in known directories can be
+    imported on their own: a removed file may have been moved, a new
+    directory renamed from another one, which only a full sync can tell.
+
+    :param importer:
+        The Importer to use.
+    :type importer: Importer
+    :param root:
+        The directory imported as the book.
+    :type root: Path
+    :param book_id:
+        The ID of the book.
+    :type book_id: int
+    :param paths:
+        The paths changed.
+    :type paths: Set[Path]
+
+    :return:
+        The tasks, None if a full sync is needed.
+    :rtype: Optional[List[Task]]
+    :return:
+        The results of the chapters looked up, failed ones.
+    :rtype: List[Result]
+    """
+
+    if any(path.is_dir() or not path.exists() for path in paths):
+        return None, []
+
+    tasks = list()
+    failed = list()
+    chapters: Dict[Path, int] = dict()
+
+    for path in sorted(paths):
+
+        directory = path.parent
+        if directory == root:
+            tasks.append(Task(PAGE, path, book_id=book_id))
+            continue
+
+        if directory not in chapters:
+            error, data = importer.import_chapter(directory, book_id)
+            if error:
+                failed.append(Result(CHAPTER, directory, error, data))
+                continue
+            chapters[directory] = data
+
+        tasks.append(Task(PAGE, path, chapter_id=chapters[directory]))
+
+    return tasks, failed
+
+
+def apply_changes(
+    importer: Importer,
+    manifest: Manifest,
+    root: Path,
+    book_id: int,
+    paths: Set[Path],
+    jobs: int = 1,
+    delete: bool = True
+) -> Iterator[Result]:
+    """
+    Apply the changes of a directory to its book: the pages of the files
+    changed are sent, or the whole directory is synchronized if files or
+    directories were removed, moved or added, see `plan_changes`.
+
+    :param importer:
+        The Importer to use, sharing `manifest`.
+    :type importer: Importer
+    :param manifest:
+        The manifest of previous imports.
+    :type manifest: Manifest
+    :param root:
+        The directory imported as the book.
+    :type root: Path
+    :param book_id:
+        The ID of the book.
+    :type book_id: int
+    :param paths:
+        The paths changed, see Watcher.take.
+    :type paths: Set[Path]
+    :param jobs:
+        The number of concurrent requests.
+    :type jobs: int
+    :param delete:
+        Whether to delete the chapters and pages whose source was removed.
+    :type delete: bool
+
+    :yield:
+        The result of each change.
+    :rtype: Iterator[Result]
+    """
+
+    tasks, failed = plan_changes(importer, root, book_id, paths)
+
+    if tasks is None:
+        yield from sync_dir(importer, manifest, root, book_id, jobs, delete)
+        return
+
+    yield from failed
+    yield from import_pages(importer, tasks, jobs)
+
+
+def retried(results: List[Result]) -> Set[Path]:
+    """
+    Get the paths to apply again with the next changes, those whose
+    result is an error.
+
+    :param results:
+        The results of the last changes.
+    :type results: List[Result]
+
+    :return:
+        The paths.
+    :rtype: Set[Path]
+    """
+    return {result.path for result in results if result.error != SUCCESS}
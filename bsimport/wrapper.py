@@ -1,13 +1,37 @@
 """This module provides an incomplete wrapper for Bookstack's API."""
 # bsimport/wrapper.py
 
+import codecs
+import gzip
+import io
+import json
+import mimetypes
+import random
+import re
 import requests
+import threading
+import time
+import uuid
 
-from typing import Any, Dict, List, NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from json.encoder import encode_basestring_ascii
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from typing import (
+    Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple, Union
+)
+from urllib3.exceptions import NewConnectionError
 
 from bsimport import (
-    DESC_TOO_LONG_ERROR, NAME_TOO_LONG_ERROR, REQUEST_ERROR, SUCCESS
+    DEFAULT_MAX_RETRIES, DEFAULT_PAGE_SIZE, DEFAULT_POOL_SIZE,
+    DESC_TOO_LONG_ERROR, FILE_READ_ERROR, NAME_TOO_LONG_ERROR,
+    REQUEST_ERROR, SUCCESS, profiling
 )
+from bsimport.limit import AdaptiveLimit
+from bsimport.parser import TextRange
+from bsimport.stats import Stats
 
 
 class BResponse(NamedTuple):
@@ -22,17 +46,1081 @@ class BResponse(NamedTuple):
     result: Any
 
 
+# Statuses worth retrying: throttling and transient server errors.
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# Statuses Bookstack answers without processing the request, so even
+# non-idempotent requests (POST) can be sent again without duplicates. A
+# 502 or a 504 comes from a proxy in front of it, which may have given up
+# on a request Bookstack went on to process: only idempotent requests are
+# retried then.
+UNPROCESSED_STATUSES = frozenset((429, 503))
+
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'))
+
+# The status of a server refusing the encoding of a compressed body. A 400
+# only counts when it names the encoding: like a 422, Bookstack answers it
+# to invalid requests, which would fail again uncompressed.
+ENCODING_REJECTED_STATUS = 415
+ENCODING_HINTS = ('encoding', 'gzip')
+
+# The gzip level of request bodies. On Markdown, it sends a fifth of the
+# bytes; level 1 is four times as fast but sends a quarter, which costs
+# more than it saves over the slow links compression is meant for.
+GZIP_LEVEL = 6
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+GZIP_HEADERS = {**JSON_HEADERS, 'Content-Encoding': 'gzip'}
+
+# The size of the chunks the text of a streamed page is read by.
+STREAM_CHUNK_SIZE = 1 << 20
+
+# The start of a page as Bookstack sends it back, its ID first.
+PAGE_ID = re.compile(rb'\s*\{\s*"id"\s*:\s*(\d+)')
+
+
+class RequestError(Exception):
+    """
+    Raised when a request fails where a BResponse can't be returned,
+    e.g. while iterating over a listing.
+    """
+
+    def __init__(self, error: int, message: Any):
+        super().__init__(message)
+        self.error = error
+        self.message = message
+
+
+class RetryPolicy():
+    """
+    Decides which failed requests are sent again and how long to wait.
+
+    Idempotent requests are retried on any retryable status or connection
+    error. POST requests are only retried when the server certainly didn't
+    process them (throttled, unavailable, connection never established),
+    so a retry can't create a duplicate book, chapter or page.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        max_retry_after: float = 300.0
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+
+    def retry_status(self, method: str, status_code: int) -> bool:
+        """
+        Whether a request that got `status_code` can be sent again.
+        """
+
+        if method.upper() in IDEMPOTENT_METHODS:
+            return status_code in RETRY_STATUSES
+        return status_code in UNPROCESSED_STATUSES
+
+    def retry_error(self, method: str, connected: bool) -> bool:
+        """
+        Whether a request that failed without a response can be sent again.
+
+        :param method:
+            The HTTP method.
+        :type method: str
+        :param connected:
+            False if the error happened while establishing the connection,
+            i.e. before anything was sent.
+        :type connected: bool
+        """
+        return method.upper() in IDEMPOTENT_METHODS or not connected
+
+    def delay(
+        self,
+        attempt: int,
+        retry_after: Optional[float] = None
+    ) -> float:
+        """
+        Get the time to wait before the next attempt.
+
+        :param attempt:
+            The number of attempts already made, minus one.
+        :type attempt: int
+        :param retry_after:
+            The delay requested by the server, if any.
+        :type retry_after: Optional[float]
+
+        :return:
+            The delay in seconds: the server's if provided, otherwise an
+            exponential backoff with full jitter.
+        :rtype: float
+        """
+
+        if retry_after is not None:
+            return min(max(retry_after, 0.0), self.max_retry_after)
+
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+
+def _encoding_rejected(status: Optional[int], body: Any) -> bool:
+    """
+    Tell whether a server refused a request for its compressed body.
+
+    :param status:
+        The status of the response.
+    :type status: Optional[int]
+    :param body:
+        The body of the response, raw or decoded JSON.
+    :type body: Any
+
+    :return:
+        True if the body should be sent again uncompressed.
+    :rtype: bool
+    """
+
+    if status == ENCODING_REJECTED_STATUS:
+        return True
+    if status != 400 or body is None:
+        return False
+
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    message = str(body).lower()
+    return any(hint in message for hint in ENCODING_HINTS)
+
+
+def _parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Read the Retry-After header, either a number of seconds or a date.
+
+    :return:
+        The number of seconds to wait, None if missing or invalid.
+    :rtype: Optional[float]
+    """
+
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return (date - datetime.now(timezone.utc)).total_seconds()
+
+
+def _is_connect_error(error: requests.RequestException) -> bool:
+    """
+    Whether the error happened before the request was sent.
+    """
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _encode_json(
+    payload: Any,
+    threshold: Optional[int] = None
+) -> Tuple[bytes, Optional[bytes]]:
+    """
+    Serialize a request body, and compress it if it's large enough.
+
+    :param payload:
+        The request body.
+    :type payload: Any
+    :param threshold:
+        The size from which the body is compressed, in bytes, None to
+        never compress it.
+    :type threshold: Optional[int]
+
+    :return:
+        The JSON body.
+    :rtype: bytes
+    :return:
+        The gzipped JSON body, None if it isn't compressed or compressing
+        it doesn't make it smaller.
+    :rtype: Optional[bytes]
+    """
+
+    # Serialized like requests does with `json=`.
+    data = json.dumps(payload, allow_nan=False).encode()
+    if threshold is None or len(data) < threshold:
+        return data, None
+
+    compressed = gzip.compress(data, GZIP_LEVEL)
+    if len(compressed) >= len(data):
+        return data, None
+
+    return data, compressed
+
+
+def _book_payload(
+    name: str,
+    description: Optional[str] = None,
+    tags: Optional[List[Dict[str, str]]] = None
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Validate the fields of a book and build the request body.
+
+    :return:
+        An error code.
+    :rtype: int
+    :return:
+        The request body if the fields are valid.
+    :rtype: Dict[str, Any]
+    """
+
+    if len(name) > 255:
+        return NAME_TOO_LONG_ERROR, {}
+    if description is not None and len(description) > 1000:
+        return DESC_TOO_LONG_ERROR, {}
+
+    book: Dict[str, Any] = {'name': name}
+
+    if description is not None:
+        book['description'] = description
+    if tags is not None:
+        book['tags'] = tags
+
+    return SUCCESS, book
+
+
+def _chapter_payload(
+    book_id: int,
+    name: str,
+    description: Optional[str] = None,
+    tags: Optional[List[Dict[str, str]]] = None
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Validate the fields of a chapter and build the request body.
+
+    :return:
+        An error code.
+    :rtype: int
+    :return:
+        The request body if the fields are valid.
+    :rtype: Dict[str, Any]
+    """
+
+    error, chapter = _book_payload(name, description, tags)
+    if error:
+        return error, {}
+
+    chapter['book_id'] = book_id
+
+    return SUCCESS, chapter
+
+
+def _page_payload(
+    name: str,
+    text: str,
+    tags: Optional[List[Dict[str, str]]] = None,
+    book_id: Optional[int] = -1,
+    chapter_id: Optional[int] = -1
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Validate the fields of a page and build the request body.
+
+    :return:
+        An error code.
+    :rtype: int
+    :return:
+        The request body if the fields are valid.
+    :rtype: Dict[str, Any]
+
+    .. note::
+        If both `book_id` and `chapter_id` are provided, `book_id`
+        takes precedence.
+    """
+
+    if len(name) > 255:
+        return NAME_TOO_LONG_ERROR, {}
+
+    page: Dict[str, Any] = {
+        'name': name,
+        'markdown': text
+    }
+
+    if book_id != -1:
+        page['book_id'] = book_id
+    else:
+        page['chapter_id'] = chapter_id
+
+    if tags is not None:
+        page['tags'] = tags
+
+    return SUCCESS, page
+
+
+def _shelf_payload(
+    name: str,
+    description: Optional[str] = None,
+    books: Optional[List[int]] = None
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Validate the fields of a shelf and build the request body.
+
+    :return:
+        An error code.
+    :rtype: int
+    :return:
+        The request body if the fields are valid.
+    :rtype: Dict[str, Any]
+    """
+
+    error, shelf = _book_payload(name, description)
+    if error:
+        return error, {}
+
+    if books is not None:
+        shelf['books'] = books
+
+    return SUCCESS, shelf
+
+
+class MultipartFile(io.RawIOBase):
+    """
+    A multipart/form-data body made of form fields and a single file.
+
+    The file is read from disk as the body is sent, so it is never loaded
+    in memory whole, and the body can be rewound with `seek(0)` to send it
+    again after a failed attempt.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, str],
+        field: str,
+        path: Path
+    ):
+        """
+        :param fields:
+            The form fields sent before the file.
+        :type fields: Dict[str, str]
+        :param field:
+            The name of the file's field.
+        :type field: str
+        :param path:
+            The path to the file.
+        :type path: Path
+
+        :raises OSError:
+            If the file can't be read.
+        """
+
+        super().__init__()
+
+        boundary = uuid.uuid4().hex
+        filename = path.name.replace('"', '%22')
+        content_type = (
+            mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        )
+
+        parts = [
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f'{value}\r\n'
+            for name, value in fields.items()
+        ]
+        parts.append(
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; '
+            f'filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        )
+
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._head = "".join(parts).encode()
+        self._tail = f'\r\n--{boundary}--\r\n'.encode()
+        self._file = path.open('rb')
+        self._size = path.stat().st_size
+        self._position = 0
+
+    def __len__(self) -> int:
+        return len(self._head) + self._size + len(self._tail)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self)
+        self._position = min(max(offset, 0), len(self))
+        return self._position
+
+    def readinto(self, buffer: Any) -> int:
+        view = memoryview(buffer).cast('B')
+        head = len(self._head)
+        end = head + self._size
+        position = self._position
+
+        if position < head:
+            count = min(len(view), head - position)
+            view[:count] = self._head[position:position + count]
+        elif position < end:
+            self._file.seek(position - head)
+            count = self._file.readinto(view[:end - position]) or 0
+            if count == 0:
+                raise OSError(f"{self._file.name} was truncated")
+        else:
+            offset = position - end
+            count = min(len(view), len(self._tail) - offset)
+            view[:count] = self._tail[offset:offset + count]
+
+        self._position += count
+        return count
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+class JsonTextBody(io.RawIOBase):
+    """
+    A JSON object body whose last field is the text of a large file.
+
+    The text is read, decoded and escaped by chunks as the body is sent,
+    so neither the text nor the body is ever in memory whole. Measuring
+    the body reads the text once beforehand, which also checks it can be
+    decoded before anything is sent. The body can be rewound with
+    `seek(0)` to send it again after a failed attempt.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, Any],
+        field: str,
+        text: TextRange
+    ):
+        """
+        :param fields:
+            The fields sent before the text.
+        :type fields: Dict[str, Any]
+        :param field:
+            The name of the text's field.
+        :type field: str
+        :param text:
+            The text.
+        :type text: TextRange
+
+        :raises OSError:
+            If the file can't be read.
+        :raises UnicodeDecodeError:
+            If the text isn't in the encoding of the file.
+        """
+
+        super().__init__()
+
+        # Serialized like requests does with `json=`, the text last.
+        head = json.dumps(fields, allow_nan=False)[:-1]
+        if fields:
+            head += ", "
+        self._head = f'{head}{json.dumps(field)}: "'.encode()
+        self._tail = b'"}'
+        self._text = text
+        self._file = text.path.open('rb')
+
+        try:
+            self._size = sum(len(chunk) for chunk in self._chunks())
+        except (OSError, UnicodeDecodeError):
+            self._file.close()
+            raise
+
+        self._position = 0
+        self._parts: Optional[Iterator[bytes]] = None
+        self._pending = memoryview(b'')
+
+    def _chunks(self) -> Iterator[bytes]:
+        """
+        Read, decode and escape the text, newlines normalized like the
+        parser does.
+        """
+
+        self._file.seek(self._text.start)
+        remaining = self._text.size
+        decoder = codecs.getincrementaldecoder(self._text.encoding)()
+        carry = ""
+
+        while True:
+            raw = self._file.read(min(STREAM_CHUNK_SIZE, remaining))
+            remaining -= len(raw)
+            final = not raw
+            chunk = carry + decoder.decode(raw, final)
+            carry = ""
+            # A '\r' ending the chunk may be the start of a '\r\n'.
+            if not final and chunk.endswith('\r'):
+                chunk, carry = chunk[:-1], '\r'
+            if '\r' in chunk:
+                chunk = chunk.replace('\r\n', '\n').replace('\r', '\n')
+            if chunk:
+                yield encode_basestring_ascii(chunk)[1:-1].encode()
+            if final:
+                return
+
+    def _body(self) -> Iterator[bytes]:
+        """
+        Generate the body, checking the text didn't change since it was
+        measured.
+        """
+
+        yield self._head
+        sent = 0
+        for chunk in self._chunks():
+            sent += len(chunk)
+            if sent > self._size:
+                break
+            yield chunk
+        if sent != self._size:
+            raise OSError(f"{self._file.name} changed while being sent")
+        yield self._tail
+
+    def __len__(self) -> int:
+        return len(self._head) + self._size + len(self._tail)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self)
+        if offset == self._position:
+            return offset
+        if offset != 0:
+            raise io.UnsupportedOperation("the body can only be rewound")
+        self._position = 0
+        self._parts = None
+        self._pending = memoryview(b'')
+        return 0
+
+    def readinto(self, buffer: Any) -> int:
+        view = memoryview(buffer).cast('B')
+
+        if self._parts is None:
+            self._parts = self._body()
+
+        while not self._pending:
+            part = next(self._parts, None)
+            if part is None:
+                return 0
+            self._pending = memoryview(part)
+
+        count = min(len(view), len(self._pending))
+        view[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        self._position += count
+        return count
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+def _to_response(
+    status_code: int,
+    body: Any,
+    key: Optional[str] = None,
+    default: Any = None
+) -> BResponse:
+    """
+    Turn the status code and JSON body of an API response into a BResponse.
+
+    :param status_code:
+        The HTTP status code.
+    :type status_code: int
+    :param body:
+        The decoded JSON body, None if it wasn't valid JSON.
+    :type body: Any
+    :param key:
+        The key of the body to return on success. If None, an empty
+        string is returned.
+    :type key: Optional[str]
+    :param default:
+        The value returned on success if `key` is missing from the body.
+    :type default: Any
+
+    :return:
+        The BResponse.
+    :rtype: BResponse
+    """
+
+    if 200 <= status_code < 300:
+        if key is None:
+            return BResponse(SUCCESS, "")
+        if not isinstance(body, dict):
+            return BResponse(REQUEST_ERROR, "unexpected response body")
+        return BResponse(SUCCESS, body.get(key, default))
+
+    if isinstance(body, dict) and 'error' in body:
+        return BResponse(REQUEST_ERROR, body['error'])
+    else:
+        return BResponse(REQUEST_ERROR, f"HTTP status {status_code}")
+
+
+def _page_id(head: bytes) -> Optional[Dict[str, int]]:
+    """
+    Find the ID at the start of a page sent back by Bookstack.
+
+    The page comes back with its text, as large as the one sent: for a
+    streamed page, only the start of the response is decoded.
+
+    :param head:
+        The start of the response body.
+    :type head: bytes
+
+    :return:
+        The body to give `_to_response`, None if the ID isn't there.
+    :rtype: Optional[Dict[str, int]]
+    """
+
+    match = PAGE_ID.match(head)
+    return None if match is None else {'id': int(match.group(1))}
+
+
+def _read_page(response: requests.Response) -> Any:
+    """
+    Decode the body of the response to a streamed page, see `_page_id`,
+    holding at most a chunk of it in memory.
+    """
+
+    with response:
+        if not 200 <= response.status_code < 300:
+            raw = response.content
+        else:
+            chunks = response.iter_content(STREAM_CHUNK_SIZE)
+            head = next(chunks, b"")
+            body = _page_id(head)
+            if body is not None:
+                # Read to the end, so the connection is reused.
+                for _ in chunks:
+                    pass
+                return body
+            raw = head + b"".join(chunks)
+
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
 class Bookstack():
     """
+    A client for Bookstack's API.
+
+    Every request goes through a single pooled session: connections, and
+    their TLS sessions, are kept alive and reused between calls instead of
+    being opened for each request.
     """
 
-    def __init__(self, id: str, secret: str, url: str):
+    def __init__(
+        self,
+        id: str,
+        secret: str,
+        url: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        retry: Optional[RetryPolicy] = None,
+        stats: Optional[Stats] = None,
+        compress_threshold: Optional[int] = None,
+        limit: Optional[AdaptiveLimit] = None
+    ):
+        """
+        :param id:
+            The ID of the API token.
+        :type id: str
+        :param secret:
+            The secret of the API token.
+        :type secret: str
+        :param url:
+            The URL of the Bookstack instance.
+        :type url: str
+        :param pool_size:
+            The maximum number of connections kept alive.
+        :type pool_size: int
+        :param retry:
+            Decides which failed requests are sent again.
+        :type retry: Optional[RetryPolicy]
+        :param stats:
+            Records every request attempt, if provided.
+        :type stats: Optional[Stats]
+        :param compress_threshold:
+            The size from which JSON bodies are sent gzipped, in bytes,
+            None to never compress them. If the server rejects a
+            compressed body, it is sent again as is and compression is
+            turned off for the rest of the session.
+        :type compress_threshold: Optional[int]
+        :param limit:
+            Limits the number of pages sent at once, if provided.
+        :type limit: Optional[AdaptiveLimit]
+        """
+
         self._header = {
             'Authorization': f"Token {id}:{secret}"
         }
+        self._instance_url = url
         self._url = f"{url}/api"
+        self._stats = stats
+
+        self._compress_threshold = compress_threshold
+        self._compress_lock = threading.Lock()
+        self._compression = {
+            'compressed': 0,
+            'raw_bytes': 0,
+            'bytes_saved': 0,
+            'rejected': False
+        }
+
+        self._retry = retry if retry is not None else RetryPolicy()
+        self._retry_lock = threading.Lock()
+        self._retries = 0
+        self._backoff = 0.0
+        self._limit = limit
+
+        # Block instead of opening throwaway connections when every pooled
+        # connection is in use, so concurrent callers keep reusing the pool.
+        self._adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=True
+        )
+        self._session = requests.Session()
+        self._session.headers.update(self._header)
+        self._session.mount('http://', self._adapter)
+        self._session.mount('https://', self._adapter)
+
+    def __enter__(self) -> 'Bookstack':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the session and every pooled connection.
+        """
+        self._session.close()
+
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        Get the connection reuse statistics of the pool.
+
+        :return:
+            The number of requests sent, connections opened and requests
+            that reused an already open connection.
+        :rtype: Dict[str, int]
+        """
+
+        requests_sent = 0
+        connections = 0
+
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+
+        return {
+            'requests': requests_sent,
+            'connections': connections,
+            'reused': max(requests_sent - connections, 0)
+        }
+
+    def retry_stats(self) -> Dict[str, float]:
+        """
+        Get the retry statistics of the client.
+
+        :return:
+            The number of retried requests and the total time spent
+            waiting between attempts, in seconds.
+        :rtype: Dict[str, float]
+        """
+
+        with self._retry_lock:
+            return {
+                'retries': self._retries,
+                'backoff': self._backoff
+            }
+
+    def compression_stats(self) -> Dict[str, int]:
+        """
+        Get the compression statistics of the client.
+
+        :return:
+            The number of request bodies sent gzipped, their size before
+            compression and the bytes compression saved, in bytes, and
+            whether the server rejected compressed bodies.
+        :rtype: Dict[str, int]
+        """
+
+        with self._compress_lock:
+            return dict(self._compression)
+
+    def _record_compression(
+        self,
+        raw: int,
+        sent: Optional[int] = None
+    ) -> None:
+        """
+        Record a compressed body the server accepted, or, without `sent`,
+        that the server rejected one.
+        """
+
+        with self._compress_lock:
+            if sent is None:
+                self._compression['rejected'] = True
+                return
+            self._compression['compressed'] += 1
+            self._compression['raw_bytes'] += raw
+            self._compression['bytes_saved'] += raw - sent
+
+    def _wait(self, delay: float) -> None:
+        """
+        Wait before retrying a request and record it.
+        """
+
+        with self._retry_lock:
+            self._retries += 1
+            self._backoff += delay
+
+        time.sleep(delay)
+
+    def _record_request(
+        self,
+        method: str,
+        path: str,
+        status: Optional[int],
+        start: float,
+        body: Union[bytes, str, None] = None
+    ) -> None:
+        """
+        Record the timing of a request attempt, if stats are collected.
+        """
+
+        if self._stats is None:
+            return
+
+        self._stats.record_request(
+            method, path, status, time.perf_counter() - start,
+            len(body) if body else 0
+        )
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        limited: bool = False,
+        **kwargs: Any
+    ) -> requests.Response:
+        """
+        Send a request, retrying it according to the retry policy.
+
+        :param method:
+            The HTTP method.
+        :type method: str
+        :param path:
+            The path of the endpoint, relative to the API's URL.
+        :type path: str
+        :param limited:
+            Whether each attempt waits for the concurrency limit, if any.
+        :type limited: bool
+        :param kwargs:
+            Passed to `requests.Session.request`.
+
+        :raises requests.RequestException:
+            If the request can't be sent after every attempt.
+
+        :return:
+            The last response.
+        :rtype: requests.Response
+        """
+
+        url = f"{self._url}/{path}"
+        attempt = 0
+        limit = self._limit if limited else None
+
+        body = kwargs.get('data')
+
+        while True:
+            # A streamed body is sent again from its start.
+            if isinstance(body, io.IOBase):
+                body.seek(0)
+            if limit is not None:
+                limit.acquire()
+            start = time.perf_counter()
+            try:
+                response = self._session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                self._record_request(method, path, None, start)
+                if limit is not None:
+                    limit.release(None, True)
+                retry = self._retry.retry_error(
+                    method, not _is_connect_error(e)
+                )
+                if attempt >= self._retry.max_retries or not retry:
+                    raise
+                delay = self._retry.delay(attempt)
+            else:
+                self._record_request(
+                    method, path, response.status_code, start,
+                    response.request.body
+                )
+                if limit is not None:
+                    limit.release(
+                        time.perf_counter() - start,
+                        response.status_code in RETRY_STATUSES
+                    )
+                retry = self._retry.retry_status(method, response.status_code)
+                if attempt >= self._retry.max_retries or not retry:
+                    return response
+                delay = self._retry.delay(
+                    attempt, _parse_retry_after(response.headers)
+                )
+                response.close()
+
+            self._wait(delay)
+            attempt += 1
+
+    def _call(
+        self,
+        method: str,
+        path: str,
+        key: Optional[str] = None,
+        default: Any = None,
+        **kwargs: Any
+    ) -> BResponse:
+        """
+        Send a request and turn its response into a BResponse.
+
+        See `_request`, `_send_json` and `_to_response`.
+        """
+
+        try:
+            if 'json' in kwargs and self._compress_threshold is not None:
+                response = self._send_json(
+                    method, path, kwargs.pop('json'), **kwargs
+                )
+            else:
+                response = self._request(method, path, **kwargs)
+        except requests.RequestException as e:
+            return BResponse(REQUEST_ERROR, str(e))
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+
+        return _to_response(response.status_code, body, key, default)
+
+    def _send_json(
+        self,
+        method: str,
+        path: str,
+        payload: Any,
+        **kwargs: Any
+    ) -> requests.Response:
+        """
+        Send a JSON body, gzipped if it's large enough.
+
+        A compressed body the server rejects is sent again as is. If that
+        one goes through, the server can't read compressed bodies and the
+        next ones are sent as is.
+
+        See `_request`.
+        """
+
+        with self._compress_lock:
+            threshold = None if self._compression['rejected'] \
+                else self._compress_threshold
+
+        data, compressed = _encode_json(payload, threshold)
+
+        if compressed is not None:
+            response = self._request(
+                method, path, data=compressed, headers=GZIP_HEADERS, **kwargs
+            )
+            if not _encoding_rejected(response.status_code, response.content):
+                self._record_compression(len(data), len(compressed))
+                return response
+            response.close()
 
-    def _create_shelf(
+        response = self._request(
+            method, path, data=data, headers=JSON_HEADERS, **kwargs
+        )
+        if compressed is not None and not _encoding_rejected(
+            response.status_code, response.content
+        ):
+            self._record_compression(len(data))
+
+        return response
+
+    def _send_page(
+        self,
+        method: str,
+        path: str,
+        page: Dict[str, Any]
+    ) -> BResponse:
+        """
+        Send the body of a page, streaming its text if it's a TextRange.
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The page ID if successful, an error message otherwise.
+        :rtype: Union[int, str]
+        """
+
+        fields = dict(page)
+        text = fields.pop('markdown')
+        if not isinstance(text, TextRange):
+            return self._call(
+                method, path, 'id', -1, limited=True, json=page
+            )
+
+        try:
+            with JsonTextBody(fields, 'markdown', text) as body:
+                response = self._request(
+                    method, path, limited=True, data=body,
+                    headers=JSON_HEADERS, stream=True
+                )
+                data = _read_page(response)
+        except requests.RequestException as e:
+            return BResponse(REQUEST_ERROR, str(e))
+        except (OSError, UnicodeDecodeError) as e:
+            return BResponse(FILE_READ_ERROR, str(e))
+
+        return _to_response(response.status_code, data, 'id', -1)
+
+    def create_shelf(
         self,
         name: str,
         description: Optional[str] = None,
@@ -48,33 +1136,22 @@ class Bookstack():
             The description (1000 characters max).
         :type description: Optional[str]
         :param books:
-            A list of books to add to the shelf.
+            The IDs of the books on the shelf, in order.
         :type books: Optional[List[int]]
 
         :return:
-            [description]
-        :rtype: BResponse
+            An error code.
+        :rtype: int
+        :return:
+            The shelf ID if successful, an error message otherwise.
+        :rtype: Union[int, str]
         """
 
-        if len(name) > 255:
-            pass
-        if description is not None and len(description) > 1000:
-            pass
+        error, shelf = _shelf_payload(name, description, books)
+        if error:
+            return BResponse(error, "")
 
-        url = f"{self._url}/shelves"
-        shelf = {'name': name}
-
-        if description is not None:
-            shelf['description'] = description
-        if books is not None:
-            shelf['books'] = books
-
-        response = requests.post(url, json=shelf, headers=self._header)
-
-        if response.status_code == requests.codes.ok:
-            pass
-        else:
-            pass
+        return self._call('POST', 'shelves', 'id', -1, json=shelf)
 
     def create_book(
         self,
@@ -104,27 +1181,11 @@ class Bookstack():
         :rtype: Union[int, str]
         """
 
-        if len(name) > 255:
-            return BResponse(NAME_TOO_LONG_ERROR, "")
-        if description is not None and len(description) > 1000:
-            return BResponse(DESC_TOO_LONG_ERROR, "")
+        error, book = _book_payload(name, description, tags)
+        if error:
+            return BResponse(error, "")
 
-        url = f"{self._url}/books"
-        book = {'name': name}
-
-        if description is not None:
-            book['description'] = description
-        if tags is not None:
-            book['tags'] = tags
-
-        response = requests.post(url, json=book, headers=self._header)
-
-        j = response.json()
-        if response.status_code == requests.codes.ok:
-            id = j.get('id', -1)
-            return BResponse(SUCCESS, id)
-        else:
-            return BResponse(REQUEST_ERROR, j['error'])
+        return self._call('POST', 'books', 'id', -1, json=book)
 
     def create_chapter(
         self,
@@ -134,103 +1195,501 @@ class Bookstack():
         tags: Optional[List[Dict[str, str]]] = None
     ) -> BResponse:
 
-        if len(name) > 255:
-            return BResponse(NAME_TOO_LONG_ERROR, "")
+        error, chapter = _chapter_payload(book_id, name, description, tags)
+        if error:
+            return BResponse(error, "")
 
-        if description is not None and len(description) > 1000:
-            return BResponse(DESC_TOO_LONG_ERROR, "")
+        return self._call('POST', 'chapters', 'id', -1, json=chapter)
 
-        url = f"{self._url}/chapters"
-        chapter = {
-            'book_id': book_id,
-            'name': name
-        }
+    def create_page(
+        self,
+        name: str,
+        text: Union[str, TextRange],
+        tags: Optional[List[Dict[str, str]]] = None,
+        book_id: Optional[int] = -1,
+        chapter_id: Optional[int] = -1
+    ) -> BResponse:
+        """
+        Create a page.
+
+        :param name:
+            The name (max 255 characters).
+        :type name: str
+        :param text:
+            The Markdown content, or the text of a large file to stream
+            from disk.
+        :type text: Union[str, TextRange]
+        :param tags:
+            A list of tags.
+        :type tags: Optional[List[Dict[str, str]]]
+
+        :param book_id:
+            The ID of the book. Required without `chapter_id`.
+        :type book_id: Optional[int]
+        :param chapter_id:
+            The ID of the chapter. Required without `book_id`.
+        :type chapter_id: Optional[int]
 
-        if description is not None:
-            chapter['description'] = description
-        if tags is not None:
-            chapter['tags'] = tags
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The page ID if successful, an error message otherwise.
+        :rtype: Union[int, str]
+        """
 
-        response = requests.post(url, json=chapter, headers=self._header)
+        error, page = _page_payload(name, text, tags, book_id, chapter_id)
+        if error:
+            return BResponse(error, "")
 
-        j = response.json()
-        if response.status_code == requests.codes.ok:
-            id = j.get('id', -1)
-            return BResponse(SUCCESS, id)
-        else:
-            return BResponse(REQUEST_ERROR, j['error'])
+        return self._send_page('POST', 'pages', page)
 
-    def create_page(
+    def update_page(
         self,
+        page_id: int,
         name: str,
-        text: str,
+        text: Union[str, TextRange],
         tags: Optional[List[Dict[str, str]]] = None,
         book_id: Optional[int] = -1,
         chapter_id: Optional[int] = -1
-    ):
+    ) -> BResponse:
+        """
+        Update the name, content and tags of a page, and move it if
+        a book or chapter is provided.
 
-        if len(name) > 255:
-            return BResponse(NAME_TOO_LONG_ERROR, "")
+        :param page_id:
+            The ID of the page.
+        :type page_id: int
+        :param name:
+            The name (max 255 characters).
+        :type name: str
+        :param text:
+            The Markdown content, or the text of a large file to stream
+            from disk.
+        :type text: Union[str, TextRange]
+        :param tags:
+            A list of tags, replacing the current ones.
+        :type tags: Optional[List[Dict[str, str]]]
 
-        url = f"{self._url}/pages"
-        page = {
-            'name': name,
-            'markdown': text
-        }
+        :param book_id:
+            The ID of the book to move the page to.
+        :type book_id: Optional[int]
+        :param chapter_id:
+            The ID of the chapter to move the page to.
+        :type chapter_id: Optional[int]
 
-        if book_id != -1:
-            page['book_id'] = book_id
-        else:
-            page['chapter_id'] = chapter_id
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The page ID if successful, an error message otherwise.
+        :rtype: Union[int, str]
+        """
 
-        if tags is not None:
-            page['tags'] = tags
+        error, page = _page_payload(name, text, tags, book_id, chapter_id)
+        if error:
+            return BResponse(error, "")
 
-        response = requests.post(url, json=page, headers=self._header)
+        if page.get('chapter_id') == -1:
+            del page['chapter_id']
 
-        if response.status_code == requests.codes.ok:
-            return BResponse(SUCCESS, "")
-        else:
-            return BResponse(REQUEST_ERROR, response.json()['error'])
+        return self._send_page('PUT', f"pages/{page_id}", page)
 
-    def _update_shelf(
+    def delete_page(self, page_id: int) -> BResponse:
+        """
+        Delete a page, sending it to the recycle bin.
+
+        :param page_id:
+            The ID of the page.
+        :type page_id: int
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            An empty string if successful, an error message otherwise.
+        :rtype: str
+        """
+        return self._call('DELETE', f"pages/{page_id}")
+
+    def update_chapter(
         self,
-        id: int,
+        chapter_id: int,
+        name: str,
+        description: Optional[str] = None,
+        tags: Optional[List[Dict[str, str]]] = None
+    ) -> BResponse:
+        """
+        Update the name, description and tags of a chapter.
+
+        :param chapter_id:
+            The ID of the chapter.
+        :type chapter_id: int
+        :param name:
+            The name (max 255 characters).
+        :type name: str
+        :param description:
+            The description (max 1000 characters).
+        :type description: Optional[str]
+        :param tags:
+            A list of tags, replacing the current ones.
+        :type tags: Optional[List[Dict[str, str]]]
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The chapter ID if successful, an error message otherwise.
+        :rtype: Union[int, str]
+        """
+
+        error, chapter = _book_payload(name, description, tags)
+        if error:
+            return BResponse(error, "")
+
+        return self._call(
+            'PUT', f"chapters/{chapter_id}", 'id', -1, json=chapter
+        )
+
+    def delete_chapter(self, chapter_id: int) -> BResponse:
+        """
+        Delete a chapter and its pages, sending them to the recycle bin.
+
+        :param chapter_id:
+            The ID of the chapter.
+        :type chapter_id: int
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            An empty string if successful, an error message otherwise.
+        :rtype: str
+        """
+        return self._call('DELETE', f"chapters/{chapter_id}")
+
+    def _read(self, path: str) -> BResponse:
+        """
+        Get an item, e.g. 'books/3', as Bookstack sends it.
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The item if successful, an error message otherwise.
+        :rtype: Union[Dict[str, Any], str]
+        """
+
+        try:
+            response = self._request('GET', path)
+        except requests.RequestException as e:
+            return BResponse(REQUEST_ERROR, str(e))
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+
+        if not 200 <= response.status_code < 300:
+            return _to_response(response.status_code, body)
+        if not isinstance(body, dict):
+            return BResponse(REQUEST_ERROR, "unexpected response body")
+
+        return BResponse(SUCCESS, body)
+
+    def read_book(self, book_id: int) -> BResponse:
+        """
+        Get a book, with the list of its chapters and pages.
+
+        See `_read`.
+        """
+        return self._read(f"books/{book_id}")
+
+    def read_page(self, page_id: int) -> BResponse:
+        """
+        Get a page, with its name, Markdown, HTML and tags.
+
+        See `_read`.
+        """
+        return self._read(f"pages/{page_id}")
+
+    def update_shelf(
+        self,
+        shelf_id: int,
         books: List[int]
     ) -> BResponse:
         """
-        Updated the shelf.
+        Set the books of a shelf, replacing the current ones.
 
-        :param id:
+        :param shelf_id:
             The ID of the shelf.
-        :type id: int
+        :type shelf_id: int
         :param books:
-            The list of books to add.
+            The IDs of the books on the shelf, in order.
         :type books: List[int]
 
         :return:
-            [description]
-        :rtype: BResponse
+            An error code.
+        :rtype: int
+        :return:
+            The shelf ID if successful, an error message otherwise.
+        :rtype: Union[int, str]
         """
+        return self._call(
+            'PUT', f"shelves/{shelf_id}", 'id', -1, json={'books': books}
+        )
 
-        url = f"{self._url}/shelves/{id}"
-        data = {'books': books}
+    def upload_image(self, path: Path, page_id: int) -> BResponse:
+        """
+        Upload an image to the gallery, streaming it from disk.
 
-        response = requests.post(url, data=data, headers=self._header)
+        :param path:
+            The path to the image, a PNG, JPEG, GIF or WEBP file.
+        :type path: Path
+        :param page_id:
+            The ID of the page the image is uploaded to.
+        :type page_id: int
 
-        if response.status_code == requests.codes.ok:
-            pass
-        else:
-            pass
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The URL of the image if successful, an error message otherwise.
+        :rtype: str
+        """
 
-    def list_books(self):
+        fields = {
+            'type': 'gallery',
+            'uploaded_to': str(page_id),
+            'name': path.name
+        }
+
+        try:
+            with MultipartFile(fields, 'image', path) as body:
+                return self._call(
+                    'POST', 'image-gallery', 'url', "",
+                    data=body, headers={'Content-Type': body.content_type}
+                )
+        except OSError as e:
+            return BResponse(FILE_READ_ERROR, str(e))
 
-        url = f"{self._url}/books"
+    def upload_attachment(self, path: Path, page_id: int) -> BResponse:
+        """
+        Upload a file as an attachment of a page, streaming it from disk.
 
-        response = requests.get(url, headers=self._header)
+        :param path:
+            The path to the file.
+        :type path: Path
+        :param page_id:
+            The ID of the page the file is attached to.
+        :type page_id: int
 
-        j = response.json()
-        if response.status_code == requests.codes.ok:
-            return BResponse(SUCCESS, j.get('data', []))
-        else:
-            return BResponse(REQUEST_ERROR, j['error'])
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The URL of the attachment if successful, an error message
+            otherwise.
+        :rtype: str
+        """
+
+        fields = {
+            'name': path.name,
+            'uploaded_to': str(page_id)
+        }
+
+        try:
+            with MultipartFile(fields, 'file', path) as body:
+                error, data = self._call(
+                    'POST', 'attachments', 'id', -1,
+                    data=body, headers={'Content-Type': body.content_type}
+                )
+        except OSError as e:
+            return BResponse(FILE_READ_ERROR, str(e))
+
+        if error:
+            return BResponse(error, data)
+
+        return BResponse(SUCCESS, f"{self._instance_url}/attachments/{data}")
+
+    def page_url(self, page_id: int) -> str:
+        """
+        Get the permanent URL of a page, which stays valid when the page is
+        renamed or moved, without any request.
+
+        :param page_id:
+            The ID of the page.
+        :type page_id: int
+
+        :return:
+            The URL.
+        :rtype: str
+        """
+        return f"{self._instance_url}/link/{page_id}"
+
+    def _list_page(
+        self,
+        path: str,
+        offset: int,
+        count: int,
+        params: Optional[Dict[str, Any]] = None
+    ) -> BResponse:
+        """
+        Get one page of a listing endpoint.
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            The items and the total number of items if successful,
+            an error message otherwise.
+        :rtype: Union[Tuple[List[Dict[str, Any]], int], str]
+        """
+
+        query: Dict[str, Any] = {'count': count, 'offset': offset}
+        if params is not None:
+            query.update(params)
+
+        error, body = self._call('GET', path, 'data', [], params=query)
+        if error:
+            return BResponse(error, body)
+
+        return BResponse(SUCCESS, body)
+
+    def _iter_list(
+        self,
+        path: str,
+        first: List[Dict[str, Any]],
+        count: int,
+        prefetch: bool,
+        params: Optional[Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the items of a listing endpoint, fetching the next page only
+        once the current one is consumed, or while it is if `prefetch`.
+
+        :raises RequestError:
+            If fetching a page fails.
+        """
+
+        data = first
+        offset = 0
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+        try:
+            while True:
+
+                # A short page is the last one.
+                last = len(data) < count
+                offset += count
+
+                if executor is not None and not last:
+                    future = executor.submit(
+                        profiling.wrap(self._list_page),
+                        path, offset, count, params
+                    )
+
+                yield from data
+
+                if last:
+                    return
+
+                if executor is not None:
+                    error, data = future.result()
+                else:
+                    error, data = self._list_page(path, offset, count, params)
+
+                if error:
+                    raise RequestError(error, data)
+
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+    def list_all(
+        self,
+        path: str,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = False,
+        params: Optional[Dict[str, Any]] = None
+    ) -> BResponse:
+        """
+        List every item of a listing endpoint, e.g. 'books', page by page.
+
+        The first page is fetched right away so that errors are returned
+        as usual, the next ones are fetched lazily as the items are
+        consumed.
+
+        :param path:
+            The path of the endpoint, relative to the API's URL.
+        :type path: str
+        :param count:
+            The number of items per request (max 500).
+        :type count: int
+        :param prefetch:
+            Whether to fetch the next page while the current one is being
+            consumed.
+        :type prefetch: bool
+        :param params:
+            Additional query parameters, e.g. filters.
+        :type params: Optional[Dict[str, Any]]
+
+        :return:
+            An error code.
+        :rtype: int
+        :return:
+            If successful, an iterator over the items which raises a
+            RequestError if a later page fails, the error message otherwise.
+        :rtype: Union[Iterator[Dict[str, Any]], str]
+        """
+
+        error, first = self._list_page(path, 0, count, params)
+        if error:
+            return BResponse(error, first)
+
+        return BResponse(
+            SUCCESS, self._iter_list(path, first, count, prefetch, params)
+        )
+
+    def list_books(
+        self,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = False
+    ) -> BResponse:
+        """
+        List every accessible book.
+
+        See `list_all`.
+        """
+        return self.list_all('books', count, prefetch)
+
+    def list_chapters(
+        self,
+        book_id: int,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = False
+    ) -> BResponse:
+        """
+        List every chapter of a book.
+
+        See `list_all`.
+        """
+        return self.list_all(
+            'chapters', count, prefetch, {'filter[book_id]': book_id}
+        )
+
+    def list_pages(
+        self,
+        book_id: int,
+        count: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = False
+    ) -> BResponse:
+        """
+        List every page of a book, those in its chapters included, without
+        their content.
+
+        See `list_all`.
+        """
+        return self.list_all(
+            'pages', count, prefetch, {'filter[book_id]': book_id}
+        )
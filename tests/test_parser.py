@@ -0,0 +1,298 @@
+"""This module tests the Markdown parser against the original one."""
+# tests/test_parser.py
+
+import random
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+from bsimport import parser
+from bsimport.parser import TextRange
+
+
+def legacy_front_matter(
+    content: List[str]
+) -> Tuple[List[Dict[str, str]], int]:
+    """
+    The front matter parser the single-pass one replaced, unchanged.
+    """
+
+    tags = list()
+    end = -1
+
+    if not content[0].startswith('---'):
+        return tags, end
+
+    tmp = []
+
+    for count, line in enumerate(content[1:]):
+        if line.startswith('---'):
+            end = count + 1
+            break
+
+        lc = line.split(':')
+
+        if len(lc) == 1:
+            continue
+        if lc[0] != 'tags':
+            continue
+
+        tmp = lc[1]
+        tmp = tmp.rstrip().lstrip()
+        tmp = tmp.rstrip(']')
+        tmp = tmp.lstrip('[')
+        tmp = tmp.split(', ')
+
+    for tag in tmp:
+        tags.append({'name': tag})
+
+    return tags, end
+
+
+def legacy_parse(
+    file_path: Path
+) -> Optional[Tuple[str, str, List[Dict[str, str]]]]:
+    """
+    The line-based parser the single-pass one replaced, unchanged but for
+    returning None for an empty file and reading UTF-8, see `utf8`.
+    """
+
+    with file_path.open('r', encoding='utf-8') as file:
+        content = file.readlines()
+
+    if len(content) == 0:
+        return None
+
+    tags, end = legacy_front_matter(content)
+    start = 0 if (end == -1) else (end + 1)
+
+    text_start = -1
+    name = ""
+    for count, line in enumerate(content[start:]):
+        if line.startswith('# '):
+            name = line.rstrip()
+            name = name.lstrip('# ')
+        if line.startswith('## ') and text_start == -1:
+            text_start = count + start
+            break
+
+    text = ''.join(content[text_start:])
+
+    return name, text, tags
+
+
+def parse(file_path: Path) -> Optional[Tuple[str, str, List[Dict[str, str]]]]:
+    """
+    Parse a file with `parser.parse_file`, without the aliases the legacy
+    parser doesn't know.
+    """
+
+    parsed = parser.parse_file(file_path)
+    return None if parsed is None else parsed[:3]
+
+
+CASES = {
+    'empty': "",
+    'front matter': (
+        "---\ntitle: A page\ntags: [one, two]\n---\n"
+        "# The title\nintro\n## Section\ntext\n"
+    ),
+    'front matter unclosed': (
+        "---\ntags: [one, two]\n# The title\nintro\n## Section\ntext\n"
+    ),
+    'front matter unclosed without text': "---\ntags: [one]\nmore: 1\n",
+    'front matter only': "---\ntags: [one, two]\n---\n",
+    'front matter only unterminated': "---\ntags: [one, two]\n---",
+    'front matter opening only': "---\n",
+    'front matter last tags win': (
+        "---\ntags: [one]\ntags: [two, three]\n---\n## Text\n"
+    ),
+    'front matter tags with colon': "---\ntags: a: b\n---\n## Text\n",
+    'front matter empty tags': "---\ntags:\n---\n## Text\n",
+    'title only': "# The title",
+    'no h2': "# The title\nfirst\nsecond\nlast\n",
+    'no h2 no newline': "# The title\nfirst\nlast",
+    'h2 first': "## Section\n# Not a title\ntext\n",
+    'last h1 wins': "# One\n# Two\n## Section\n# Three\n",
+    'h1 after h2': "intro\n## Section\n# After\n",
+    'headers without space': "#Title\n##Section\ntext\n",
+    'bom': "\ufeff# The title\n## Section\ntext\n",
+    'bom front matter': "\ufeff---\ntags: [one]\n---\n## Section\n",
+    'crlf': (
+        "---\r\ntags: [one, two]\r\n---\r\n"
+        "# The title\r\nintro\r\n## Section\r\ntext\r\n"
+    ),
+    'crlf no h2': "# The title\r\nfirst\r\nlast\r\n",
+    'lone cr': "---\rtags: [one]\r---\r# The title\r## Section\rtext\r",
+    'mixed newlines': "# The title\r\nintro\n## Section\r\ntext\rend\n",
+    'unicode': "---\ntags: [été, 日本]\n---\n# Größe\n## Ça va\nnaïve\n",
+}
+
+
+def write(tmp_path: Path, content: str, name: str = "page.md") -> Path:
+    """
+    Write a Markdown file in UTF-8, newlines as given.
+    """
+
+    path = tmp_path / name
+    path.write_bytes(content.encode('utf-8'))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def utf8(monkeypatch):
+    # The parser reads files in the locale's encoding, whatever it is here.
+    monkeypatch.setattr(
+        parser.locale, 'getpreferredencoding', lambda *args: 'UTF-8'
+    )
+
+
+@pytest.mark.parametrize('content', CASES.values(), ids=CASES.keys())
+def test_parse_file_matches_legacy(tmp_path, content):
+    path = write(tmp_path, content)
+
+    assert parse(path) == legacy_parse(path)
+
+
+def test_parse_file_empty(tmp_path):
+    assert parser.parse_file(write(tmp_path, "")) is None
+
+
+def test_parse_file_aliases(tmp_path):
+    path = write(tmp_path, "---\naliases: [one, two]\n---\n## Text\n")
+
+    assert parser.parse_file(path)[3] == ['one', 'two']
+
+
+def test_parse_file_mmap_matches_legacy(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, 'MMAP_THRESHOLD', 0)
+
+    for name, content in CASES.items():
+        path = write(tmp_path, content, f"{len(content)}.md")
+        assert parse(path) == legacy_parse(path), name
+
+
+LINES = (
+    "---", "---\r", "--- x", "tags: [a, b]", "tags: c", "tags:", "tags",
+    "aliases: [x]", "title: t", "# Title", "# ", "#Title", "## Section",
+    "##", "### Sub", "text", "", " # not", "\ufeff# bom", "```", "~~~",
+)
+
+
+def random_content(rng: random.Random) -> str:
+    """
+    Draw a Markdown file out of lines that matter to the parsers.
+    """
+
+    lines = [rng.choice(LINES) for _ in range(rng.randint(1, 12))]
+    newline = rng.choice(("\n", "\r\n", "\r"))
+    return newline.join(lines) + rng.choice((newline, ""))
+
+
+def test_parse_file_matches_legacy_random(tmp_path):
+    rng = random.Random(20230809)
+
+    for _ in range(2000):
+        content = random_content(rng)
+        path = write(tmp_path, content)
+        assert parse(path) == legacy_parse(path), repr(content)
+
+
+@pytest.mark.parametrize(
+    'content',
+    [content for content in CASES.values() if content and '\r' not in content]
+    + [CASES['crlf'], CASES['crlf no h2'], "# Title\r\nintro\n## A\r\nb\n"],
+)
+def test_parse_large_matches_parse_file(tmp_path, content):
+    path = write(tmp_path, content)
+
+    name, text, tags, aliases = parser.parse_large(path)
+
+    assert isinstance(text, TextRange)
+    assert text.end == path.stat().st_size
+    assert (name, parser.read_text(text), tags, aliases) \
+        == parser.parse_file(path)
+
+
+@pytest.mark.parametrize('content', ["", CASES['lone cr'], "a\r\nb\rc"])
+def test_parse_large_leaves_to_parse_file(tmp_path, content):
+    assert parser.parse_large(write(tmp_path, content)) is None
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7])
+def test_parse_large_lone_cr_across_chunks(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(parser, 'SCAN_CHUNK_SIZE', chunk_size)
+
+    # A '\r\n' cut by the end of a chunk is not a lone '\r'.
+    crlf = write(tmp_path, "ab\r\ncd\r\nef\r\n", "crlf.md")
+    assert parser.parse_large(crlf) is not None
+
+    for content in ("ab\r\ncd\r", "ab\rcd\r\n", "\rabc"):
+        path = write(tmp_path, content, "cr.md")
+        assert parser.parse_large(path) is None, repr(content)
+
+
+def sections(count: int, size: int) -> str:
+    """
+    Write a text of `count` sections of about `size` bytes, some of them
+    holding a fenced code block with lines starting with '#'.
+    """
+
+    parts = list()
+    for i in range(count):
+        body = "x" * (size - 20)
+        if i % 3 == 1:
+            body = f"```\n# not a heading {i}\n```\n" + body
+        parts.append(f"## Section {i}\n{body}\n")
+    return "".join(parts)
+
+
+@pytest.mark.parametrize('chunk_size', [5, 64, 1 << 20])
+@pytest.mark.parametrize('size', [1, 100, 250, 1000, 10 ** 6])
+def test_split_range_matches_split_points(
+    tmp_path, monkeypatch, chunk_size, size
+):
+    monkeypatch.setattr(parser, 'SCAN_CHUNK_SIZE', chunk_size)
+    text = sections(12, 100)
+    path = write(tmp_path, "# Title\n" + text)
+
+    _, whole, _, _ = parser.parse_large(path)
+    parts = parser.split_range(whole, size)
+
+    assert parser.read_text(whole) == text
+    assert [part.start - whole.start for part in parts] \
+        == parser.split_points(text, size)
+    assert parts[0].start == whole.start
+    assert parts[-1].end == whole.end
+    assert all(
+        part.end == following.start
+        for part, following in zip(parts, parts[1:])
+    )
+    assert "".join(parser.read_text(part) for part in parts) == text
+    for part in parts:
+        assert parser.read_text(part).startswith("## Section ")
+
+
+def test_split_range_small_text(tmp_path):
+    path = write(tmp_path, "# Title\n## A\ntext\n## B\ntext\n")
+    _, whole, _, _ = parser.parse_large(path)
+
+    assert parser.split_range(whole, whole.size) == [whole]
+    assert len(parser.split_range(whole, whole.size - 1)) == 2
+
+
+def test_split_range_crlf(tmp_path, monkeypatch):
+    monkeypatch.setattr(parser, 'SCAN_CHUNK_SIZE', 7)
+    text = sections(6, 60).replace("\n", "\r\n")
+    path = write(tmp_path, text)
+
+    _, whole, _, _ = parser.parse_large(path)
+    parts = parser.split_range(whole, 150)
+
+    assert len(parts) > 1
+    assert "".join(parser.read_text(part) for part in parts) \
+        == text.replace("\r\n", "\n")
+    for part in parts:
+        assert parser.read_text(part).startswith("## Section ")
@@ -0,0 +1,202 @@
+"""This module tests resuming an import from a journal cut by a crash."""
+# tests/test_resume.py
+
+import copy
+import json
+import os
+import subprocess
+import sys
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+import pytest
+
+from benchmarks.fake_server import FakeServer, serve
+from benchmarks.vault import VaultSpec, generate_vault
+from bsimport import engine, imp
+from bsimport.journal import PLAN, RECORD, Journal
+from bsimport.manifest import Manifest
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+KINDS = ('books', 'chapters', 'pages')
+
+
+@pytest.fixture(scope='module')
+def complete_run(tmp_path_factory) -> Tuple[Path, FakeServer, List[str]]:
+    """
+    Import a vault to the end, keeping its journal.
+
+    :return:
+        The vault, the server it was imported to, and the lines of the
+        journal.
+    :rtype: Tuple[Path, FakeServer, List[str]]
+    """
+
+    tmp = tmp_path_factory.mktemp('run')
+    vault = generate_vault(
+        tmp / 'vault', VaultSpec(pages=40, chapters=3, size=512)
+    )
+    server = serve()
+
+    manifest = Manifest(tmp / 'manifest.json')
+    journal = Journal(tmp / 'journal.jsonl').start([vault])
+    manifest.attach(journal)
+
+    importer = imp.Importer(
+        "id", "secret", server.url, pool_size=4, manifest=manifest
+    )
+    try:
+        results = list(engine.import_books_content(importer, [vault], 4))
+    finally:
+        importer.close()
+        journal.close()
+
+    assert not any(result.error for result in results)
+
+    yield vault, server, journal.path.read_text().splitlines(True)
+
+    server.shutdown()
+
+
+def crashed_server(
+    server: FakeServer,
+    complete: List[str],
+    journal: List[str]
+) -> FakeServer:
+    """
+    Start a server holding what the complete run, which wrote `complete`,
+    had created when its journal held only `journal`.
+
+    The items recorded were created. Of those only planned, whose records
+    were lost, every other one is kept: the run stopped after creating
+    it, or before.
+    """
+
+    ids = {
+        record['path']: record['entry']['id']
+        for record in map(json.loads, complete) if record['op'] == RECORD
+    }
+    records = [json.loads(line) for line in journal]
+
+    recorded = {
+        record['path'] for record in records if record['op'] == RECORD
+    }
+    planned = [record['path'] for record in records if record['op'] == PLAN]
+    in_flight = [path for path in planned if path not in recorded]
+    created = recorded | set(in_flight[::2])
+    kept: Set[int] = {ids[path] for path in created}
+
+    crashed = serve()
+    with server.api._lock:
+        crashed.api._next_id = server.api._next_id
+        for kind in KINDS:
+            crashed.api._items[kind] = {
+                id: copy.deepcopy(item)
+                for id, item in server.api._items[kind].items()
+                if id in kept
+            }
+    return crashed
+
+
+def run_cli(home: Path, *args: str) -> subprocess.CompletedProcess:
+    """
+    Run bsimport in a new interpreter, with `home` as its home.
+    """
+
+    return subprocess.run(
+        [sys.executable, '-m', 'bsimport', *args],
+        cwd=ROOT,
+        env={
+            **os.environ,
+            'HOME': str(home),
+            'XDG_CONFIG_HOME': str(home / '.config')
+        },
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+
+
+def sources(vault: Path) -> List[Path]:
+    """
+    List the chapters and pages a vault is imported as.
+    """
+
+    return [
+        path for path in vault.rglob('*')
+        if path.suffix == '.md' or path.is_dir()
+    ]
+
+
+def duplicates(items: Dict[int, Dict[str, Any]]) -> List[Tuple]:
+    """
+    List the items of the same name in the same book or chapter.
+    """
+
+    counts = Counter(
+        (item.get('book_id'), item.get('chapter_id'), item['name'])
+        for item in items.values()
+    )
+    return [key for key, count in counts.items() if count > 1]
+
+
+@pytest.mark.parametrize('mode', ['threads', 'async'])
+@pytest.mark.parametrize('cut', [0.1, 0.3, 0.5, 0.7, 0.9])
+def test_resume_after_truncated_journal(tmp_path, complete_run, mode, cut):
+    if mode == 'async':
+        pytest.importorskip('aiohttp')
+
+    vault, server, lines = complete_run
+
+    # The journal as a crash left it: whole lines, then half of the next.
+    count = int(len(lines) * cut)
+    kept, torn = lines[:count], lines[count][:len(lines[count]) // 2]
+    crashed = crashed_server(server, lines, kept)
+
+    try:
+        home = tmp_path / 'home'
+        config_dir = home / '.config' / 'bsimport'
+        config_dir.mkdir(parents=True)
+        (config_dir / 'config.ini').write_text(
+            "[General]\ntoken_id = id\ntoken_secret = secret\n"
+            f"url = {crashed.url}\n"
+        )
+        (config_dir / 'journal.jsonl').write_text(''.join(kept) + torn)
+
+        args = ['import', str(vault), '-j', '4', '--resume']
+        if mode == 'async':
+            args.append('--async')
+        result = run_cli(home, *args)
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "Resuming the interrupted import" in result.stdout
+
+        items = crashed.api._items
+        assert len(items['books']) == 1
+        assert len(items['chapters']) == 3
+        assert len(items['pages']) == 40
+        for kind in KINDS:
+            assert duplicates(items[kind]) == [], kind
+
+        # Every chapter and page is in the manifest, as what it exists as.
+        manifest = Manifest.load(config_dir / 'manifest.json')
+        for path in [vault, *sources(vault)]:
+            entry = manifest.get(path)
+            assert entry is not None, path
+            kind = 'pages' if path.suffix == '.md' else \
+                'books' if path == vault else 'chapters'
+            assert entry['id'] in items[kind], path
+        assert not (config_dir / 'journal.jsonl').exists()
+
+        # So importing again creates and sends nothing.
+        next_id = crashed.api._next_id
+        result = run_cli(home, 'import', str(vault), '-j', '4')
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert crashed.api._next_id == next_id
+        assert "0 pages imported, 40 unchanged" in result.stdout
+
+    finally:
+        crashed.shutdown()
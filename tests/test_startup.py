@@ -0,0 +1,90 @@
+"""This module tests that the CLI starts within a fixed budget."""
+# tests/test_startup.py
+
+import subprocess
+import sys
+
+from pathlib import Path
+from typing import List
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The budget of importing the CLI, typer included, in milliseconds. It
+# takes about 50ms: the budget leaves room for slow machines, not for
+# requests or aiohttp, which take as long again.
+IMPORT_BUDGET_MS = 150
+
+# Modules only the commands sending requests may load.
+LAZY_MODULES = (
+    "requests", "urllib3", "aiohttp", "asyncio", "bsimport.wrapper",
+    "bsimport.aiowrapper", "bsimport.imp"
+)
+
+
+def python(code: str, *options: str) -> subprocess.CompletedProcess:
+    """
+    Run Python code in a new interpreter, from the root of the repository.
+    """
+
+    return subprocess.run(
+        [sys.executable, *options, '-c', code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+
+def import_time_ms(module: str) -> float:
+    """
+    Get the time taken by importing a module and its imports, as reported
+    by '-X importtime', in milliseconds.
+    """
+
+    stderr = python(f"import {module}", '-X', 'importtime').stderr
+
+    for line in stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+
+    raise AssertionError(f"{module} missing from:\n{stderr}")
+
+
+def test_cli_import_within_budget():
+    # The first import compiles the bytecode and fills the disk cache.
+    python("import bsimport.cli")
+
+    best = min(import_time_ms('bsimport.cli') for _ in range(3))
+
+    assert best < IMPORT_BUDGET_MS, (
+        f"importing the CLI took {best:.1f}ms, over the budget of "
+        f"{IMPORT_BUDGET_MS}ms"
+    )
+
+
+def test_cli_import_is_lazy():
+    code = (
+        "import sys, bsimport.cli; "
+        f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+
+    loaded: List[str] = python(code).stdout.split()
+
+    assert loaded == []
+
+
+def test_version_is_lazy():
+    code = (
+        "import sys\n"
+        "from typer.testing import CliRunner\n"
+        "from bsimport.cli import app\n"
+        "result = CliRunner().invoke(app, ['--version'])\n"
+        "assert result.exit_code == 0, result.output\n"
+        f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+
+    loaded: List[str] = python(code).stdout.split()
+
+    assert loaded == []
@@ -0,0 +1,332 @@
+"""This module tests the retry rules of the Bookstack wrappers."""
+# tests/test_wrapper.py
+
+import asyncio
+import json
+import socket
+import threading
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+from bsimport import REQUEST_ERROR, SUCCESS, wrapper
+from bsimport.stats import Stats
+from bsimport.wrapper import Bookstack, RetryPolicy
+
+
+# An answer of the scripted server: a status and headers, a None status
+# closing the connection without answering.
+Answer = Tuple[Optional[int], Dict[str, str]]
+
+
+class Script():
+    """
+    The answers the scripted server gives, in order, and the methods of
+    the requests it received. Once the answers run out, it answers 200.
+    """
+
+    def __init__(self):
+        self.answers: List[Answer] = list()
+        self.received: List[str] = list()
+        self.url = ""
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Answers with the next answer of the server's script.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def answer(self) -> None:
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+
+        script = self.server.script
+        script.received.append(self.command)
+        status, headers = script.answers.pop(0) if script.answers \
+            else (200, {})
+
+        if status is None:
+            self.close_connection = True
+            return
+
+        body = json.dumps(
+            {'id': 1} if status < 300 else {'message': f"Error {status}"}
+        ).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = answer
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.script = Script()
+    httpd.script.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(
+        target=httpd.serve_forever, args=(0.01,), daemon=True
+    )
+    thread.start()
+    yield httpd.script
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def delays(monkeypatch) -> List[float]:
+    """
+    Record the waits before retries instead of waiting.
+    """
+
+    waited: List[float] = list()
+    monkeypatch.setattr(wrapper.time, 'sleep', waited.append)
+    return waited
+
+
+@pytest.fixture
+def closed_url() -> str:
+    """
+    The URL of a port nothing listens on.
+    """
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def client(url: str, stats: Optional[Stats] = None, **policy) -> Bookstack:
+    return Bookstack(
+        "id", "secret", url, retry=RetryPolicy(**policy), stats=stats
+    )
+
+
+def test_retry_after_seconds(server, delays):
+    server.answers = [(429, {'Retry-After': '7'})]
+
+    with client(server.url) as bookstack:
+        assert bookstack.create_book("Book") == (SUCCESS, 1)
+        assert bookstack.retry_stats() == {'retries': 1, 'backoff': 7.0}
+
+    assert server.received == ['POST', 'POST']
+    assert delays == [7.0]
+
+
+def test_retry_after_date(server, delays):
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    server.answers = [(503, {'Retry-After': format_datetime(when, True)})]
+
+    with client(server.url) as bookstack:
+        assert bookstack.read_book(1)[0] == SUCCESS
+
+    assert len(delays) == 1
+    assert 25 < delays[0] <= 30
+
+
+def test_retry_after_capped(server, delays):
+    server.answers = [(429, {'Retry-After': '3600'})]
+
+    with client(server.url, max_retry_after=5.0) as bookstack:
+        assert bookstack.create_book("Book") == (SUCCESS, 1)
+
+    assert delays == [5.0]
+
+
+def test_backoff_capped(server, delays, monkeypatch):
+    # The longest wait of the full jitter.
+    monkeypatch.setattr(wrapper.random, 'uniform', lambda low, high: high)
+    server.answers = [(503, {})] * 6
+
+    with client(
+        server.url, max_retries=6, backoff=0.5, max_backoff=2.0
+    ) as bookstack:
+        assert bookstack.read_book(1)[0] == SUCCESS
+
+    assert delays == [0.5, 1.0, 2.0, 2.0, 2.0, 2.0]
+
+
+def test_backoff_jitter():
+    policy = RetryPolicy(backoff=0.5, max_backoff=30.0)
+
+    for attempt in range(12):
+        ceiling = min(30.0, 0.5 * 2 ** attempt)
+        assert all(
+            0 <= policy.delay(attempt) <= ceiling for _ in range(50)
+        )
+
+
+@pytest.mark.parametrize('status', [500, 502, 504])
+def test_post_not_retried_when_maybe_processed(server, delays, status):
+    server.answers = [(status, {})]
+
+    with client(server.url) as bookstack:
+        error, _ = bookstack.create_book("Book")
+        assert error != SUCCESS
+        assert bookstack.retry_stats()['retries'] == 0
+
+    assert server.received == ['POST']
+    assert delays == []
+
+
+@pytest.mark.parametrize('status', [500, 502, 504])
+def test_idempotent_retried_on_server_error(server, delays, status):
+    server.answers = [(status, {})]
+
+    with client(server.url) as bookstack:
+        assert bookstack.read_book(1)[0] == SUCCESS
+        assert bookstack.update_chapter(1, "Chapter")[0] == SUCCESS
+
+    assert server.received == ['GET', 'GET', 'PUT']
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_post_retried_when_unprocessed(server, delays, status):
+    server.answers = [(status, {})] * 2
+
+    with client(server.url) as bookstack:
+        assert bookstack.create_book("Book") == (SUCCESS, 1)
+        assert bookstack.retry_stats()['retries'] == 2
+
+    assert server.received == ['POST'] * 3
+    assert len(delays) == 2
+
+
+def test_post_retried_on_connect_error(closed_url, delays):
+    with client(closed_url, max_retries=2) as bookstack:
+        error, _ = bookstack.create_book("Book")
+        assert error == REQUEST_ERROR
+        assert bookstack.retry_stats()['retries'] == 2
+
+    assert len(delays) == 2
+
+
+def test_post_not_retried_once_sent(server, delays):
+    server.answers = [(None, {})]
+
+    with client(server.url) as bookstack:
+        error, _ = bookstack.create_book("Book")
+        assert error == REQUEST_ERROR
+        assert bookstack.retry_stats()['retries'] == 0
+
+    assert server.received == ['POST']
+
+
+def test_put_retried_once_sent(server, delays):
+    server.answers = [(None, {})]
+
+    with client(server.url) as bookstack:
+        assert bookstack.update_chapter(1, "Chapter")[0] == SUCCESS
+
+    assert server.received == ['PUT', 'PUT']
+
+
+def test_retries_counted(server, delays, monkeypatch):
+    monkeypatch.setattr(wrapper.random, 'uniform', lambda low, high: high)
+    server.answers = [(503, {})] * 5
+    stats = Stats()
+
+    with client(server.url, stats, max_retries=3, backoff=1.0) as bookstack:
+        error, _ = bookstack.create_book("Book")
+        assert error != SUCCESS
+        assert bookstack.retry_stats() == {'retries': 3, 'backoff': 7.0}
+
+    assert server.received == ['POST'] * 4
+    summary = stats.summary()
+    assert summary['requests'] == 4
+    [entry] = summary['endpoints'].values()
+    assert entry['statuses'] == {'503': 4}
+
+
+@pytest.fixture
+def aiowrapper():
+    pytest.importorskip('aiohttp')
+    from bsimport import aiowrapper
+    return aiowrapper
+
+
+def run_async(aiowrapper, url: str, call, **policy) -> Tuple[tuple, dict]:
+    """
+    Make a request with an AsyncBookstack, waiting a millisecond at most
+    before retries.
+
+    :return:
+        The response, and the retry statistics.
+    :rtype: Tuple[tuple, dict]
+    """
+
+    policy = {'backoff': 0.001, 'max_backoff': 0.001, **policy}
+
+    async def main():
+        bookstack = aiowrapper.AsyncBookstack(
+            "id", "secret", url, retry=RetryPolicy(**policy)
+        )
+        try:
+            return await call(bookstack), bookstack.retry_stats()
+        finally:
+            await bookstack.close()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('status', [500, 502, 504])
+def test_async_post_not_retried_when_maybe_processed(
+    server, aiowrapper, status
+):
+    server.answers = [(status, {})]
+
+    (error, _), stats = run_async(
+        aiowrapper, server.url, lambda bookstack: bookstack.create_book("B")
+    )
+
+    assert error != SUCCESS
+    assert stats['retries'] == 0
+    assert server.received == ['POST']
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_async_post_retried_when_unprocessed(server, aiowrapper, status):
+    server.answers = [(status, {'Retry-After': '0'})]
+
+    response, stats = run_async(
+        aiowrapper, server.url, lambda bookstack: bookstack.create_book("B")
+    )
+
+    assert response == (SUCCESS, 1)
+    assert stats['retries'] == 1
+    assert server.received == ['POST', 'POST']
+
+
+def test_async_post_retried_on_connect_error(closed_url, aiowrapper):
+    (error, _), stats = run_async(
+        aiowrapper, closed_url,
+        lambda bookstack: bookstack.create_book("B"), max_retries=2
+    )
+
+    assert error == REQUEST_ERROR
+    assert stats['retries'] == 2
+
+
+def test_async_post_not_retried_once_sent(server, aiowrapper):
+    server.answers = [(None, {})]
+
+    (error, _), stats = run_async(
+        aiowrapper, server.url, lambda bookstack: bookstack.create_book("B")
+    )
+
+    assert error == REQUEST_ERROR
+    assert stats['retries'] == 0
+    assert server.received == ['POST']